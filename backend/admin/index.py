@@ -1,418 +1,1291 @@
+import base64
+import csv
+import hashlib
+import hmac
+import io
 import json
 import os
-import psycopg2
-from typing import Dict, Any
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    import orjson
+
+    def dumps(value: Any) -> str:
+        return orjson.dumps(value).decode()
+
+    loads = orjson.loads
+except ImportError:
+    dumps = json.dumps
+    loads = json.loads
+
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+PREFLIGHT_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, If-None-Match, X-Auth-Token',
+    'Access-Control-Max-Age': '86400'
+}
+CONDITIONAL_HEADERS = dict(JSON_HEADERS, **{'Access-Control-Expose-Headers': 'ETag, X-Cache', 'Cache-Control': 'no-cache'})
+
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+DB_POOL_CHECK_AFTER = float(os.environ.get('DB_POOL_CHECK_AFTER', '30'))
+REFERENCE_CACHE_TTL = float(os.environ.get('REFERENCE_CACHE_TTL', '60'))
+REFERENCE_CACHE_SIZE = int(os.environ.get('REFERENCE_CACHE_SIZE', '256'))
+HOMEWORK_PAGE_SIZE = 100
+HOMEWORK_MAX_PAGE_SIZE = 500
+MIN_ACADEMIC_YEAR = 2000
+MAX_ROSTER_ROWS = int(os.environ.get('MAX_ROSTER_ROWS', '20000'))
+ROSTER_HASH_WORKERS = int(os.environ.get('ROSTER_HASH_WORKERS', str(os.cpu_count() or 2)))
+CLASS_DELETE_BATCH_SIZE = int(os.environ.get('CLASS_DELETE_BATCH_SIZE', '5000'))
+CLASS_DELETE_TIME_BUDGET = float(os.environ.get('CLASS_DELETE_TIME_BUDGET', '20'))
+ACADEMIC_YEARS_KEPT = int(os.environ.get('ACADEMIC_YEARS_KEPT', '2'))
+# Same scrypt cost as the auth function, which verifies these hashes.
+SCRYPT_N = int(os.environ.get('AUTH_SCRYPT_N', '16384'))
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+# Session tokens issued by the auth function: comma-separated kid:secret
+# pairs (AUTH_TOKEN_KEYS). While unset, requests carry no identity check.
+TOKEN_KEYS = {
+    kid.strip(): secret.strip().encode()
+    for kid, secret in (item.split(':', 1) for item in os.environ.get('AUTH_TOKEN_KEYS', '').split(',') if ':' in item)
+}
+
+# GET entities served from the in-process reference cache, and the cached
+# entities each mutated entity invalidates.
+CACHED_ENTITIES = ('classes', 'subjects', 'teachers', 'teacher_subjects')
+CACHE_INVALIDATES = {
+    'class': ('classes',),
+    'subject': ('subjects', 'teacher_subjects'),
+    'teacher': ('teachers', 'teacher_subjects'),
+    'teacher_subject': ('teacher_subjects',),
+    'roster': ('teachers', 'teacher_subjects'),
+}
+
+# Other GET entities, revalidated through the change counters of the tables they read.
+VERSIONED_ENTITIES = {
+    'students': ('students', 'users', 'classes'),
+    'schedule': ('schedule', 'classes', 'subjects', 'teachers', 'users'),
+    'homework': ('homework', 'classes', 'subjects', 'teachers', 'users'),
+    'stats': ('students', 'teachers', 'classes', 'subjects', 'class_subject_stats'),
+}
+
+# Live per-class/per-subject grade totals; class_subject_stats is the
+# incrementally maintained copy of this result.
+LIVE_CLASS_SUBJECT_STATS_SQL = """
+    SELECT s.class_id, g.subject_id, COUNT(*) AS grade_count,
+           COUNT(g.grade) AS graded_count, COALESCE(SUM(g.grade), 0) AS grade_sum
+    FROM grades g
+    JOIN students s ON s.id = g.student_id
+    WHERE s.class_id IS NOT NULL AND g.subject_id IS NOT NULL
+    GROUP BY s.class_id, g.subject_id
+"""
+
+# Moves a student's grade totals from their current class to the new one.
+MOVE_STUDENT_STATS_SQL = """
+    WITH moved AS (
+        SELECT s.class_id AS old_class_id, %(class_id)s::integer AS new_class_id, g.subject_id,
+               COUNT(*) AS grade_count, COUNT(g.grade) AS graded_count, COALESCE(SUM(g.grade), 0) AS grade_sum
+        FROM students s
+        JOIN grades g ON g.student_id = s.id
+        WHERE s.user_id = %(user_id)s AND s.class_id IS DISTINCT FROM %(class_id)s::integer
+          AND g.subject_id IS NOT NULL
+        GROUP BY s.class_id, g.subject_id
+    ), removed AS (
+        UPDATE class_subject_stats cs SET
+            grade_count = cs.grade_count - m.grade_count,
+            graded_count = cs.graded_count - m.graded_count,
+            grade_sum = cs.grade_sum - m.grade_sum,
+            updated_at = CURRENT_TIMESTAMP
+        FROM moved m
+        WHERE cs.class_id = m.old_class_id AND cs.subject_id = m.subject_id
+    )
+    INSERT INTO class_subject_stats AS cs (class_id, subject_id, grade_count, graded_count, grade_sum)
+    SELECT new_class_id, subject_id, grade_count, graded_count, grade_sum
+    FROM moved
+    WHERE new_class_id IS NOT NULL
+    ON CONFLICT (class_id, subject_id) DO UPDATE SET
+        grade_count = cs.grade_count + EXCLUDED.grade_count,
+        graded_count = cs.graded_count + EXCLUDED.graded_count,
+        grade_sum = cs.grade_sum + EXCLUDED.grade_sum,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+# Class deletion: grades and homework go in batches of CLASS_DELETE_BATCH_SIZE
+# rows, each its own short transaction, so no lock is held for the whole class.
+# Each grades batch takes its rows out of class_subject_stats in the same
+# statement, as DELETE_GRADE_SQL does, so the stats stay right between
+# batches and when a deletion stops at the time budget. Both return the
+# number of rows deleted.
+DELETE_CLASS_GRADES_SQL = """
+    WITH deleted AS (
+        DELETE FROM grades WHERE id IN (
+            SELECT g.id
+            FROM students s
+            JOIN grades g ON g.student_id = s.id
+            WHERE s.class_id = %(class_id)s
+            LIMIT %(limit)s
+        )
+        RETURNING subject_id, grade
+    ), stats AS (
+        UPDATE class_subject_stats cs SET
+            grade_count = cs.grade_count - delta.grade_count,
+            graded_count = cs.graded_count - delta.graded_count,
+            grade_sum = cs.grade_sum - delta.grade_sum,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT subject_id, COUNT(*) AS grade_count,
+                   COUNT(grade) AS graded_count, COALESCE(SUM(grade), 0) AS grade_sum
+            FROM deleted
+            GROUP BY subject_id
+        ) delta
+        WHERE cs.class_id = %(class_id)s AND cs.subject_id = delta.subject_id
+    )
+    SELECT COUNT(*) FROM deleted
+"""
+DELETE_CLASS_HOMEWORK_SQL = """
+    WITH deleted AS (
+        DELETE FROM homework WHERE id IN (SELECT id FROM homework WHERE class_id = %(class_id)s LIMIT %(limit)s)
+        RETURNING id
+    )
+    SELECT COUNT(*) FROM deleted
+"""
+CLASS_REMAINING_SQL = """
+    SELECT
+        (SELECT COUNT(*) FROM students s JOIN grades g ON g.student_id = s.id WHERE s.class_id = %(class_id)s),
+        (SELECT COUNT(*) FROM homework WHERE class_id = %(class_id)s)
+"""
+
+# What is left once the grades are gone is a few hundred rows at most; it is
+# removed in one statement, including the users of the class's students
+# (unless they are also teachers), which used to be left behind.
+DELETE_CLASS_SQL = """
+    WITH schedule_gone AS (
+        DELETE FROM schedule WHERE class_id = %(class_id)s
+    ), assignments_gone AS (
+        DELETE FROM teacher_classes WHERE class_id = %(class_id)s
+    ), stats_gone AS (
+        DELETE FROM class_subject_stats WHERE class_id = %(class_id)s
+    ), students_gone AS (
+        DELETE FROM students WHERE class_id = %(class_id)s RETURNING user_id
+    ), users_gone AS (
+        DELETE FROM users u
+        USING students_gone sg
+        WHERE u.id = sg.user_id AND NOT EXISTS (SELECT 1 FROM teachers t WHERE t.user_id = u.id)
+        RETURNING u.id
+    ), class_gone AS (
+        DELETE FROM classes WHERE id = %(class_id)s RETURNING id
+    )
+    SELECT (SELECT COUNT(*) FROM students_gone), (SELECT COUNT(*) FROM users_gone), (SELECT COUNT(*) FROM class_gone)
+"""
+
+# Yearly rollover of the grades and homework partitions: next year's are
+# created, years beyond ACADEMIC_YEARS_KEPT detached (see V0009).
+ACADEMIC_YEAR_ROLLOVER_SQL = "SELECT action, partition_name FROM academic_year_rollover(%s, %s)"
+
+# Academic years that have a partition of a table (homework_2025 holds the
+# year from 1 September 2025). A date outside them has no partition to go
+# to, and Postgres would reject the statement (see V0009).
+PARTITION_YEARS_SQL = """
+    SELECT substring(c.relname FROM '_([0-9]{4})$')::integer
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = %s::regclass
+"""
+
+# Roster import: rows are COPYed into this staging table, checked with one
+# query and inserted into users and students/teachers set-based.
+ROSTER_STAGING_SQL = """
+    CREATE TEMP TABLE roster_import (
+        row_index integer NOT NULL,
+        login text NOT NULL,
+        password text NOT NULL,
+        role text NOT NULL,
+        full_name text NOT NULL,
+        class_id integer,
+        class_name text
+    ) ON COMMIT DROP
+"""
+ROSTER_COLUMNS = ('row_index', 'login', 'password', 'role', 'full_name', 'class_id', 'class_name')
+
+# Class names repeat across years; a name resolves to the class of the latest year.
+ROSTER_RESOLVE_CLASSES_SQL = """
+    UPDATE roster_import r SET class_id = c.id
+    FROM (
+        SELECT DISTINCT ON (name) id, name FROM classes ORDER BY name, year DESC NULLS LAST, id DESC
+    ) c
+    WHERE r.class_id IS NULL AND r.class_name = c.name
+"""
+
+ROSTER_CONFLICTS_SQL = """
+    SELECT r.row_index, 'login', 'login ' || r.login || ' already exists'
+    FROM roster_import r
+    JOIN users u ON u.login = r.login
+    UNION ALL
+    SELECT r.row_index, 'class_name', 'class ' || r.class_name || ' not found'
+    FROM roster_import r
+    WHERE r.class_name IS NOT NULL AND r.class_id IS NULL
+    UNION ALL
+    SELECT r.row_index, 'class_id', 'class_id ' || r.class_id || ' not found'
+    FROM roster_import r
+    WHERE r.class_name IS NULL AND r.class_id IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM classes c WHERE c.id = r.class_id)
+    ORDER BY 1
+"""
+
+# ON CONFLICT covers logins taken between the check and the insert; rows it
+# skipped come back in the last column and the transaction is rolled back.
+ROSTER_INSERT_SQL = """
+    WITH new_users AS (
+        INSERT INTO users (login, password, role, full_name)
+        SELECT login, password, role, full_name FROM roster_import ORDER BY row_index
+        ON CONFLICT (login) DO NOTHING
+        RETURNING id, login, role
+    ), new_students AS (
+        INSERT INTO students (user_id, class_id)
+        SELECT nu.id, r.class_id
+        FROM new_users nu
+        JOIN roster_import r ON r.login = nu.login
+        WHERE nu.role = 'student'
+        RETURNING id
+    ), new_teachers AS (
+        INSERT INTO teachers (user_id)
+        SELECT id FROM new_users WHERE role = 'teacher'
+        RETURNING id
+    )
+    SELECT
+        (SELECT COUNT(*) FROM new_students),
+        (SELECT COUNT(*) FROM new_teachers),
+        ARRAY(
+            SELECT r.row_index FROM roster_import r
+            WHERE NOT EXISTS (SELECT 1 FROM new_users nu WHERE nu.login = r.login)
+            ORDER BY r.row_index
+        )
+"""
+
+
+class ConnectionPool:
+    '''
+    Postgres connections kept open between warm invocations of the function.
+    Connections idle longer than idle_timeout are closed; ones idle longer
+    than check_after are pinged before reuse. max_size 0 disables pooling.
+    psycopg2 is imported when the pool is built, so requests answered without
+    the database (preflights, 405s, validation errors) never load the driver.
+    '''
+
+    def __init__(self, dsn: str, max_size: int, idle_timeout: float, check_after: float):
+        import psycopg2
+        self.driver = psycopg2
+        self.dsn = dsn
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self._idle: List[Tuple[Any, float]] = []
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    def getconn(self, timeout: float = 10.0):
+        if self.max_size <= 0:
+            return self.driver.connect(self.dsn)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._evict_idle()
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    break
+                if self._in_use < self.max_size:
+                    conn, released_at = None, 0.0
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RuntimeError('Database connection pool exhausted')
+                self._cond.wait(remaining)
+            self._in_use += 1
+        try:
+            if conn is not None and not self._is_healthy(conn, released_at):
+                self._close(conn)
+                conn = None
+            if conn is None:
+                conn = self.driver.connect(self.dsn)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def putconn(self, conn) -> None:
+        if self.max_size <= 0:
+            self._close(conn)
+            return
+        reusable = not conn.closed
+        if reusable:
+            try:
+                conn.rollback()
+            except self.driver.Error:
+                reusable = False
+                self._close(conn)
+        with self._cond:
+            self._in_use -= 1
+            if reusable:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        keep = []
+        for conn, released_at in self._idle:
+            if now - released_at > self.idle_timeout:
+                self._close(conn)
+            else:
+                keep.append((conn, released_at))
+        self._idle = keep
+
+    def _is_healthy(self, conn, released_at: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - released_at < self.check_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.close()
+            conn.rollback()
+            return True
+        except self.driver.Error:
+            return False
+
+    def _close(self, conn) -> None:
+        try:
+            conn.close()
+        except self.driver.Error:
+            pass
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    os.environ.get('DATABASE_URL'),
+                    DB_POOL_MAX_SIZE,
+                    DB_POOL_IDLE_TIMEOUT,
+                    DB_POOL_CHECK_AFTER
+                )
+    return _pool
+
+
+class HttpError(Exception):
+    '''Raised by a route to answer with a non-2xx status; the transaction is rolled back.'''
+
+    def __init__(self, status: int, error: Any):
+        super().__init__(error)
+        self.status = status
+        self.payload = error if isinstance(error, dict) else {'error': error}
+
+
+def json_response(status: int, payload: Any) -> Dict[str, Any]:
+    return {'statusCode': status, 'headers': JSON_HEADERS, 'isBase64Encoded': False, 'body': dumps(payload)}
+
+
+def parse_body(event: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        body = loads(event.get('body') or '{}')
+    except ValueError:
+        raise HttpError(400, 'Invalid JSON body')
+    if not isinstance(body, dict):
+        raise HttpError(400, 'JSON object expected')
+    return body
+
+
+class ReferenceCache:
+    '''
+    TTL + LRU cache of serialized GET responses for rarely changing reference
+    data. Entries are dropped when the admin function itself writes the
+    underlying tables; the TTL bounds staleness from writes made elsewhere.
+    '''
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: 'OrderedDict[Tuple, Tuple[float, str, str, str]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(entity: str, params: Dict[str, Any]) -> Tuple:
+        return (entity,) + tuple(sorted((k, str(v)) for k, v in params.items() if k != 'entity'))
+
+    def get(self, key: Tuple) -> Optional[Tuple[str, str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2], entry[3]
+
+    def put(self, key: Tuple, body: str) -> str:
+        etag = make_etag(body)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, key[0], body, etag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag
+
+    def invalidate(self, entities: Tuple[str, ...]) -> None:
+        if not entities:
+            return
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if entry[1] in entities]:
+                del self._entries[key]
+                self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations
+            }
+
+
+reference_cache = ReferenceCache(REFERENCE_CACHE_TTL, REFERENCE_CACHE_SIZE)
+
+
+def hash_password(password: str) -> str:
+    '''Stored form: scrypt$n$r$p$salt$hash, salt and hash base64url without padding.'''
+    salt = os.urandom(16)
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P,
+                            maxmem=256 * SCRYPT_N * SCRYPT_R * SCRYPT_P, dklen=32)
+    salt_b64, digest_b64 = (base64.urlsafe_b64encode(raw).decode().rstrip('=') for raw in (salt, digest))
+    return f'scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt_b64}${digest_b64}'
+
+
+# The edit form sends back the stored hash unless the password was changed.
+# A "scrypt$" value is only accepted as that hash, compared with the row in
+# the UPDATE itself, so hashes made at an older AUTH_SCRYPT_N still count as
+# unchanged while no client can plant a hash of its own.
+UPDATE_USER_SQL = """
+    UPDATE users
+    SET full_name = %(full_name)s, login = %(login)s, password = COALESCE(%(new_hash)s, password)
+    WHERE id = %(user_id)s AND (%(stored)s::text IS NULL OR password = %(stored)s)
+"""
+
+
+def update_user(cur, user_id: Any, body: Dict[str, Any]) -> None:
+    '''Name, login and, when a new one was typed, the password of a teacher's or student's user.'''
+    value = body.get('password')
+    if not value or not isinstance(value, str):
+        new_hash, stored = None, None
+    elif value.startswith('scrypt$'):
+        new_hash, stored = None, value
+    else:
+        new_hash, stored = hash_password(value), None
+    cur.execute(UPDATE_USER_SQL, {'full_name': body.get('full_name'), 'login': body.get('login'),
+                                  'new_hash': new_hash, 'stored': stored, 'user_id': user_id})
+    if stored is not None and cur.rowcount == 0:
+        raise HttpError(400, 'password must be a new password or the stored hash')
+
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    '''
+    Hash a roster's passwords on ROSTER_HASH_WORKERS threads (scrypt releases
+    the GIL); validate_roster_rows has already refused values that look like hashes.
+    '''
+    with ThreadPoolExecutor(max_workers=max(1, ROSTER_HASH_WORKERS)) as executor:
+        return list(executor.map(hash_password, passwords))
+
+
+def make_etag(body: str) -> str:
+    return '"' + hashlib.blake2b(body.encode(), digest_size=12).hexdigest() + '"'
+
+
+def request_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def verify_token(token: str) -> Dict[str, Any]:
+    '''Claims of a token signed with one of TOKEN_KEYS; 401 if it is malformed, forged or expired.'''
+    kid, _, rest = token.partition('.')
+    payload, _, signature = rest.partition('.')
+    key = TOKEN_KEYS.get(kid)
+    if key is None:
+        raise HttpError(401, 'Invalid token')
+    expected = hmac.new(key, f'{kid}.{payload}'.encode(), hashlib.sha256).digest()
+    try:
+        if not hmac.compare_digest(expected, base64.urlsafe_b64decode(signature + '=' * (-len(signature) % 4))):
+            raise HttpError(401, 'Invalid token')
+        claims = loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+    except ValueError:
+        raise HttpError(401, 'Invalid token')
+    if claims.get('exp', 0) < time.time():
+        raise HttpError(401, 'Token expired')
+    return claims
+
+
+def request_identity(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    '''Claims of the X-Auth-Token header, or None while AUTH_TOKEN_KEYS is not configured.'''
+    if not TOKEN_KEYS:
+        return None
+    token = request_header(event, 'x-auth-token')
+    if not token:
+        raise HttpError(401, 'Authentication required')
+    return verify_token(token)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(',')]
+    return '*' in candidates or etag in [c[2:] if c.startswith('W/') else c for c in candidates]
+
+
+def version_etag(cur, tables: Tuple[str, ...], params: Dict[str, Any]) -> str:
+    '''
+    ETag derived from the change counters of the tables a response reads plus
+    the request parameters. A few index rows per table, no scan of the data itself.
+    '''
+    cur.execute(
+        "SELECT table_name, version FROM table_versions WHERE table_name = ANY(%s) ORDER BY table_name",
+        (list(tables),)
+    )
+    versions = ','.join(f'{name}:{version}' for name, version in cur.fetchall())
+    request = '&'.join(f'{k}={v}' for k, v in sorted(params.items()))
+    return '"' + hashlib.blake2b(f'{request}|{versions}'.encode(), digest_size=12).hexdigest() + '"'
+
+
+def conditional_response(event: Dict[str, Any], body: str, etag: str,
+                         cache_status: Optional[str] = None) -> Dict[str, Any]:
+    headers = dict(CONDITIONAL_HEADERS, ETag=etag)
+    if cache_status:
+        headers['X-Cache'] = cache_status
+    if etag_matches(request_header(event, 'if-none-match'), etag):
+        return {'statusCode': 304, 'headers': headers, 'isBase64Encoded': False, 'body': ''}
+    return {'statusCode': 200, 'headers': headers, 'isBase64Encoded': False, 'body': body}
+
+
+def encode_cursor(due_date: date, homework_id: int) -> str:
+    return base64.urlsafe_b64encode(f'{due_date.isoformat()}|{homework_id}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[date, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        due_date, homework_id = raw.split('|')
+        return date.fromisoformat(due_date), int(homework_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('invalid cursor')
+
+
+def academic_year(day: date) -> int:
+    '''Academic years run from 1 September; the one starting in 2025 is year 2025.'''
+    return day.year if day.month >= 9 else day.year - 1
+
+
+def homework_year(params: Dict[str, Any]) -> Optional[int]:
+    '''
+    Academic year a homework listing is limited to: ?year=, else the current
+    one unless date_from or date_to bound the listing already.
+    '''
+    if params.get('year'):
+        if not str(params['year']).isdigit() or \
+                not MIN_ACADEMIC_YEAR <= int(params['year']) <= academic_year(date.today()) + 1:
+            raise ValueError('year must be the starting year of an academic year, e.g. 2025')
+        return int(params['year'])
+    if params.get('date_from') or params.get('date_to'):
+        return None
+    return academic_year(date.today())
+
+
+def build_homework_query(params: Dict[str, Any], year: Optional[int] = None) -> Tuple[str, List[Any], int]:
+    '''
+    Keyset-paginated homework listing ordered by (due_date, id) descending.
+    Filters: class_id, subject_id, date_from, date_to, academic year; paging: limit, cursor.
+    Selects limit + 1 rows so the caller can tell whether another page exists.
+    Raises ValueError for malformed parameters.
+    '''
+    conditions = []
+    args: List[Any] = []
+    for name in ('class_id', 'subject_id'):
+        if params.get(name):
+            if not str(params[name]).isdigit():
+                raise ValueError(f'{name} must be an integer')
+            conditions.append(f'h.{name} = %s')
+            args.append(int(params[name]))
+    for name, op in (('date_from', '>='), ('date_to', '<=')):
+        if params.get(name):
+            try:
+                args.append(date.fromisoformat(params[name]))
+            except ValueError:
+                raise ValueError(f'{name} must be YYYY-MM-DD')
+            conditions.append(f'h.due_date {op} %s')
+    if year is not None:
+        conditions.append('h.due_date >= %s AND h.due_date < %s')
+        args.extend((date(year, 9, 1), date(year + 1, 9, 1)))
+    if params.get('cursor'):
+        conditions.append('(h.due_date, h.id) < (%s, %s)')
+        args.extend(decode_cursor(params['cursor']))
+
+    limit = params.get('limit') or HOMEWORK_PAGE_SIZE
+    if not str(limit).isdigit() or not 1 <= int(limit) <= HOMEWORK_MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {HOMEWORK_MAX_PAGE_SIZE}')
+    limit = int(limit)
+    args.append(limit + 1)
+
+    if params.get('class_id'):
+        columns = 'sub.name as subject_name, u.full_name as teacher_name'
+        class_join = ''
+    else:
+        columns = 'c.name as class_name, sub.name as subject_name, u.full_name as teacher_name, h.class_id'
+        class_join = 'JOIN classes c ON h.class_id = c.id'
+    where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+    query = f"""
+        SELECT h.id, h.description, h.due_date, {columns}
+        FROM homework h
+        {class_join}
+        JOIN subjects sub ON h.subject_id = sub.id
+        LEFT JOIN teachers t ON h.teacher_id = t.id
+        LEFT JOIN users u ON t.user_id = u.id
+        {where}
+        ORDER BY h.due_date DESC, h.id DESC
+        LIMIT %s
+    """
+    return query, args, limit
+
+
+def get_classes(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    cur.execute("SELECT id, name, year FROM classes ORDER BY name")
+    return {'data': [{'id': r[0], 'name': r[1], 'year': r[2]} for r in cur.fetchall()]}
+
+
+def get_subjects(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    cur.execute("SELECT id, name FROM subjects ORDER BY name")
+    return {'data': [{'id': r[0], 'name': r[1]} for r in cur.fetchall()]}
+
+
+def get_teachers(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    cur.execute("""
+        SELECT t.id, u.full_name, u.login, u.password, t.user_id
+        FROM teachers t 
+        JOIN users u ON t.user_id = u.id 
+        ORDER BY u.full_name
+    """)
+    return {'data': [{'id': r[0], 'full_name': r[1], 'login': r[2], 'password': r[3], 'user_id': r[4]} for r in cur.fetchall()]}
+
+
+def get_students(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    cur.execute("""
+        SELECT s.id, u.full_name, u.login, u.password, c.name as class_name, s.class_id
+        FROM students s 
+        JOIN users u ON s.user_id = u.id 
+        LEFT JOIN classes c ON s.class_id = c.id
+        ORDER BY u.full_name
+    """)
+    return {'data': [{'id': r[0], 'full_name': r[1], 'login': r[2], 'password': r[3], 'class_name': r[4], 'class_id': r[5]} for r in cur.fetchall()]}
+
+
+def get_teacher_subjects(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    teacher_id = params.get('teacher_id')
+    if not teacher_id:
+        return {'data': []}
+    cur.execute("""
+        SELECT ts.id, s.id as subject_id, s.name as subject_name
+        FROM teacher_subjects ts
+        JOIN subjects s ON ts.subject_id = s.id
+        WHERE ts.teacher_id = %s
+    """, (teacher_id,))
+    return {'data': [{'id': r[0], 'subject_id': r[1], 'subject_name': r[2]} for r in cur.fetchall()]}
+
+
+def get_schedule(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    class_id = params.get('class_id')
+    if class_id:
+        cur.execute("""
+            SELECT s.id, s.day_of_week, s.lesson_number, 
+                   sub.name as subject_name, u.full_name as teacher_name
+            FROM schedule s
+            JOIN subjects sub ON s.subject_id = sub.id
+            LEFT JOIN teachers t ON s.teacher_id = t.id
+            LEFT JOIN users u ON t.user_id = u.id
+            WHERE s.class_id = %s
+            ORDER BY s.day_of_week, s.lesson_number
+        """, (class_id,))
+        return {'data': [{'id': r[0], 'day_of_week': r[1], 'lesson_number': r[2], 'subject_name': r[3], 'teacher_name': r[4]} for r in cur.fetchall()]}
+    cur.execute("""
+        SELECT s.id, s.day_of_week, s.lesson_number, 
+               c.name as class_name, sub.name as subject_name, 
+               u.full_name as teacher_name, s.class_id
+        FROM schedule s
+        JOIN classes c ON s.class_id = c.id
+        JOIN subjects sub ON s.subject_id = sub.id
+        LEFT JOIN teachers t ON s.teacher_id = t.id
+        LEFT JOIN users u ON t.user_id = u.id
+        ORDER BY c.name, s.day_of_week, s.lesson_number
+    """)
+    return {'data': [{'id': r[0], 'day_of_week': r[1], 'lesson_number': r[2], 'class_name': r[3], 'subject_name': r[4], 'teacher_name': r[5], 'class_id': r[6]} for r in cur.fetchall()]}
+
+
+def check_homework_request(params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        year = homework_year(params)
+        build_homework_query(params, year)
+    except ValueError as e:
+        raise HttpError(400, str(e))
+    return dict(body, year=year)
+
+
+def get_homework(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    query, args, limit = build_homework_query(params, body.get('year'))
+    cur.execute(query, args)
+    rows = cur.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][2], rows[-1][0])
+    if params.get('class_id'):
+        data = [{'id': r[0], 'description': r[1], 'due_date': str(r[2]), 'subject_name': r[3], 'teacher_name': r[4]} for r in rows]
+    else:
+        data = [{'id': r[0], 'description': r[1], 'due_date': str(r[2]), 'class_name': r[3], 'subject_name': r[4], 'teacher_name': r[5], 'class_id': r[6]} for r in rows]
+    return {'data': data, 'next_cursor': next_cursor, 'year': body.get('year')}
+
+
+def get_stats(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    class_id = params.get('class_id')
+    if class_id:
+        cur.execute("""
+            SELECT 
+                (SELECT COUNT(*) FROM students WHERE class_id = %s) as student_count,
+                COALESCE(SUM(grade_count), 0) as total_grades,
+                COALESCE(SUM(grade_sum)::float / NULLIF(SUM(graded_count), 0), 0) as avg_grade
+            FROM class_subject_stats
+            WHERE class_id = %s
+        """, (class_id, class_id))
+        row = cur.fetchone()
+        return {'data': {'student_count': row[0], 'total_grades': row[1], 'avg_grade': float(row[2])}}
+    cur.execute("""
+        SELECT 
+            (SELECT COUNT(*) FROM students) as total_students,
+            (SELECT COUNT(*) FROM teachers) as total_teachers,
+            (SELECT COUNT(*) FROM classes) as total_classes,
+            (SELECT COUNT(*) FROM subjects) as total_subjects,
+            COALESCE(SUM(grade_sum)::float / NULLIF(SUM(graded_count), 0), 0) as overall_avg
+        FROM class_subject_stats
+    """)
+    row = cur.fetchone()
+    return {'data': {
+        'total_students': row[0],
+        'total_teachers': row[1],
+        'total_classes': row[2],
+        'total_subjects': row[3],
+        'overall_avg': float(row[4])
+    }}
+
+
+def check_stats(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    cur.execute(f"""
+        SELECT COALESCE(cs.class_id, live.class_id), COALESCE(cs.subject_id, live.subject_id),
+               cs.grade_count, cs.graded_count, cs.grade_sum,
+               live.grade_count, live.graded_count, live.grade_sum
+        FROM class_subject_stats cs
+        FULL JOIN ({LIVE_CLASS_SUBJECT_STATS_SQL}) live
+            ON live.class_id = cs.class_id AND live.subject_id = cs.subject_id
+        WHERE (COALESCE(cs.grade_count, 0), COALESCE(cs.graded_count, 0), COALESCE(cs.grade_sum, 0))
+            IS DISTINCT FROM
+            (COALESCE(live.grade_count, 0), COALESCE(live.graded_count, 0), COALESCE(live.grade_sum, 0))
+        ORDER BY 1, 2
+    """)
+    rows = cur.fetchall()
+    return {'data': {
+        'consistent': not rows,
+        'mismatches': [{
+            'class_id': r[0],
+            'subject_id': r[1],
+            'stored': {'grade_count': r[2], 'graded_count': r[3], 'grade_sum': r[4]},
+            'live': {'grade_count': r[5], 'graded_count': r[6], 'grade_sum': r[7]}
+        } for r in rows]
+    }}
+
+
+def delete_class(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Delete a class with its grades, homework, timetable, students and their
+    users. Grades and homework are deleted and committed batch by batch; when
+    CLASS_DELETE_TIME_BUDGET runs out the response has done=false and what is
+    left, and the same DELETE continues where this one stopped.
+    '''
+    class_id = params.get('id')
+    deleted = {'grades': 0, 'homework': 0}
+    deadline = time.monotonic() + CLASS_DELETE_TIME_BUDGET
+    for table, sql in (('grades', DELETE_CLASS_GRADES_SQL), ('homework', DELETE_CLASS_HOMEWORK_SQL)):
+        while True:
+            cur.execute(sql, {'class_id': class_id, 'limit': CLASS_DELETE_BATCH_SIZE})
+            count = cur.fetchone()[0]
+            deleted[table] += count
+            cur.connection.commit()
+            if count < CLASS_DELETE_BATCH_SIZE:
+                break
+            if time.monotonic() > deadline:
+                cur.execute(CLASS_REMAINING_SQL, {'class_id': class_id})
+                grades, homework = cur.fetchone()
+                return {'success': True, 'done': False, 'deleted': deleted,
+                        'remaining': {'grades': grades, 'homework': homework}}
+    
+    cur.execute(DELETE_CLASS_SQL, {'class_id': class_id})
+    students, users, classes = cur.fetchone()
+    return {'success': True, 'done': True, 'deleted': dict(deleted, students=students, users=users, classes=classes)}
+
+
+def delete_subject(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    entity_id = params.get('id')
+    cur.execute("DELETE FROM class_subject_stats WHERE subject_id = %s", (entity_id,))
+    cur.execute("DELETE FROM subjects WHERE id = %s", (entity_id,))
+    return {'success': True}
+
+
+def delete_teacher(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    entity_id = params.get('id')
+    cur.execute("SELECT user_id FROM teachers WHERE id = %s", (entity_id,))
+    user_row = cur.fetchone()
+    if user_row:
+        cur.execute("DELETE FROM teachers WHERE id = %s", (entity_id,))
+        cur.execute("DELETE FROM users WHERE id = %s", (user_row[0],))
+    return {'success': True}
+
+
+def delete_student(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    entity_id = params.get('id')
+    cur.execute("SELECT user_id FROM students WHERE id = %s", (entity_id,))
+    user_row = cur.fetchone()
+    if user_row:
+        cur.execute("DELETE FROM students WHERE id = %s", (entity_id,))
+        cur.execute("DELETE FROM users WHERE id = %s", (user_row[0],))
+    return {'success': True}
+
+
+def delete_schedule(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    cur.execute("DELETE FROM schedule WHERE id = %s", (params.get('id'),))
+    return {'success': True}
+
+
+def update_teacher(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    update_user(cur, body.get('user_id'), body)
+    return {'success': True}
+
+
+def update_student(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    user_id = body.get('user_id')
+    class_id = body.get('class_id')
+    update_user(cur, user_id, body)
+    cur.execute(MOVE_STUDENT_STATS_SQL, {'class_id': class_id, 'user_id': user_id})
+    cur.execute("""
+        UPDATE students 
+        SET class_id = %s
+        WHERE user_id = %s
+    """, (class_id, user_id))
+    return {'success': True}
+
+
+def update_schedule(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    cur.execute("""
+        UPDATE schedule 
+        SET class_id = %s, day_of_week = %s, lesson_number = %s, 
+            subject_id = %s, teacher_id = %s
+        WHERE id = %s
+    """, (body.get('class_id'), body.get('day_of_week'), body.get('lesson_number'),
+          body.get('subject_id'), body.get('teacher_id'), params.get('id')))
+    return {'success': True}
+
+
+def create_class(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    cur.execute("INSERT INTO classes (name, year) VALUES (%s, %s) RETURNING id", (body.get('name', ''), body.get('year', 2025)))
+    return {'success': True, 'id': cur.fetchone()[0]}
+
+
+def create_subject(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    cur.execute("INSERT INTO subjects (name) VALUES (%s) RETURNING id", (body.get('name', ''),))
+    return {'success': True, 'id': cur.fetchone()[0]}
+
+
+def create_teacher(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    cur.execute(
+        "INSERT INTO users (login, password, role, full_name) VALUES (%s, %s, 'teacher', %s) RETURNING id",
+        (body.get('login', ''), hash_password(body.get('password') or ''), body.get('full_name', ''))
+    )
+    user_id = cur.fetchone()[0]
+    cur.execute("INSERT INTO teachers (user_id) VALUES (%s) RETURNING id", (user_id,))
+    return {'success': True, 'id': cur.fetchone()[0]}
+
+
+def create_student(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    cur.execute(
+        "INSERT INTO users (login, password, role, full_name) VALUES (%s, %s, 'student', %s) RETURNING id",
+        (body.get('login', ''), hash_password(body.get('password') or ''), body.get('full_name', ''))
+    )
+    user_id = cur.fetchone()[0]
+    cur.execute("INSERT INTO students (user_id, class_id) VALUES (%s, %s) RETURNING id", (user_id, body.get('class_id')))
+    return {'success': True, 'id': cur.fetchone()[0]}
+
+
+def create_teacher_class(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    cur.execute(
+        "INSERT INTO teacher_classes (teacher_id, class_id, subject_id) VALUES (%s, %s, %s) RETURNING id",
+        (body.get('teacher_id'), body.get('class_id'), body.get('subject_id'))
+    )
+    return {'success': True, 'id': cur.fetchone()[0]}
+
+
+def create_teacher_subject(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    cur.execute(
+        "INSERT INTO teacher_subjects (teacher_id, subject_id) VALUES (%s, %s) RETURNING id",
+        (body.get('teacher_id'), body.get('subject_id'))
+    )
+    return {'success': True, 'id': cur.fetchone()[0]}
+
+
+def create_schedule(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    cur.execute("""
+        INSERT INTO schedule (class_id, subject_id, teacher_id, day_of_week, lesson_number)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING id
+    """, (body.get('class_id'), body.get('subject_id'), body.get('teacher_id'),
+          body.get('day_of_week'), body.get('lesson_number')))
+    return {'success': True, 'id': cur.fetchone()[0]}
+
+
+def check_due_date(cur, value: Any) -> date:
+    '''due_date as a date, in an academic year that has a homework partition.'''
+    try:
+        due_date = date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise HttpError(400, 'due_date must be YYYY-MM-DD')
+    cur.execute(PARTITION_YEARS_SQL, ('homework',))
+    if academic_year(due_date) not in {r[0] for r in cur.fetchall()}:
+        raise HttpError(400, f'due_date {due_date} is outside the academic years kept in homework')
+    return due_date
+
+
+def create_homework(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    cur.execute("""
+        INSERT INTO homework (class_id, subject_id, teacher_id, description, due_date)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING id
+    """, (body.get('class_id'), body.get('subject_id'), body.get('teacher_id'),
+          body.get('description', ''), check_due_date(cur, body.get('due_date'))))
+    return {'success': True, 'id': cur.fetchone()[0]}
+
+
+def roster_items(body: Dict[str, Any]) -> List[Any]:
+    '''Roster rows from body.rows (objects) or body.csv (text with a header line, rows indexed from 0 after it).'''
+    if isinstance(body.get('csv'), str):
+        reader = csv.DictReader(io.StringIO(body['csv'].lstrip('\ufeff')))
+        if reader.fieldnames is None:
+            return []
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+        return [{k: (v.strip() if isinstance(v, str) else v) for k, v in row.items() if k} for row in reader]
+    if isinstance(body.get('rows'), list):
+        return body['rows']
+    raise HttpError(400, 'rows (list) or csv (text) required')
+
+
+def validate_roster_rows(items: List[Any], default_role: Any) -> Tuple[List[tuple], List[Dict[str, Any]]]:
+    '''
+    Turn roster entries into staging rows (passwords not yet hashed).
+    Returns the rows and a list of {index, field, error} entries for invalid
+    entries, including logins repeated within the roster.
+    '''
+    rows = []
+    errors = []
+    seen: Dict[str, int] = {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({'index': index, 'field': None, 'error': 'row must be an object'})
+            continue
+        row_errors = []
+        role = item.get('role') or default_role
+        if role not in ('student', 'teacher'):
+            row_errors.append({'index': index, 'field': 'role', 'error': 'role must be student or teacher'})
+        login = item.get('login')
+        if not isinstance(login, str) or not login or len(login) > 50:
+            row_errors.append({'index': index, 'field': 'login', 'error': 'login must be 1 to 50 characters'})
+        elif login in seen:
+            row_errors.append({'index': index, 'field': 'login', 'error': f'login {login} repeats row {seen[login]}'})
+        else:
+            seen[login] = index
+        password = item.get('password')
+        if not isinstance(password, str) or not password:
+            row_errors.append({'index': index, 'field': 'password', 'error': 'password required'})
+        elif password.startswith('scrypt$'):
+            # A roster carries plain passwords; a hash would be stored as is, with whatever cost it names
+            row_errors.append({'index': index, 'field': 'password', 'error': 'password must be plain text, not a hash'})
+        full_name = item.get('full_name') or ''
+        if not isinstance(full_name, str) or len(full_name) > 200:
+            row_errors.append({'index': index, 'field': 'full_name', 'error': 'full_name must be up to 200 characters'})
+        class_id, class_name = item.get('class_id'), item.get('class_name') or None
+        if class_id in (None, ''):
+            class_id = None
+        elif str(class_id).isdigit():
+            class_id = int(class_id)
+        else:
+            row_errors.append({'index': index, 'field': 'class_id', 'error': 'class_id must be a positive integer'})
+        if class_name is not None and not isinstance(class_name, str):
+            row_errors.append({'index': index, 'field': 'class_name', 'error': 'class_name must be a string'})
+        if role == 'teacher':
+            class_id = class_name = None
+        if row_errors:
+            errors.extend(row_errors)
+        else:
+            rows.append((index, login, password, role, full_name, class_id, None if class_id else class_name))
+    return rows, errors
+
+
+def check_roster_request(params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    '''Validate the whole roster and hash its passwords before a connection is taken.'''
+    items = roster_items(body)
+    if not items or len(items) > MAX_ROSTER_ROWS:
+        raise HttpError(400, f'roster must contain 1 to {MAX_ROSTER_ROWS} rows')
+    rows, errors = validate_roster_rows(items, body.get('role'))
+    if errors:
+        raise HttpError(400, {'success': False, 'errors': errors})
+    hashed = hash_passwords([r[2] for r in rows])
+    return {'rows': [r[:2] + (h,) + r[3:] for r, h in zip(rows, hashed)]}
+
+
+def copy_text(rows: List[tuple]) -> io.StringIO:
+    '''Rows in COPY text format: tab-separated, \\N for NULL, separators backslash-escaped.'''
+    escapes = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join('\\N' if v is None else str(v).translate(escapes) for v in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    return buffer
+
+
+def import_roster(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Load a validated roster in the handler's one transaction: COPY into a
+    staging table, one query for taken logins and unknown classes, then one
+    statement inserting users and their students/teachers rows. Any conflict
+    fails the whole roster with per-row errors, so a fixed file can be resent.
+    '''
+    rows = body['rows']
+    cur.execute(ROSTER_STAGING_SQL)
+    cur.copy_expert(f"COPY roster_import ({', '.join(ROSTER_COLUMNS)}) FROM STDIN", copy_text(rows))
+    cur.execute(ROSTER_RESOLVE_CLASSES_SQL)
+    
+    cur.execute(ROSTER_CONFLICTS_SQL)
+    errors = [{'index': r[0], 'field': r[1], 'error': r[2]} for r in cur.fetchall()]
+    if not errors:
+        cur.execute(ROSTER_INSERT_SQL)
+        students, teachers, skipped = cur.fetchone()
+        logins = {r[0]: r[1] for r in rows}
+        errors = [{'index': i, 'field': 'login', 'error': f'login {logins[i]} already exists'} for i in skipped]
+    if errors:
+        raise HttpError(409 if all(e['field'] == 'login' for e in errors) else 400, {'success': False, 'errors': errors})
+    return {'success': True, 'students': students, 'teachers': teachers}
+
+
+def rebuild_stats(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    cur.execute("LOCK TABLE class_subject_stats IN EXCLUSIVE MODE")
+    cur.execute("DELETE FROM class_subject_stats")
+    cur.execute(f"""
+        INSERT INTO class_subject_stats (class_id, subject_id, grade_count, graded_count, grade_sum)
+        {LIVE_CLASS_SUBJECT_STATS_SQL}
+    """)
+    return {'success': True, 'rows': cur.rowcount}
+
+
+def check_rollover_request(params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    '''The current academic year by default; the current year's partition is never detached.'''
+    current = academic_year(date.today())
+    year = body.get('year', current)
+    keep_years = body.get('keep_years', ACADEMIC_YEARS_KEPT)
+    for name, value in (('year', year), ('keep_years', keep_years)):
+        if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+            raise HttpError(400, f'{name} must be a positive integer')
+    if not current <= year <= current + 1:
+        raise HttpError(400, f'year must be {current} or {current + 1}')
+    if year - keep_years >= current:
+        raise HttpError(400, f'keep_years must keep the current academic year {current}')
+    return dict(body, year=year, keep_years=keep_years)
+
+
+def rollover_academic_year(cur, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Create the partitions of the year and the one after it, detach those older
+    than keep_years, and rebuild the stats when detached grades left them.
+    class_subject_stats is not kept per year: it totals every year still
+    attached, so it only changes here when a grades partition is detached.
+    '''
+    cur.execute(ACADEMIC_YEAR_ROLLOVER_SQL, (body['year'], body['keep_years']))
+    steps = cur.fetchall()
+    result = {
+        'success': True,
+        'year': body['year'],
+        'created': [name for action, name in steps if action == 'created'],
+        'detached': [name for action, name in steps if action == 'detached']
+    }
+    if any(name.startswith('grades_') for name in result['detached']):
+        result['stats_rows'] = rebuild_stats(cur, params, body)['rows']
+    return result
+
+
+ROUTES = {
+    ('GET', 'classes'): get_classes,
+    ('GET', 'subjects'): get_subjects,
+    ('GET', 'teachers'): get_teachers,
+    ('GET', 'students'): get_students,
+    ('GET', 'teacher_subjects'): get_teacher_subjects,
+    ('GET', 'schedule'): get_schedule,
+    ('GET', 'homework'): get_homework,
+    ('GET', 'stats'): get_stats,
+    ('GET', 'stats_check'): check_stats,
+    ('DELETE', 'class'): delete_class,
+    ('DELETE', 'subject'): delete_subject,
+    ('DELETE', 'teacher'): delete_teacher,
+    ('DELETE', 'student'): delete_student,
+    ('DELETE', 'schedule'): delete_schedule,
+    ('PUT', 'teacher'): update_teacher,
+    ('PUT', 'student'): update_student,
+    ('PUT', 'schedule'): update_schedule,
+    ('POST', 'class'): create_class,
+    ('POST', 'subject'): create_subject,
+    ('POST', 'teacher'): create_teacher,
+    ('POST', 'student'): create_student,
+    ('POST', 'teacher_class'): create_teacher_class,
+    ('POST', 'teacher_subject'): create_teacher_subject,
+    ('POST', 'schedule'): create_schedule,
+    ('POST', 'homework'): create_homework,
+    ('POST', 'roster'): import_roster,
+    ('POST', 'stats_rebuild'): rebuild_stats,
+    ('POST', 'academic_year'): rollover_academic_year
+}
+
+# Request checks that need no database; they run before a connection is
+# taken and return the body the route receives.
+VALIDATORS = {
+    ('GET', 'homework'): check_homework_request,
+    ('POST', 'roster'): check_roster_request,
+    ('POST', 'academic_year'): check_rollover_request
+}
+
+# Entities teachers and students may read once tokens are required; all
+# other reads and every change are for admins.
+SHARED_READS = ('classes', 'subjects', 'teacher_subjects', 'schedule', 'homework')
+
+# Response for an entity without a route, per method.
+UNKNOWN_ENTITY = {
+    'GET': {'data': []},
+    'DELETE': {'success': True},
+    'PUT': {'success': False, 'error': 'Unknown entity'},
+    'POST': {'success': False, 'error': 'Unknown entity'}
+}
+
+
+def authorize(method: str, entity: str, identity: Optional[Dict[str, Any]]) -> None:
+    '''With tokens required, only admins change data; teachers and students read SHARED_READS.'''
+    if identity is None or identity.get('role') == 'admin':
+        return
+    if method != 'GET' or entity not in SHARED_READS:
+        raise HttpError(403, 'Forbidden')
+
+
+def read_response(cur, event: Dict[str, Any], entity: str, params: Dict[str, Any], body: Dict[str, Any],
+                  route) -> Dict[str, Any]:
+    '''body is what the entity's validator resolved (e.g. the default year); it is part of the ETag.'''
+    if entity in VERSIONED_ENTITIES:
+        etag = version_etag(cur, VERSIONED_ENTITIES[entity], dict(params, **body))
+        if etag_matches(request_header(event, 'if-none-match'), etag):
+            return conditional_response(event, '', etag)
+        return conditional_response(event, dumps(route(cur, params, body)), etag)
+    
+    payload = dumps(route(cur, params, body))
+    if entity in CACHED_ENTITIES:
+        etag = reference_cache.put(ReferenceCache.key(entity, params), payload)
+        return conditional_response(event, payload, etag, 'MISS')
+    return {'statusCode': 200, 'headers': JSON_HEADERS, 'isBase64Encoded': False, 'body': payload}
+
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
-    Business: Admin panel CRUD operations for classes, teachers, students, subjects
-    Args: event with httpMethod, queryStringParameters (action, entity)
+    Business: Admin panel CRUD operations for classes, teachers, students, subjects; dashboard stats; academic year rollover
+    Args: event with httpMethod, queryStringParameters (entity, id, filters), body for POST/PUT
     Returns: HTTP response with data or success status
     '''
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return {'statusCode': 200, 'headers': PREFLIGHT_HEADERS, 'isBase64Encoded': False, 'body': ''}
+    
+    if method not in UNKNOWN_ENTITY:
+        return json_response(405, {'error': 'Method not allowed'})
     
-    dsn = os.environ.get('DATABASE_URL')
-    params = event.get('queryStringParameters', {}) or {}
-    action = params.get('action', '')
+    params = event.get('queryStringParameters') or {}
     entity = params.get('entity', '')
     
     try:
-        conn = psycopg2.connect(dsn)
+        authorize(method, entity, request_identity(event))
+    except HttpError as e:
+        return json_response(e.status, e.payload)
+    
+    if method == 'GET':
+        if entity == 'cache_stats':
+            return json_response(200, {'data': reference_cache.stats()})
+        if entity in CACHED_ENTITIES:
+            cached = reference_cache.get(ReferenceCache.key(entity, params))
+            if cached:
+                return conditional_response(event, cached[0], cached[1], 'HIT')
+    
+    route = ROUTES.get((method, entity))
+    if route is None:
+        return json_response(200, UNKNOWN_ENTITY[method])
+    
+    conn = None
+    try:
+        body = parse_body(event) if method in ('POST', 'PUT') else {}
+        if (method, entity) in VALIDATORS:
+            body = VALIDATORS[(method, entity)](params, body)
+        conn = get_pool().getconn()
         cur = conn.cursor()
-        
-        if method == 'GET':
-            if entity == 'classes':
-                cur.execute("SELECT id, name, year FROM classes ORDER BY name")
-                rows = cur.fetchall()
-                data = [{'id': r[0], 'name': r[1], 'year': r[2]} for r in rows]
-                
-            elif entity == 'subjects':
-                cur.execute("SELECT id, name FROM subjects ORDER BY name")
-                rows = cur.fetchall()
-                data = [{'id': r[0], 'name': r[1]} for r in rows]
-                
-            elif entity == 'teachers':
-                cur.execute("""
-                    SELECT t.id, u.full_name, u.login, u.password, t.user_id
-                    FROM teachers t 
-                    JOIN users u ON t.user_id = u.id 
-                    ORDER BY u.full_name
-                """)
-                rows = cur.fetchall()
-                data = [{'id': r[0], 'full_name': r[1], 'login': r[2], 'password': r[3], 'user_id': r[4]} for r in rows]
-                
-            elif entity == 'students':
-                cur.execute("""
-                    SELECT s.id, u.full_name, u.login, u.password, c.name as class_name, s.class_id
-                    FROM students s 
-                    JOIN users u ON s.user_id = u.id 
-                    LEFT JOIN classes c ON s.class_id = c.id
-                    ORDER BY u.full_name
-                """)
-                rows = cur.fetchall()
-                data = [{'id': r[0], 'full_name': r[1], 'login': r[2], 'password': r[3], 'class_name': r[4], 'class_id': r[5]} for r in rows]
-                
-            elif entity == 'teacher_subjects':
-                teacher_id = params.get('teacher_id')
-                if teacher_id:
-                    cur.execute("""
-                        SELECT ts.id, s.id as subject_id, s.name as subject_name
-                        FROM teacher_subjects ts
-                        JOIN subjects s ON ts.subject_id = s.id
-                        WHERE ts.teacher_id = %s
-                    """, (teacher_id,))
-                    rows = cur.fetchall()
-                    data = [{'id': r[0], 'subject_id': r[1], 'subject_name': r[2]} for r in rows]
-                else:
-                    data = []
-            
-            elif entity == 'schedule':
-                class_id = params.get('class_id')
-                if class_id:
-                    cur.execute("""
-                        SELECT s.id, s.day_of_week, s.lesson_number, 
-                               sub.name as subject_name, u.full_name as teacher_name
-                        FROM schedule s
-                        JOIN subjects sub ON s.subject_id = sub.id
-                        LEFT JOIN teachers t ON s.teacher_id = t.id
-                        LEFT JOIN users u ON t.user_id = u.id
-                        WHERE s.class_id = %s
-                        ORDER BY s.day_of_week, s.lesson_number
-                    """, (class_id,))
-                    rows = cur.fetchall()
-                    data = [{'id': r[0], 'day_of_week': r[1], 'lesson_number': r[2], 'subject_name': r[3], 'teacher_name': r[4]} for r in rows]
-                else:
-                    cur.execute("""
-                        SELECT s.id, s.day_of_week, s.lesson_number, 
-                               c.name as class_name, sub.name as subject_name, 
-                               u.full_name as teacher_name, s.class_id
-                        FROM schedule s
-                        JOIN classes c ON s.class_id = c.id
-                        JOIN subjects sub ON s.subject_id = sub.id
-                        LEFT JOIN teachers t ON s.teacher_id = t.id
-                        LEFT JOIN users u ON t.user_id = u.id
-                        ORDER BY c.name, s.day_of_week, s.lesson_number
-                    """)
-                    rows = cur.fetchall()
-                    data = [{'id': r[0], 'day_of_week': r[1], 'lesson_number': r[2], 'class_name': r[3], 'subject_name': r[4], 'teacher_name': r[5], 'class_id': r[6]} for r in rows]
-            
-            elif entity == 'homework':
-                class_id = params.get('class_id')
-                if class_id:
-                    cur.execute("""
-                        SELECT h.id, h.description, h.due_date, 
-                               sub.name as subject_name, u.full_name as teacher_name
-                        FROM homework h
-                        JOIN subjects sub ON h.subject_id = sub.id
-                        LEFT JOIN teachers t ON h.teacher_id = t.id
-                        LEFT JOIN users u ON t.user_id = u.id
-                        WHERE h.class_id = %s
-                        ORDER BY h.due_date DESC
-                    """, (class_id,))
-                    rows = cur.fetchall()
-                    data = [{'id': r[0], 'description': r[1], 'due_date': str(r[2]), 'subject_name': r[3], 'teacher_name': r[4]} for r in rows]
-                else:
-                    cur.execute("""
-                        SELECT h.id, h.description, h.due_date, 
-                               c.name as class_name, sub.name as subject_name, 
-                               u.full_name as teacher_name, h.class_id
-                        FROM homework h
-                        JOIN classes c ON h.class_id = c.id
-                        JOIN subjects sub ON h.subject_id = sub.id
-                        LEFT JOIN teachers t ON h.teacher_id = t.id
-                        LEFT JOIN users u ON t.user_id = u.id
-                        ORDER BY h.due_date DESC
-                    """)
-                    rows = cur.fetchall()
-                    data = [{'id': r[0], 'description': r[1], 'due_date': str(r[2]), 'class_name': r[3], 'subject_name': r[4], 'teacher_name': r[5], 'class_id': r[6]} for r in rows]
-            
-            elif entity == 'stats':
-                class_id = params.get('class_id')
-                
-                if class_id:
-                    cur.execute("""
-                        SELECT 
-                            COUNT(DISTINCT s.id) as student_count,
-                            COUNT(DISTINCT g.id) as total_grades,
-                            COALESCE(AVG(g.grade), 0) as avg_grade
-                        FROM students s
-                        LEFT JOIN grades g ON s.id = g.student_id
-                        WHERE s.class_id = %s
-                    """, (class_id,))
-                    row = cur.fetchone()
-                    data = {'student_count': row[0], 'total_grades': row[1], 'avg_grade': float(row[2])}
-                else:
-                    cur.execute("""
-                        SELECT 
-                            (SELECT COUNT(*) FROM students) as total_students,
-                            (SELECT COUNT(*) FROM teachers) as total_teachers,
-                            (SELECT COUNT(*) FROM classes) as total_classes,
-                            (SELECT COUNT(*) FROM subjects) as total_subjects,
-                            COALESCE(AVG(grade), 0) as overall_avg
-                        FROM grades
-                    """)
-                    row = cur.fetchone()
-                    data = {
-                        'total_students': row[0],
-                        'total_teachers': row[1],
-                        'total_classes': row[2],
-                        'total_subjects': row[3],
-                        'overall_avg': float(row[4])
-                    }
-                
-            else:
-                data = []
-            
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'data': data})
-            }
-        
-        elif method == 'DELETE':
-            entity_id = params.get('id')
-            
-            if entity == 'class':
-                cur.execute("DELETE FROM schedule WHERE class_id = %s", (entity_id,))
-                cur.execute("DELETE FROM homework WHERE class_id = %s", (entity_id,))
-                cur.execute("DELETE FROM grades WHERE student_id IN (SELECT id FROM students WHERE class_id = %s)", (entity_id,))
-                cur.execute("DELETE FROM students WHERE class_id = %s", (entity_id,))
-                cur.execute("DELETE FROM classes WHERE id = %s", (entity_id,))
-            elif entity == 'subject':
-                cur.execute("DELETE FROM subjects WHERE id = %s", (entity_id,))
-            elif entity == 'teacher':
-                cur.execute("SELECT user_id FROM teachers WHERE id = %s", (entity_id,))
-                user_row = cur.fetchone()
-                if user_row:
-                    cur.execute("DELETE FROM teachers WHERE id = %s", (entity_id,))
-                    cur.execute("DELETE FROM users WHERE id = %s", (user_row[0],))
-            elif entity == 'student':
-                cur.execute("SELECT user_id FROM students WHERE id = %s", (entity_id,))
-                user_row = cur.fetchone()
-                if user_row:
-                    cur.execute("DELETE FROM students WHERE id = %s", (entity_id,))
-                    cur.execute("DELETE FROM users WHERE id = %s", (user_row[0],))
-            elif entity == 'schedule':
-                cur.execute("DELETE FROM schedule WHERE id = %s", (entity_id,))
-            
-            conn.commit()
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'success': True})
-            }
-        
-        elif method == 'PUT':
-            body_data = json.loads(event.get('body', '{}'))
-            entity_id = params.get('id')
-            
-            if entity == 'teacher':
-                user_id = body_data.get('user_id')
-                full_name = body_data.get('full_name')
-                login = body_data.get('login')
-                password = body_data.get('password')
-                
-                cur.execute("""
-                    UPDATE users 
-                    SET full_name = %s, login = %s, password = %s
-                    WHERE id = %s
-                """, (full_name, login, password, user_id))
-                conn.commit()
-                result = {'success': True}
-            
-            elif entity == 'student':
-                user_id = body_data.get('user_id')
-                full_name = body_data.get('full_name')
-                login = body_data.get('login')
-                password = body_data.get('password')
-                class_id = body_data.get('class_id')
-                
-                cur.execute("""
-                    UPDATE users 
-                    SET full_name = %s, login = %s, password = %s
-                    WHERE id = %s
-                """, (full_name, login, password, user_id))
-                
-                cur.execute("""
-                    UPDATE students 
-                    SET class_id = %s
-                    WHERE user_id = %s
-                """, (class_id, user_id))
-                
-                conn.commit()
-                result = {'success': True}
-            
-            elif entity == 'schedule':
-                class_id = body_data.get('class_id')
-                day_of_week = body_data.get('day_of_week')
-                lesson_number = body_data.get('lesson_number')
-                subject_id = body_data.get('subject_id')
-                teacher_id = body_data.get('teacher_id')
-                
-                cur.execute("""
-                    UPDATE schedule 
-                    SET class_id = %s, day_of_week = %s, lesson_number = %s, 
-                        subject_id = %s, teacher_id = %s
-                    WHERE id = %s
-                """, (class_id, day_of_week, lesson_number, subject_id, teacher_id, entity_id))
-                
-                conn.commit()
-                result = {'success': True}
-            
-            else:
-                result = {'success': False, 'error': 'Unknown entity'}
-            
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps(result)
-            }
-        
-        elif method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            
-            if entity == 'class':
-                name = body_data.get('name', '')
-                year = body_data.get('year', 2025)
-                cur.execute("INSERT INTO classes (name, year) VALUES (%s, %s) RETURNING id", (name, year))
-                new_id = cur.fetchone()[0]
-                conn.commit()
-                result = {'success': True, 'id': new_id}
-                
-            elif entity == 'subject':
-                name = body_data.get('name', '')
-                cur.execute("INSERT INTO subjects (name) VALUES (%s) RETURNING id", (name,))
-                new_id = cur.fetchone()[0]
-                conn.commit()
-                result = {'success': True, 'id': new_id}
-                
-            elif entity == 'teacher':
-                login = body_data.get('login', '')
-                password = body_data.get('password', '')
-                full_name = body_data.get('full_name', '')
-                
-                cur.execute("INSERT INTO users (login, password, role, full_name) VALUES (%s, %s, 'teacher', %s) RETURNING id", (login, password, full_name))
-                user_id = cur.fetchone()[0]
-                cur.execute("INSERT INTO teachers (user_id) VALUES (%s) RETURNING id", (user_id,))
-                teacher_id = cur.fetchone()[0]
-                conn.commit()
-                result = {'success': True, 'id': teacher_id}
-                
-            elif entity == 'student':
-                login = body_data.get('login', '')
-                password = body_data.get('password', '')
-                full_name = body_data.get('full_name', '')
-                class_id = body_data.get('class_id')
-                
-                cur.execute("INSERT INTO users (login, password, role, full_name) VALUES (%s, %s, 'student', %s) RETURNING id", (login, password, full_name))
-                user_id = cur.fetchone()[0]
-                cur.execute("INSERT INTO students (user_id, class_id) VALUES (%s, %s) RETURNING id", (user_id, class_id))
-                student_id = cur.fetchone()[0]
-                conn.commit()
-                result = {'success': True, 'id': student_id}
-            
-            elif entity == 'teacher_class':
-                teacher_id = body_data.get('teacher_id')
-                class_id = body_data.get('class_id')
-                subject_id = body_data.get('subject_id')
-                
-                cur.execute("INSERT INTO teacher_classes (teacher_id, class_id, subject_id) VALUES (%s, %s, %s) RETURNING id", (teacher_id, class_id, subject_id))
-                new_id = cur.fetchone()[0]
-                conn.commit()
-                result = {'success': True, 'id': new_id}
-            
-            elif entity == 'teacher_subject':
-                teacher_id = body_data.get('teacher_id')
-                subject_id = body_data.get('subject_id')
-                
-                cur.execute("INSERT INTO teacher_subjects (teacher_id, subject_id) VALUES (%s, %s) RETURNING id", (teacher_id, subject_id))
-                new_id = cur.fetchone()[0]
-                conn.commit()
-                result = {'success': True, 'id': new_id}
-            
-            elif entity == 'schedule':
-                class_id = body_data.get('class_id')
-                subject_id = body_data.get('subject_id')
-                teacher_id = body_data.get('teacher_id')
-                day_of_week = body_data.get('day_of_week')
-                lesson_number = body_data.get('lesson_number')
-                
-                cur.execute("""
-                    INSERT INTO schedule (class_id, subject_id, teacher_id, day_of_week, lesson_number)
-                    VALUES (%s, %s, %s, %s, %s)
-                    RETURNING id
-                """, (class_id, subject_id, teacher_id, day_of_week, lesson_number))
-                new_id = cur.fetchone()[0]
-                conn.commit()
-                result = {'success': True, 'id': new_id}
-            
-            elif entity == 'homework':
-                class_id = body_data.get('class_id')
-                subject_id = body_data.get('subject_id')
-                teacher_id = body_data.get('teacher_id')
-                description = body_data.get('description', '')
-                due_date = body_data.get('due_date')
-                
-                cur.execute("""
-                    INSERT INTO homework (class_id, subject_id, teacher_id, description, due_date)
-                    VALUES (%s, %s, %s, %s, %s)
-                    RETURNING id
-                """, (class_id, subject_id, teacher_id, description, due_date))
-                new_id = cur.fetchone()[0]
-                conn.commit()
-                result = {'success': True, 'id': new_id}
-            
-            else:
-                result = {'success': False, 'error': 'Unknown entity'}
-            
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps(result)
-            }
-        
-        else:
+        try:
+            if method == 'GET':
+                return read_response(cur, event, entity, params, body, route)
+            result = route(cur, params, body)
+        finally:
             cur.close()
-            conn.close()
-            return {
-                'statusCode': 405,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'error': 'Method not allowed'})
-            }
+        conn.commit()
+        reference_cache.invalidate(CACHE_INVALIDATES.get(entity, ()))
+        return json_response(200, result)
+    
+    except HttpError as e:
+        return json_response(e.status, e.payload)
     
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'error': str(e)})
-        }
\ No newline at end of file
+        return json_response(500, {'error': str(e)})
+    
+    finally:
+        if conn is not None:
+            get_pool().putconn(conn)
@@ -1,7 +1,405 @@
+import base64
+import hashlib
+import hmac
 import json
 import os
-import psycopg2
-from typing import Dict, Any
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    import orjson
+
+    def dumps(value: Any) -> str:
+        return orjson.dumps(value).decode()
+
+    loads = orjson.loads
+except ImportError:
+    dumps = json.dumps
+    loads = json.loads
+
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+PREFLIGHT_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'POST, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type',
+    'Access-Control-Max-Age': '86400'
+}
+
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+DB_POOL_CHECK_AFTER = float(os.environ.get('DB_POOL_CHECK_AFTER', '30'))
+
+# scrypt cost; stored hashes carry their own parameters, so raising N only
+# affects passwords hashed from then on.
+SCRYPT_N = int(os.environ.get('AUTH_SCRYPT_N', '16384'))
+SCRYPT_R = 8
+SCRYPT_P = 1
+# At most KDF_CONCURRENCY hashes run at once in a container; a login that
+# waits longer than KDF_WAIT for a slot gets a 503 instead of piling up.
+KDF_CONCURRENCY = int(os.environ.get('AUTH_KDF_CONCURRENCY', '2'))
+KDF_WAIT = float(os.environ.get('AUTH_KDF_WAIT', '5'))
+VERIFIED_TTL = float(os.environ.get('AUTH_VERIFIED_TTL', '300'))
+VERIFIED_CACHE_SIZE = int(os.environ.get('AUTH_VERIFIED_CACHE_SIZE', '10000'))
+
+# Session tokens: AUTH_TOKEN_KEYS is a comma-separated list of kid:secret
+# pairs. The first key signs; the other functions accept any listed key, so
+# a key is rotated by listing the new one first and dropping the old one
+# once AUTH_TOKEN_TTL has passed. While unset, login issues no token.
+TOKEN_KEYS = {
+    kid.strip(): secret.strip().encode()
+    for kid, secret in (item.split(':', 1) for item in os.environ.get('AUTH_TOKEN_KEYS', '').split(',') if ':' in item)
+}
+TOKEN_TTL = int(os.environ.get('AUTH_TOKEN_TTL', '43200'))
+
+# The user with its role-specific ids in one round trip. It runs as a
+# prepared statement, planned once per pooled connection.
+LOGIN_SQL = """
+    SELECT u.id, u.login, u.role, u.full_name, u.avatar_color, u.avatar_emoji, u.password,
+           t.id, s.id, s.class_id
+    FROM users u
+    LEFT JOIN teachers t ON u.role = 'teacher' AND t.user_id = u.id
+    LEFT JOIN students s ON u.role = 'student' AND s.user_id = u.id
+    WHERE u.login = $1
+    LIMIT 1
+"""
+
+
+class ConnectionPool:
+    '''
+    Postgres connections kept open between warm invocations of the function.
+    Connections idle longer than idle_timeout are closed; ones idle longer
+    than check_after are pinged before reuse. max_size 0 disables pooling.
+    psycopg2 is imported when the pool is built, so requests answered without
+    the database (preflights, 405s, validation errors) never load the driver.
+    '''
+
+    def __init__(self, dsn: str, max_size: int, idle_timeout: float, check_after: float):
+        import psycopg2
+        self.driver = psycopg2
+        self.dsn = dsn
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self._idle: List[Tuple[Any, float]] = []
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    def getconn(self, timeout: float = 10.0):
+        if self.max_size <= 0:
+            return self.driver.connect(self.dsn)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._evict_idle()
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    break
+                if self._in_use < self.max_size:
+                    conn, released_at = None, 0.0
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RuntimeError('Database connection pool exhausted')
+                self._cond.wait(remaining)
+            self._in_use += 1
+        try:
+            if conn is not None and not self._is_healthy(conn, released_at):
+                self._close(conn)
+                conn = None
+            if conn is None:
+                conn = self.driver.connect(self.dsn)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def putconn(self, conn) -> None:
+        if self.max_size <= 0:
+            self._close(conn)
+            return
+        reusable = not conn.closed
+        if reusable:
+            try:
+                conn.rollback()
+            except self.driver.Error:
+                reusable = False
+                self._close(conn)
+        with self._cond:
+            self._in_use -= 1
+            if reusable:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        keep = []
+        for conn, released_at in self._idle:
+            if now - released_at > self.idle_timeout:
+                self._close(conn)
+            else:
+                keep.append((conn, released_at))
+        self._idle = keep
+
+    def _is_healthy(self, conn, released_at: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - released_at < self.check_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.close()
+            conn.rollback()
+            return True
+        except self.driver.Error:
+            return False
+
+    def _close(self, conn) -> None:
+        try:
+            conn.close()
+        except self.driver.Error:
+            pass
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    os.environ.get('DATABASE_URL'),
+                    DB_POOL_MAX_SIZE,
+                    DB_POOL_IDLE_TIMEOUT,
+                    DB_POOL_CHECK_AFTER
+                )
+    return _pool
+
+
+class HttpError(Exception):
+    '''Raised by a route to answer with a non-2xx status; the transaction is rolled back.'''
+
+    def __init__(self, status: int, error: Any):
+        super().__init__(error)
+        self.status = status
+        self.payload = error if isinstance(error, dict) else {'error': error}
+
+
+def json_response(status: int, payload: Any) -> Dict[str, Any]:
+    return {'statusCode': status, 'headers': JSON_HEADERS, 'isBase64Encoded': False, 'body': dumps(payload)}
+
+
+def parse_body(event: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        body = loads(event.get('body') or '{}')
+    except ValueError:
+        raise HttpError(400, 'Invalid JSON body')
+    if not isinstance(body, dict):
+        raise HttpError(400, 'JSON object expected')
+    return body
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int, dklen: int) -> bytes:
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r * p, dklen=dklen)
+
+
+def is_password_hash(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith('scrypt$')
+
+
+def hash_password(password: str) -> str:
+    '''Stored form: scrypt$n$r$p$salt$hash, salt and hash base64url without padding.'''
+    salt = os.urandom(16)
+    digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P, 32)
+    return f'scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}'
+
+
+def verify_password(password: str, stored: str) -> bool:
+    '''Check against a scrypt hash, or in constant time against a not yet migrated plaintext row.'''
+    if not is_password_hash(stored):
+        return hmac.compare_digest(password.encode(), (stored or '').encode())
+    try:
+        _, n, r, p, salt, digest = stored.split('$')
+        expected = _unb64(digest)
+        actual = _scrypt(password, _unb64(salt), int(n), int(r), int(p), len(expected))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+_kdf_slots = threading.BoundedSemaphore(KDF_CONCURRENCY)
+_dummy_hash: Optional[str] = None
+
+
+def run_kdf(fn, *args):
+    '''Run password hashing work in one of the KDF_CONCURRENCY slots.'''
+    if not _kdf_slots.acquire(timeout=KDF_WAIT):
+        raise HttpError(503, 'Too many logins in progress, try again')
+    try:
+        return fn(*args)
+    finally:
+        _kdf_slots.release()
+
+
+def dummy_hash() -> str:
+    '''A hash to verify against for unknown logins, so they cost as much as a wrong password.'''
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password(_b64(os.urandom(16)))
+    return _dummy_hash
+
+
+class VerifiedCredentials:
+    '''
+    Short-lived record of successful password checks, so a repeat login skips
+    the KDF. Entries are HMACs of (user id, stored hash, password) under a
+    random per-container key: the cache holds nothing that can be tested
+    offline, and a changed password changes the stored hash and misses.
+    '''
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._key = os.urandom(32)
+        self._entries: 'OrderedDict[bytes, float]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _digest(self, user_id: int, stored: str, password: str) -> bytes:
+        return hmac.new(self._key, f'{user_id}\0{stored}\0{password}'.encode(), hashlib.sha256).digest()
+
+    def check(self, user_id: int, stored: str, password: str) -> bool:
+        if self.ttl <= 0:
+            return False
+        key = self._digest(user_id, stored, password)
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires is None or expires < time.monotonic():
+                return False
+            self._entries.move_to_end(key)
+            return True
+
+    def add(self, user_id: int, stored: str, password: str) -> None:
+        if self.ttl <= 0:
+            return
+        key = self._digest(user_id, stored, password)
+        with self._lock:
+            self._entries[key] = time.monotonic() + self.ttl
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+verified_credentials = VerifiedCredentials(VERIFIED_TTL, VERIFIED_CACHE_SIZE)
+
+
+def issue_token(claims: Dict[str, Any]) -> str:
+    '''
+    kid.payload.signature, all base64url: payload is the JSON claims plus exp,
+    signature an HMAC-SHA256 of "kid.payload" with the first of TOKEN_KEYS.
+    '''
+    kid, key = next(iter(TOKEN_KEYS.items()))
+    payload = _b64(dumps(dict(claims, exp=int(time.time()) + TOKEN_TTL)).encode())
+    signature = hmac.new(key, f'{kid}.{payload}'.encode(), hashlib.sha256).digest()
+    return f'{kid}.{payload}.{_b64(signature)}'
+
+
+# Connections that have LOGIN_SQL prepared; closed connections drop out by themselves.
+_login_prepared: 'weakref.WeakSet' = weakref.WeakSet()
+
+
+def fetch_login(cur, login: str) -> Optional[tuple]:
+    conn = cur.connection
+    if conn not in _login_prepared:
+        cur.execute('PREPARE login_user (text) AS ' + LOGIN_SQL)
+        _login_prepared.add(conn)
+    cur.execute('EXECUTE login_user (%s)', (login,))
+    return cur.fetchone()
+
+
+def login_user(cur, event: Dict[str, Any], params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    login = body['login']
+    password = body['password']
+    
+    user = fetch_login(cur, login)
+    
+    if not user:
+        run_kdf(verify_password, password, dummy_hash())
+        return json_response(401, {'success': False, 'error': 'Invalid credentials'})
+    
+    stored = user[6]
+    if not verified_credentials.check(user[0], stored, password):
+        if not run_kdf(verify_password, password, stored):
+            return json_response(401, {'success': False, 'error': 'Invalid credentials'})
+        if not is_password_hash(stored):
+            # Plaintext rows from before hashing are upgraded on their first successful login.
+            new_hash = run_kdf(hash_password, password)
+            cur.execute("UPDATE users SET password = %s WHERE id = %s AND password = %s", (new_hash, user[0], stored))
+            stored = new_hash
+        verified_credentials.add(user[0], stored, password)
+    
+    role = user[2]
+    teacher_id, student_id, class_id = user[7], user[8], user[9]
+    
+    user_data = {
+        'id': user[0],
+        'login': user[1],
+        'role': user[2],
+        'full_name': user[3],
+        'avatar_color': user[4],
+        'avatar_emoji': user[5],
+        'teacher_id': teacher_id,
+        'student_id': student_id,
+        'class_id': class_id
+    }
+    
+    if not TOKEN_KEYS:
+        return json_response(200, {'success': True, 'user': user_data})
+    
+    # The other functions take the caller's identity from this token instead of ids in the request.
+    token = issue_token({
+        'user_id': user_data['id'],
+        'role': role,
+        'teacher_id': teacher_id,
+        'student_id': student_id,
+        'class_id': class_id
+    })
+    return json_response(200, {'success': True, 'user': user_data, 'token': token})
+
+
+def check_credentials_request(params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    if not body.get('login') or not body.get('password'):
+        raise HttpError(400, 'Login and password required')
+    if not isinstance(body['login'], str) or not isinstance(body['password'], str):
+        raise HttpError(400, 'Login and password must be strings')
+    return body
+
+
+ROUTES = {
+    'POST': login_user
+}
+
+# Request checks that need no database; they run before a connection is
+# taken and return the body the route receives.
+VALIDATORS = {
+    'POST': check_credentials_request
+}
+
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -12,103 +410,32 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'isBase64Encoded': False,
-            'body': ''
-        }
+        return {'statusCode': 200, 'headers': PREFLIGHT_HEADERS, 'isBase64Encoded': False, 'body': ''}
     
-    if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
+    route = ROUTES.get(method)
+    if route is None:
+        return json_response(405, {'error': 'Method not allowed'})
     
-    body_data = json.loads(event.get('body', '{}'))
-    login = body_data.get('login', '')
-    password = body_data.get('password', '')
-    
-    if not login or not password:
-        return {
-            'statusCode': 400,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'error': 'Login and password required'})
-        }
-    
-    dsn = os.environ.get('DATABASE_URL')
+    params = event.get('queryStringParameters') or {}
     
+    conn = None
     try:
-        conn = psycopg2.connect(dsn)
+        body = VALIDATORS[method](params, parse_body(event))
+        conn = get_pool().getconn()
         cur = conn.cursor()
-        
-        login_escaped = login.replace("'", "''")
-        password_escaped = password.replace("'", "''")
-        
-        cur.execute(f"SELECT id, login, role, full_name, avatar_color, avatar_emoji FROM users WHERE login = '{login_escaped}' AND password = '{password_escaped}'")
-        user = cur.fetchone()
-        
-        if user:
-            user_id = user[0]
-            role = user[2]
-            
-            if role == 'teacher':
-                cur.execute(f"SELECT id FROM teachers WHERE user_id = {user_id}")
-                teacher_row = cur.fetchone()
-                teacher_id = teacher_row[0] if teacher_row else None
-            elif role == 'student':
-                cur.execute(f"SELECT id, class_id FROM students WHERE user_id = {user_id}")
-                student_row = cur.fetchone()
-                student_id = student_row[0] if student_row else None
-                class_id = student_row[1] if student_row else None
-            else:
-                teacher_id = None
-                student_id = None
-                class_id = None
-            
+        try:
+            response = route(cur, event, params, body)
+        finally:
             cur.close()
-            conn.close()
-            
-            user_data = {
-                'id': user[0],
-                'login': user[1],
-                'role': user[2],
-                'full_name': user[3],
-                'avatar_color': user[4],
-                'avatar_emoji': user[5],
-                'teacher_id': teacher_id if role == 'teacher' else None,
-                'student_id': student_id if role == 'student' else None,
-                'class_id': class_id if role == 'student' else None
-            }
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'success': True, 'user': user_data})
-            }
-        else:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 401,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'success': False, 'error': 'Invalid credentials'})
-            }
+        conn.commit()
+        return response
+    
+    except HttpError as e:
+        return json_response(e.status, e.payload)
     
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'error': str(e)})
-        }
\ No newline at end of file
+        return json_response(500, {'error': str(e)})
+    
+    finally:
+        if conn is not None:
+            get_pool().putconn(conn)
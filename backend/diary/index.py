@@ -0,0 +1,413 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    import orjson
+
+    def dumps(value: Any) -> str:
+        return orjson.dumps(value).decode()
+
+    loads = orjson.loads
+except ImportError:
+    dumps = json.dumps
+    loads = json.loads
+
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+PREFLIGHT_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, If-None-Match, X-Auth-Token',
+    'Access-Control-Max-Age': '86400'
+}
+# private: the week belongs to one student and must not be kept by shared caches.
+CONDITIONAL_HEADERS = dict(JSON_HEADERS, **{'Access-Control-Expose-Headers': 'ETag', 'Cache-Control': 'private, no-cache'})
+
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+DB_POOL_CHECK_AFTER = float(os.environ.get('DB_POOL_CHECK_AFTER', '30'))
+
+# Session tokens issued by the auth function: comma-separated kid:secret
+# pairs (AUTH_TOKEN_KEYS). While unset, requests carry no identity check.
+TOKEN_KEYS = {
+    kid.strip(): secret.strip().encode()
+    for kid, secret in (item.split(':', 1) for item in os.environ.get('AUTH_TOKEN_KEYS', '').split(',') if ':' in item)
+}
+
+# One student's week in a single statement: the class timetable, homework
+# due that week and the grades given in it.
+# Grades come from idx_grades_student_date, homework from
+# idx_homework_class_due_date and the timetable from idx_schedule_class_day_lesson.
+WEEK_SQL = """
+    SELECT
+        st.class_id,
+        COALESCE((
+            SELECT json_agg(json_build_object(
+                'day_of_week', sc.day_of_week,
+                'lesson_number', sc.lesson_number,
+                'subject_id', sc.subject_id,
+                'subject_name', sub.name,
+                'teacher_name', u.full_name
+            ) ORDER BY sc.day_of_week, sc.lesson_number)
+            FROM schedule sc
+            JOIN subjects sub ON sub.id = sc.subject_id
+            LEFT JOIN teachers t ON t.id = sc.teacher_id
+            LEFT JOIN users u ON u.id = t.user_id
+            WHERE sc.class_id = st.class_id
+        ), '[]'),
+        COALESCE((
+            SELECT json_agg(json_build_object(
+                'id', h.id,
+                'subject_id', h.subject_id,
+                'description', h.description,
+                'due_date', to_char(h.due_date, 'YYYY-MM-DD')
+            ) ORDER BY h.due_date, h.id)
+            FROM homework h
+            WHERE h.class_id = st.class_id AND h.due_date BETWEEN %(week_start)s AND %(week_end)s
+        ), '[]'),
+        COALESCE((
+            SELECT json_agg(json_build_object(
+                'id', g.id,
+                'subject_id', g.subject_id,
+                'grade', g.grade,
+                'date', to_char(g.grade_date, 'YYYY-MM-DD'),
+                'comment', g.comment
+            ) ORDER BY g.grade_date, g.id)
+            FROM grades g
+            WHERE g.student_id = st.id AND g.grade_date BETWEEN %(week_start)s AND %(week_end)s
+        ), '[]')
+    FROM students st
+    WHERE st.id = %(student_id)s
+"""
+
+
+class ConnectionPool:
+    '''
+    Postgres connections kept open between warm invocations of the function.
+    Connections idle longer than idle_timeout are closed; ones idle longer
+    than check_after are pinged before reuse. max_size 0 disables pooling.
+    psycopg2 is imported when the pool is built, so requests answered without
+    the database (preflights, 405s, validation errors) never load the driver.
+    '''
+
+    def __init__(self, dsn: str, max_size: int, idle_timeout: float, check_after: float):
+        import psycopg2
+        self.driver = psycopg2
+        self.dsn = dsn
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self._idle: List[Tuple[Any, float]] = []
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    def getconn(self, timeout: float = 10.0):
+        if self.max_size <= 0:
+            return self.driver.connect(self.dsn)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._evict_idle()
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    break
+                if self._in_use < self.max_size:
+                    conn, released_at = None, 0.0
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RuntimeError('Database connection pool exhausted')
+                self._cond.wait(remaining)
+            self._in_use += 1
+        try:
+            if conn is not None and not self._is_healthy(conn, released_at):
+                self._close(conn)
+                conn = None
+            if conn is None:
+                conn = self.driver.connect(self.dsn)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def putconn(self, conn) -> None:
+        if self.max_size <= 0:
+            self._close(conn)
+            return
+        reusable = not conn.closed
+        if reusable:
+            try:
+                conn.rollback()
+            except self.driver.Error:
+                reusable = False
+                self._close(conn)
+        with self._cond:
+            self._in_use -= 1
+            if reusable:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        keep = []
+        for conn, released_at in self._idle:
+            if now - released_at > self.idle_timeout:
+                self._close(conn)
+            else:
+                keep.append((conn, released_at))
+        self._idle = keep
+
+    def _is_healthy(self, conn, released_at: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - released_at < self.check_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.close()
+            conn.rollback()
+            return True
+        except self.driver.Error:
+            return False
+
+    def _close(self, conn) -> None:
+        try:
+            conn.close()
+        except self.driver.Error:
+            pass
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    os.environ.get('DATABASE_URL'),
+                    DB_POOL_MAX_SIZE,
+                    DB_POOL_IDLE_TIMEOUT,
+                    DB_POOL_CHECK_AFTER
+                )
+    return _pool
+
+
+class HttpError(Exception):
+    '''Raised by a route to answer with a non-2xx status; the transaction is rolled back.'''
+
+    def __init__(self, status: int, error: Any):
+        super().__init__(error)
+        self.status = status
+        self.payload = error if isinstance(error, dict) else {'error': error}
+
+
+def json_response(status: int, payload: Any) -> Dict[str, Any]:
+    return {'statusCode': status, 'headers': JSON_HEADERS, 'isBase64Encoded': False, 'body': dumps(payload)}
+
+
+def request_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def verify_token(token: str) -> Dict[str, Any]:
+    '''Claims of a token signed with one of TOKEN_KEYS; 401 if it is malformed, forged or expired.'''
+    kid, _, rest = token.partition('.')
+    payload, _, signature = rest.partition('.')
+    key = TOKEN_KEYS.get(kid)
+    if key is None:
+        raise HttpError(401, 'Invalid token')
+    expected = hmac.new(key, f'{kid}.{payload}'.encode(), hashlib.sha256).digest()
+    try:
+        if not hmac.compare_digest(expected, base64.urlsafe_b64decode(signature + '=' * (-len(signature) % 4))):
+            raise HttpError(401, 'Invalid token')
+        claims = loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+    except ValueError:
+        raise HttpError(401, 'Invalid token')
+    if claims.get('exp', 0) < time.time():
+        raise HttpError(401, 'Token expired')
+    return claims
+
+
+def request_identity(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    '''Claims of the X-Auth-Token header, or None while AUTH_TOKEN_KEYS is not configured.'''
+    if not TOKEN_KEYS:
+        return None
+    token = request_header(event, 'x-auth-token')
+    if not token:
+        raise HttpError(401, 'Authentication required')
+    return verify_token(token)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(',')]
+    return '*' in candidates or etag in [c[2:] if c.startswith('W/') else c for c in candidates]
+
+
+def week_etag(body: str) -> str:
+    '''
+    ETag of the week itself, hashed from the response: it changes only when
+    that student's grades, their class's homework and timetable for the week
+    (or the names shown in them) change, not on every write in the school.
+    '''
+    return '"' + hashlib.blake2b(body.encode(), digest_size=12).hexdigest() + '"'
+
+
+def conditional_response(event: Dict[str, Any], body: str, etag: str) -> Dict[str, Any]:
+    headers = dict(CONDITIONAL_HEADERS, ETag=etag)
+    if etag_matches(request_header(event, 'if-none-match'), etag):
+        return {'statusCode': 304, 'headers': headers, 'isBase64Encoded': False, 'body': ''}
+    return {'statusCode': 200, 'headers': headers, 'isBase64Encoded': False, 'body': body}
+
+
+def build_week(week_start: date, lessons: List[Dict[str, Any]], homework: List[Dict[str, Any]],
+               grades: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    '''
+    Lay the class timetable over the dates of the week. Homework due and grades
+    given on a day go under that day's first lesson of the same subject; ones
+    without such a lesson stay on the day itself.
+    '''
+    days = [{
+        'date': (week_start + timedelta(days=offset)).isoformat(),
+        'day_of_week': offset + 1,
+        'lessons': [],
+        'homework': [],
+        'grades': []
+    } for offset in range(7)]
+    
+    slots = {}
+    for lesson in lessons:
+        entry = dict(lesson, homework=[], grades=[])
+        days[lesson['day_of_week'] - 1]['lessons'].append(entry)
+        slots.setdefault((lesson['day_of_week'], lesson['subject_id']), entry)
+    
+    for key, items, date_field in (('homework', homework, 'due_date'), ('grades', grades, 'date')):
+        for item in items:
+            day_of_week = (date.fromisoformat(item[date_field]) - week_start).days + 1
+            slot = slots.get((day_of_week, item['subject_id']))
+            (slot or days[day_of_week - 1])[key].append(item)
+    return days
+
+
+def authorize(method: str, params: Dict[str, Any], body: Dict[str, Any],
+              identity: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    '''Check the caller's role against ROLES; a student only ever gets their own week.'''
+    if identity is None:
+        return params, body
+    role = identity.get('role')
+    if role not in ROLES[method]:
+        raise HttpError(403, 'Forbidden')
+    if role == 'student':
+        params = dict(params, student_id=identity.get('student_id'))
+    return params, body
+
+
+def check_week_request(params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    '''Resolve student_id and the Monday of the requested week; week is any date in it, this week by default.'''
+    try:
+        student_id = int(params.get('student_id'))
+    except (TypeError, ValueError):
+        raise HttpError(400, 'student_id must be an integer')
+    try:
+        day = date.fromisoformat(params['week']) if params.get('week') else date.today()
+    except ValueError:
+        raise HttpError(400, 'week must be YYYY-MM-DD')
+    return {'student_id': student_id, 'week_start': day - timedelta(days=day.weekday())}
+
+
+def get_week(cur, event: Dict[str, Any], params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    student_id = body['student_id']
+    week_start = body['week_start']
+    week_end = week_start + timedelta(days=6)
+    
+    # Revalidation runs the same indexed statement; an unchanged week is
+    # answered with a 304 and no body.
+    cur.execute(WEEK_SQL, {
+        'student_id': student_id,
+        'week_start': week_start,
+        'week_end': week_end
+    })
+    row = cur.fetchone()
+    if row is None:
+        raise HttpError(404, 'Student not found')
+    class_id, lessons, homework, grades = row
+    
+    payload = dumps({
+        'student_id': student_id,
+        'class_id': class_id,
+        'week_start': week_start.isoformat(),
+        'week_end': week_end.isoformat(),
+        'days': build_week(week_start, lessons, homework, grades)
+    })
+    return conditional_response(event, payload, week_etag(payload))
+
+
+ROUTES = {
+    'GET': get_week
+}
+
+# Roles allowed to call each method once tokens are required.
+ROLES = {
+    'GET': ('admin', 'teacher', 'student')
+}
+
+# Request checks that need no database; they run before a connection is
+# taken and return the body the route receives.
+VALIDATORS = {
+    'GET': check_week_request
+}
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Student diary - one week of timetable with the homework due and grades given, in one request
+    Args: event with httpMethod, queryStringParameters (student_id, week as any YYYY-MM-DD in the week), headers
+    Returns: HTTP response with the week's days, or 304 when the If-None-Match ETag is still current
+    '''
+    method: str = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return {'statusCode': 200, 'headers': PREFLIGHT_HEADERS, 'isBase64Encoded': False, 'body': ''}
+    
+    route = ROUTES.get(method)
+    if route is None:
+        return json_response(405, {'error': 'Method not allowed'})
+    
+    params = event.get('queryStringParameters') or {}
+    
+    conn = None
+    try:
+        params, body = authorize(method, params, {}, request_identity(event))
+        body = VALIDATORS[method](params, body)
+        conn = get_pool().getconn()
+        cur = conn.cursor()
+        try:
+            return route(cur, event, params, body)
+        finally:
+            cur.close()
+    
+    except HttpError as e:
+        return json_response(e.status, e.payload)
+    
+    except Exception as e:
+        return json_response(500, {'error': str(e)})
+    
+    finally:
+        if conn is not None:
+            get_pool().putconn(conn)
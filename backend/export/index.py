@@ -0,0 +1,488 @@
+import base64
+import csv
+import gzip
+import hashlib
+import hmac
+import io
+import json
+import os
+import re
+import threading
+import time
+import zipfile
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Any, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+try:
+    import orjson
+
+    def dumps(value: Any) -> str:
+        return orjson.dumps(value).decode()
+
+    loads = orjson.loads
+except ImportError:
+    dumps = json.dumps
+    loads = json.loads
+
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+PREFLIGHT_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token',
+    'Access-Control-Max-Age': '86400'
+}
+FILE_HEADERS = {
+    'csv': {'Content-Type': 'text/csv; charset=utf-8', 'Content-Encoding': 'gzip'},
+    'xlsx': {'Content-Type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'}
+}
+
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+DB_POOL_CHECK_AFTER = float(os.environ.get('DB_POOL_CHECK_AFTER', '30'))
+# Rows fetched from the server-side cursor per round trip; the only rows held in memory at once.
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '2000'))
+EXPORT_MAX_BYTES = int(os.environ.get('EXPORT_MAX_BYTES', str(20 * 1024 * 1024)))
+
+# Session tokens issued by the auth function: comma-separated kid:secret
+# pairs (AUTH_TOKEN_KEYS). While unset, requests carry no identity check.
+TOKEN_KEYS = {
+    kid.strip(): secret.strip().encode()
+    for kid, secret in (item.split(':', 1) for item in os.environ.get('AUTH_TOKEN_KEYS', '').split(',') if ':' in item)
+}
+
+EXPORT_COLUMNS = {
+    'journal': ('Класс', 'Ученик', 'Предмет', 'Дата', 'Оценка', 'Комментарий'),
+    'report': ('Класс', 'Ученик', 'Предмет', 'Оценок', 'Средний балл')
+}
+
+# journal: every grade in the scope, one row each. report: the term summary,
+# one row per student and subject with the number of grades and their average.
+# {where} is built from fixed conditions by export_filters; values stay parameters.
+EXPORT_SQL = {
+    'journal': """
+        SELECT c.name, u.full_name, sub.name, to_char(g.grade_date, 'YYYY-MM-DD'), g.grade, g.comment
+        FROM grades g
+        JOIN students s ON s.id = g.student_id
+        JOIN classes c ON c.id = s.class_id
+        JOIN users u ON u.id = s.user_id
+        JOIN subjects sub ON sub.id = g.subject_id
+        WHERE {where}
+        ORDER BY c.name, c.id, u.full_name, s.id, sub.name, g.grade_date, g.id
+    """,
+    'report': """
+        SELECT c.name, u.full_name, sub.name, COUNT(*), ROUND(AVG(g.grade), 2)
+        FROM grades g
+        JOIN students s ON s.id = g.student_id
+        JOIN classes c ON c.id = s.class_id
+        JOIN users u ON u.id = s.user_id
+        JOIN subjects sub ON sub.id = g.subject_id
+        WHERE {where}
+        GROUP BY c.id, c.name, s.id, u.full_name, sub.id, sub.name
+        ORDER BY c.name, c.id, u.full_name, s.id, sub.name
+    """
+}
+
+# Part of the class name before the letter: 5 for "5А"
+LEVEL_SQL = "substring(c.name FROM '^[0-9]+')"
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Оценки" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    )
+}
+XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+XLSX_SHEET_END = '</sheetData></worksheet>'
+# Control characters XML 1.0 does not allow even escaped; they can only come from free-text comments.
+XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class ConnectionPool:
+    '''
+    Postgres connections kept open between warm invocations of the function.
+    Connections idle longer than idle_timeout are closed; ones idle longer
+    than check_after are pinged before reuse. max_size 0 disables pooling.
+    psycopg2 is imported when the pool is built, so requests answered without
+    the database (preflights, 405s, validation errors) never load the driver.
+    '''
+
+    def __init__(self, dsn: str, max_size: int, idle_timeout: float, check_after: float):
+        import psycopg2
+        self.driver = psycopg2
+        self.dsn = dsn
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self._idle: List[Tuple[Any, float]] = []
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    def getconn(self, timeout: float = 10.0):
+        if self.max_size <= 0:
+            return self.driver.connect(self.dsn)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._evict_idle()
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    break
+                if self._in_use < self.max_size:
+                    conn, released_at = None, 0.0
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RuntimeError('Database connection pool exhausted')
+                self._cond.wait(remaining)
+            self._in_use += 1
+        try:
+            if conn is not None and not self._is_healthy(conn, released_at):
+                self._close(conn)
+                conn = None
+            if conn is None:
+                conn = self.driver.connect(self.dsn)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def putconn(self, conn) -> None:
+        if self.max_size <= 0:
+            self._close(conn)
+            return
+        reusable = not conn.closed
+        if reusable:
+            try:
+                conn.rollback()
+            except self.driver.Error:
+                reusable = False
+                self._close(conn)
+        with self._cond:
+            self._in_use -= 1
+            if reusable:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        keep = []
+        for conn, released_at in self._idle:
+            if now - released_at > self.idle_timeout:
+                self._close(conn)
+            else:
+                keep.append((conn, released_at))
+        self._idle = keep
+
+    def _is_healthy(self, conn, released_at: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - released_at < self.check_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.close()
+            conn.rollback()
+            return True
+        except self.driver.Error:
+            return False
+
+    def _close(self, conn) -> None:
+        try:
+            conn.close()
+        except self.driver.Error:
+            pass
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    os.environ.get('DATABASE_URL'),
+                    DB_POOL_MAX_SIZE,
+                    DB_POOL_IDLE_TIMEOUT,
+                    DB_POOL_CHECK_AFTER
+                )
+    return _pool
+
+
+class HttpError(Exception):
+    '''Raised by a route to answer with a non-2xx status; the transaction is rolled back.'''
+
+    def __init__(self, status: int, error: Any):
+        super().__init__(error)
+        self.status = status
+        self.payload = error if isinstance(error, dict) else {'error': error}
+
+
+def json_response(status: int, payload: Any) -> Dict[str, Any]:
+    return {'statusCode': status, 'headers': JSON_HEADERS, 'isBase64Encoded': False, 'body': dumps(payload)}
+
+
+def request_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def verify_token(token: str) -> Dict[str, Any]:
+    '''Claims of a token signed with one of TOKEN_KEYS; 401 if it is malformed, forged or expired.'''
+    kid, _, rest = token.partition('.')
+    payload, _, signature = rest.partition('.')
+    key = TOKEN_KEYS.get(kid)
+    if key is None:
+        raise HttpError(401, 'Invalid token')
+    expected = hmac.new(key, f'{kid}.{payload}'.encode(), hashlib.sha256).digest()
+    try:
+        if not hmac.compare_digest(expected, base64.urlsafe_b64decode(signature + '=' * (-len(signature) % 4))):
+            raise HttpError(401, 'Invalid token')
+        claims = loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+    except ValueError:
+        raise HttpError(401, 'Invalid token')
+    if claims.get('exp', 0) < time.time():
+        raise HttpError(401, 'Token expired')
+    return claims
+
+
+def request_identity(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    '''Claims of the X-Auth-Token header, or None while AUTH_TOKEN_KEYS is not configured.'''
+    if not TOKEN_KEYS:
+        return None
+    token = request_header(event, 'x-auth-token')
+    if not token:
+        raise HttpError(401, 'Authentication required')
+    return verify_token(token)
+
+
+class XlsxWriter:
+    '''
+    Single-sheet .xlsx written row by row into a zip stream. Strings are stored
+    inline rather than in a shared-strings table, so nothing but the current
+    row is kept in memory; the zip only holds the compressed sheet.
+    '''
+
+    def __init__(self, fileobj: Any):
+        self.zip = zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED)
+        for name, xml in XLSX_PARTS.items():
+            self.zip.writestr(name, xml)
+        self.sheet = self.zip.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True)
+        self.sheet.write(XLSX_SHEET_START.encode())
+
+    def writerow(self, values: Tuple[Any, ...]) -> None:
+        cells = []
+        for value in values:
+            if value is None:
+                cells.append('<c/>')
+            elif isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+                cells.append(f'<c><v>{value}</v></c>')
+            else:
+                text = escape(XML_INVALID.sub('', str(value)))
+                cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+        self.sheet.write(f'<row>{"".join(cells)}</row>'.encode())
+
+    def writerows(self, rows: List[Tuple[Any, ...]]) -> None:
+        for row in rows:
+            self.writerow(row)
+
+    def close(self) -> None:
+        self.sheet.write(XLSX_SHEET_END.encode())
+        self.sheet.close()
+        self.zip.close()
+
+
+def authorize(method: str, params: Dict[str, Any], body: Dict[str, Any],
+              identity: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    '''Check the caller's role against ROLES; teachers export one class at a time, wider scopes are for admins.'''
+    if identity is None:
+        return params, body
+    role = identity.get('role')
+    if role not in ROLES[method]:
+        raise HttpError(403, 'Forbidden')
+    if role == 'teacher' and not params.get('class_id'):
+        raise HttpError(403, 'Teachers export one class at a time')
+    return params, body
+
+
+def check_export_request(params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Resolve the export: kind (journal, report), format (csv, xlsx) and the
+    scope - class_id, level (the number in the class name) or the whole school -
+    optionally narrowed to subject_id and a date_from..date_to term.
+    '''
+    kind = params.get('kind') or 'journal'
+    if kind not in EXPORT_SQL:
+        raise HttpError(400, 'kind must be journal or report')
+    file_format = params.get('format') or 'csv'
+    if file_format not in FILE_HEADERS:
+        raise HttpError(400, 'format must be csv or xlsx')
+    
+    conditions, args, scope = [], [], []
+    for field, column in (('class_id', 's.class_id'), ('level', LEVEL_SQL), ('subject_id', 'g.subject_id')):
+        if params.get(field) in (None, ''):
+            continue
+        try:
+            value = int(params[field])
+        except (TypeError, ValueError):
+            raise HttpError(400, f'{field} must be an integer')
+        conditions.append(f'{column} = %s')
+        args.append(str(value) if field == 'level' else value)
+        scope.append(f'{field.split("_")[0]}{value}')
+    for field, operator in (('date_from', '>='), ('date_to', '<=')):
+        if not params.get(field):
+            continue
+        try:
+            day = date.fromisoformat(params[field])
+        except ValueError:
+            raise HttpError(400, f'{field} must be YYYY-MM-DD')
+        conditions.append(f'g.grade_date {operator} %s')
+        args.append(day)
+    
+    return {
+        'kind': kind,
+        'format': file_format,
+        'sql': EXPORT_SQL[kind].format(where=' AND '.join(conditions) or 'TRUE'),
+        'args': args,
+        'filename': f'{kind}-{"-".join(scope) or "school"}.{file_format}'
+    }
+
+
+def export_grades(cur, event: Dict[str, Any], params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Rows come from a server-side cursor EXPORT_BATCH_SIZE at a time and go
+    straight into the compressed file, so memory follows the size of the
+    compressed output, not the number of rows in the school.
+    A function response cannot be streamed: the whole file is held in memory
+    and returned base64-encoded, so files over EXPORT_MAX_BYTES are refused
+    with 413. The /export route of server/ streams files of any size.
+    '''
+    output = io.BytesIO()
+    if body['format'] == 'csv':
+        archive = gzip.GzipFile(fileobj=output, mode='wb')
+        # utf-8-sig: the BOM makes Excel read Cyrillic names as UTF-8
+        text = io.TextIOWrapper(archive, encoding='utf-8-sig', newline='')
+        writer = csv.writer(text)
+        close = text.close
+    else:
+        writer = XlsxWriter(output)
+        close = writer.close
+    writer.writerow(EXPORT_COLUMNS[body['kind']])
+    
+    with cur.connection.cursor(name='grades_export') as rows:
+        rows.execute(body['sql'], body['args'])
+        while True:
+            batch = rows.fetchmany(EXPORT_BATCH_SIZE)
+            if not batch:
+                break
+            writer.writerows(batch)
+            if output.tell() > EXPORT_MAX_BYTES:
+                raise HttpError(413, f'Export is larger than {EXPORT_MAX_BYTES // (1024 * 1024)} MB; '
+                                     'narrow it to a class, level or date range')
+    close()
+    
+    headers = dict(FILE_HEADERS[body['format']], **{
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'Content-Disposition',
+        'Content-Disposition': f'attachment; filename="{body["filename"]}"'
+    })
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'isBase64Encoded': True,
+        'body': base64.b64encode(output.getbuffer()).decode()
+    }
+
+
+ROUTES = {
+    'GET': export_grades
+}
+
+# Roles allowed to call each method once tokens are required.
+ROLES = {
+    'GET': ('admin', 'teacher')
+}
+
+# Request checks that need no database; they run before a connection is
+# taken and return the body the route receives.
+VALIDATORS = {
+    'GET': check_export_request
+}
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Grade export - the journal or a term report of a class, a grade level or the whole school as CSV or XLSX
+    Args: event with httpMethod, queryStringParameters (class_id or level, subject_id, date_from, date_to, kind, format), headers
+    Returns: HTTP response with the file base64-encoded (gzip-compressed CSV or XLSX) and a Content-Disposition name
+    '''
+    method: str = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return {'statusCode': 200, 'headers': PREFLIGHT_HEADERS, 'isBase64Encoded': False, 'body': ''}
+    
+    route = ROUTES.get(method)
+    if route is None:
+        return json_response(405, {'error': 'Method not allowed'})
+    
+    params = event.get('queryStringParameters') or {}
+    
+    conn = None
+    try:
+        params, body = authorize(method, params, {}, request_identity(event))
+        body = VALIDATORS[method](params, body)
+        conn = get_pool().getconn()
+        cur = conn.cursor()
+        try:
+            return route(cur, event, params, body)
+        finally:
+            cur.close()
+    
+    except HttpError as e:
+        return json_response(e.status, e.payload)
+    
+    except Exception as e:
+        return json_response(500, {'error': str(e)})
+    
+    finally:
+        if conn is not None:
+            get_pool().putconn(conn)
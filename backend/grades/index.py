@@ -1,187 +1,669 @@
+import base64
+import hashlib
+import hmac
 import json
 import os
-import psycopg2
-from typing import Dict, Any
+import threading
+import time
+from datetime import date
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    import orjson
+
+    def dumps(value: Any) -> str:
+        return orjson.dumps(value).decode()
+
+    loads = orjson.loads
+except ImportError:
+    dumps = json.dumps
+    loads = json.loads
+
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+PREFLIGHT_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, If-None-Match, X-Auth-Token',
+    'Access-Control-Max-Age': '86400'
+}
+CONDITIONAL_HEADERS = dict(JSON_HEADERS, **{'Access-Control-Expose-Headers': 'ETag', 'Cache-Control': 'no-cache'})
+
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+DB_POOL_CHECK_AFTER = float(os.environ.get('DB_POOL_CHECK_AFTER', '30'))
+MAX_BATCH_GRADES = int(os.environ.get('MAX_BATCH_GRADES', '100000'))
+
+# Session tokens issued by the auth function: comma-separated kid:secret
+# pairs (AUTH_TOKEN_KEYS). While unset, requests carry no identity check.
+TOKEN_KEYS = {
+    kid.strip(): secret.strip().encode()
+    for kid, secret in (item.split(':', 1) for item in os.environ.get('AUTH_TOKEN_KEYS', '').split(',') if ':' in item)
+}
+
+# Every grade write also applies its delta to class_subject_stats in the same
+# statement, which keeps the admin dashboard totals exact without rescans.
+INSERT_GRADES_SQL = """
+    WITH inserted AS (
+        INSERT INTO grades (student_id, subject_id, teacher_id, grade, grade_date, comment)
+        VALUES {values}
+        RETURNING id, student_id, subject_id, grade
+    ), stats AS (
+        INSERT INTO class_subject_stats AS cs (class_id, subject_id, grade_count, graded_count, grade_sum)
+        SELECT s.class_id, i.subject_id, COUNT(*), COUNT(i.grade), COALESCE(SUM(i.grade), 0)
+        FROM inserted i
+        JOIN students s ON s.id = i.student_id
+        WHERE s.class_id IS NOT NULL AND i.subject_id IS NOT NULL
+        GROUP BY s.class_id, i.subject_id
+        ON CONFLICT (class_id, subject_id) DO UPDATE SET
+            grade_count = cs.grade_count + EXCLUDED.grade_count,
+            graded_count = cs.graded_count + EXCLUDED.graded_count,
+            grade_sum = cs.grade_sum + EXCLUDED.grade_sum,
+            updated_at = CURRENT_TIMESTAMP
+    )
+    SELECT id FROM inserted ORDER BY id
+"""
+
+# Academic years that have a partition of a table (grades_2025 holds the
+# year from 1 September 2025). A date outside them has no partition to go
+# to, and Postgres would reject the whole statement (see V0009).
+PARTITION_YEARS_SQL = """
+    SELECT substring(c.relname FROM '_([0-9]{4})$')::integer
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = %s::regclass
+"""
+
+# Updates and deletes by id; with teacher_id set (a teacher's token) they
+# only touch that teacher's grades. Both report how many grades they hit.
+UPDATE_GRADE_SQL = """
+    UPDATE grades SET comment = %(comment)s
+    WHERE id = %(id)s AND (%(teacher_id)s::integer IS NULL OR teacher_id = %(teacher_id)s)
+"""
+DELETE_GRADE_SQL = """
+    WITH deleted AS (
+        DELETE FROM grades
+        WHERE id = %(id)s AND (%(teacher_id)s::integer IS NULL OR teacher_id = %(teacher_id)s)
+        RETURNING student_id, subject_id, grade
+    ), stats AS (
+        UPDATE class_subject_stats cs SET
+            grade_count = cs.grade_count - delta.grade_count,
+            graded_count = cs.graded_count - delta.graded_count,
+            grade_sum = cs.grade_sum - delta.grade_sum,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT s.class_id, d.subject_id, COUNT(*) AS grade_count,
+                   COUNT(d.grade) AS graded_count, COALESCE(SUM(d.grade), 0) AS grade_sum
+            FROM deleted d
+            JOIN students s ON s.id = d.student_id
+            GROUP BY s.class_id, d.subject_id
+        ) delta
+        WHERE cs.class_id = delta.class_id AND cs.subject_id = delta.subject_id
+    )
+    SELECT COUNT(*) FROM deleted
+"""
+
+# Journals show one academic year, the current one unless ?year= names
+# another. Grades are partitioned by academic year, so the date bounds
+# keep a journal read on that year's partition.
+MIN_ACADEMIC_YEAR = 2000
+
+# Tables the journal is built from; their change counters make up its ETag.
+JOURNAL_TABLES = ('students', 'users', 'grades')
+TEACHER_JOURNAL_TABLES = JOURNAL_TABLES + ('teacher_classes', 'classes', 'subjects')
+
+# Every journal of a teacher in one statement: one row per (assignment,
+# student), ordered so consecutive rows make up one journal. Assignments of
+# a class without students still come back, as a single row with no student.
+TEACHER_JOURNALS_SQL = """
+    SELECT tc.class_id, c.name, tc.subject_id, sub.name, s.id, u.full_name,
+           COALESCE(
+               json_agg(
+                   json_build_object(
+                       'id', g.id,
+                       'grade', g.grade,
+                       'date', to_char(g.grade_date, 'YYYY-MM-DD'),
+                       'comment', g.comment
+                   ) ORDER BY g.grade_date, g.id
+               ) FILTER (WHERE g.id IS NOT NULL),
+               '[]'
+           ) AS grades,
+           COUNT(g.id) AS grade_count,
+           COALESCE(SUM(g.grade), 0) AS grade_sum
+    FROM teacher_classes tc
+    JOIN classes c ON c.id = tc.class_id
+    JOIN subjects sub ON sub.id = tc.subject_id
+    LEFT JOIN students s ON s.class_id = tc.class_id
+    LEFT JOIN users u ON u.id = s.user_id
+    LEFT JOIN grades g ON g.student_id = s.id AND g.subject_id = tc.subject_id
+                       AND g.grade_date >= %s AND g.grade_date < %s
+    WHERE tc.teacher_id = %s
+    GROUP BY tc.class_id, c.name, tc.subject_id, sub.name, s.id, u.full_name
+    ORDER BY c.name, tc.class_id, sub.name, tc.subject_id, u.full_name
+"""
+
+
+class ConnectionPool:
+    '''
+    Postgres connections kept open between warm invocations of the function.
+    Connections idle longer than idle_timeout are closed; ones idle longer
+    than check_after are pinged before reuse. max_size 0 disables pooling.
+    psycopg2 is imported when the pool is built, so requests answered without
+    the database (preflights, 405s, validation errors) never load the driver.
+    '''
+
+    def __init__(self, dsn: str, max_size: int, idle_timeout: float, check_after: float):
+        import psycopg2
+        self.driver = psycopg2
+        self.dsn = dsn
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self._idle: List[Tuple[Any, float]] = []
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    def getconn(self, timeout: float = 10.0):
+        if self.max_size <= 0:
+            return self.driver.connect(self.dsn)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._evict_idle()
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    break
+                if self._in_use < self.max_size:
+                    conn, released_at = None, 0.0
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RuntimeError('Database connection pool exhausted')
+                self._cond.wait(remaining)
+            self._in_use += 1
+        try:
+            if conn is not None and not self._is_healthy(conn, released_at):
+                self._close(conn)
+                conn = None
+            if conn is None:
+                conn = self.driver.connect(self.dsn)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def putconn(self, conn) -> None:
+        if self.max_size <= 0:
+            self._close(conn)
+            return
+        reusable = not conn.closed
+        if reusable:
+            try:
+                conn.rollback()
+            except self.driver.Error:
+                reusable = False
+                self._close(conn)
+        with self._cond:
+            self._in_use -= 1
+            if reusable:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        keep = []
+        for conn, released_at in self._idle:
+            if now - released_at > self.idle_timeout:
+                self._close(conn)
+            else:
+                keep.append((conn, released_at))
+        self._idle = keep
+
+    def _is_healthy(self, conn, released_at: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - released_at < self.check_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.close()
+            conn.rollback()
+            return True
+        except self.driver.Error:
+            return False
+
+    def _close(self, conn) -> None:
+        try:
+            conn.close()
+        except self.driver.Error:
+            pass
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    os.environ.get('DATABASE_URL'),
+                    DB_POOL_MAX_SIZE,
+                    DB_POOL_IDLE_TIMEOUT,
+                    DB_POOL_CHECK_AFTER
+                )
+    return _pool
+
+
+class HttpError(Exception):
+    '''Raised by a route to answer with a non-2xx status; the transaction is rolled back.'''
+
+    def __init__(self, status: int, error: Any):
+        super().__init__(error)
+        self.status = status
+        self.payload = error if isinstance(error, dict) else {'error': error}
+
+
+def json_response(status: int, payload: Any) -> Dict[str, Any]:
+    return {'statusCode': status, 'headers': JSON_HEADERS, 'isBase64Encoded': False, 'body': dumps(payload)}
+
+
+def parse_body(event: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        body = loads(event.get('body') or '{}')
+    except ValueError:
+        raise HttpError(400, 'Invalid JSON body')
+    if not isinstance(body, dict):
+        raise HttpError(400, 'JSON object expected')
+    return body
+
+
+def request_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def verify_token(token: str) -> Dict[str, Any]:
+    '''Claims of a token signed with one of TOKEN_KEYS; 401 if it is malformed, forged or expired.'''
+    kid, _, rest = token.partition('.')
+    payload, _, signature = rest.partition('.')
+    key = TOKEN_KEYS.get(kid)
+    if key is None:
+        raise HttpError(401, 'Invalid token')
+    expected = hmac.new(key, f'{kid}.{payload}'.encode(), hashlib.sha256).digest()
+    try:
+        if not hmac.compare_digest(expected, base64.urlsafe_b64decode(signature + '=' * (-len(signature) % 4))):
+            raise HttpError(401, 'Invalid token')
+        claims = loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+    except ValueError:
+        raise HttpError(401, 'Invalid token')
+    if claims.get('exp', 0) < time.time():
+        raise HttpError(401, 'Token expired')
+    return claims
+
+
+def request_identity(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    '''Claims of the X-Auth-Token header, or None while AUTH_TOKEN_KEYS is not configured.'''
+    if not TOKEN_KEYS:
+        return None
+    token = request_header(event, 'x-auth-token')
+    if not token:
+        raise HttpError(401, 'Authentication required')
+    return verify_token(token)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(',')]
+    return '*' in candidates or etag in [c[2:] if c.startswith('W/') else c for c in candidates]
+
+
+def version_etag(cur, tables: Tuple[str, ...], params: Dict[str, Any]) -> str:
+    '''
+    ETag derived from the change counters of the tables a response reads plus
+    the request parameters. A few index rows per table, no scan of the data itself.
+    '''
+    cur.execute(
+        "SELECT table_name, version FROM table_versions WHERE table_name = ANY(%s) ORDER BY table_name",
+        (list(tables),)
+    )
+    versions = ','.join(f'{name}:{version}' for name, version in cur.fetchall())
+    request = '&'.join(f'{k}={v}' for k, v in sorted(params.items()))
+    return '"' + hashlib.blake2b(f'{request}|{versions}'.encode(), digest_size=12).hexdigest() + '"'
+
+
+def conditional_response(event: Dict[str, Any], body: str, etag: str) -> Dict[str, Any]:
+    headers = dict(CONDITIONAL_HEADERS, ETag=etag)
+    if etag_matches(request_header(event, 'if-none-match'), etag):
+        return {'statusCode': 304, 'headers': headers, 'isBase64Encoded': False, 'body': ''}
+    return {'statusCode': 200, 'headers': headers, 'isBase64Encoded': False, 'body': body}
+
+
+def _is_id(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+def validate_grade_rows(items: List[Any], default_teacher_id: Any) -> Tuple[List[tuple], List[Dict[str, Any]]]:
+    '''
+    Turn a batch of grade objects into insert rows.
+    Returns the rows and a list of {index, field, error} entries for invalid items.
+    '''
+    rows = []
+    errors = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({'index': index, 'field': None, 'error': 'grade must be an object'})
+            continue
+        row_errors = []
+        for field in ('student_id', 'subject_id'):
+            if not _is_id(item.get(field)):
+                row_errors.append({'index': index, 'field': field, 'error': f'{field} must be a positive integer'})
+        teacher_id = item.get('teacher_id', default_teacher_id)
+        if teacher_id is not None and not _is_id(teacher_id):
+            row_errors.append({'index': index, 'field': 'teacher_id', 'error': 'teacher_id must be a positive integer'})
+        grade = item.get('grade')
+        if not isinstance(grade, int) or isinstance(grade, bool) or not 1 <= grade <= 5:
+            row_errors.append({'index': index, 'field': 'grade', 'error': 'grade must be an integer from 1 to 5'})
+        try:
+            grade_date = date.fromisoformat(item.get('grade_date'))
+        except (TypeError, ValueError):
+            grade_date = None
+            row_errors.append({'index': index, 'field': 'grade_date', 'error': 'grade_date must be YYYY-MM-DD'})
+        comment = item.get('comment') or ''
+        if not isinstance(comment, str):
+            row_errors.append({'index': index, 'field': 'comment', 'error': 'comment must be a string'})
+        if row_errors:
+            errors.extend(row_errors)
+        else:
+            rows.append((item['student_id'], item['subject_id'], teacher_id, grade, grade_date, comment))
+    return rows, errors
+
+
+def check_grade_references(cur, rows: List[tuple]) -> List[Dict[str, Any]]:
+    '''Report rows pointing at students, subjects or teachers that do not exist, in one query.'''
+    columns = (('student_id', 0, 'students'), ('subject_id', 1, 'subjects'), ('teacher_id', 2, 'teachers'))
+    wanted = {field: list({r[pos] for r in rows if r[pos] is not None}) for field, pos, _ in columns}
+    cur.execute("""
+        SELECT 'student_id', id FROM students WHERE id = ANY(%s)
+        UNION ALL
+        SELECT 'subject_id', id FROM subjects WHERE id = ANY(%s)
+        UNION ALL
+        SELECT 'teacher_id', id FROM teachers WHERE id = ANY(%s)
+    """, (wanted['student_id'], wanted['subject_id'], wanted['teacher_id']))
+    found = set(cur.fetchall())
+    errors = []
+    for index, row in enumerate(rows):
+        for field, pos, table in columns:
+            if row[pos] is not None and (field, row[pos]) not in found:
+                errors.append({'index': index, 'field': field, 'error': f'{field} {row[pos]} not found in {table}'})
+    return errors
+
+
+def check_academic_years(cur, dates: List[date]) -> List[Dict[str, Any]]:
+    '''Report grade dates in academic years without a grades partition: not created yet, or detached.'''
+    cur.execute(PARTITION_YEARS_SQL, ('grades',))
+    years = {r[0] for r in cur.fetchall()}
+    return [{'index': index, 'field': 'grade_date', 'error': f'grade_date {day} is outside the academic years kept in grades'}
+            for index, day in enumerate(dates) if academic_year(day) not in years]
+
+
+def authorize(method: str, params: Dict[str, Any], body: Dict[str, Any],
+              identity: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    '''
+    Check the caller's role against ROLES and replace ids the client sent with
+    the ones in its token: a student reads only their own class, a teacher
+    gets their own journals, records grades under their own teacher_id and
+    edits or deletes only the grades they gave.
+    '''
+    if identity is None:
+        return params, body
+    role = identity.get('role')
+    if role not in ROLES[method]:
+        raise HttpError(403, 'Forbidden')
+    if role == 'student':
+        if not identity.get('class_id'):
+            raise HttpError(403, 'Student is not assigned to a class')
+        params = {k: v for k, v in params.items() if k != 'teacher_id'}
+        params['class_id'] = identity.get('class_id')
+    elif role == 'teacher' and method == 'GET' and not params.get('class_id'):
+        params = dict(params, teacher_id=identity.get('teacher_id'))
+    elif role == 'teacher' and method == 'POST':
+        teacher_id = identity.get('teacher_id')
+        body = dict(body, teacher_id=teacher_id)
+        if isinstance(body.get('grades'), list):
+            body['grades'] = [dict(item, teacher_id=teacher_id) if isinstance(item, dict) else item
+                              for item in body['grades']]
+    elif role == 'teacher' and method in ('PUT', 'DELETE'):
+        if not identity.get('teacher_id'):
+            raise HttpError(403, 'Forbidden')
+        params = dict(params, teacher_id=identity['teacher_id'])
+    return params, body
+
+
+def academic_year(day: date) -> int:
+    '''Academic years run from 1 September; the one starting in 2025 is year 2025.'''
+    return day.year if day.month >= 9 else day.year - 1
+
+
+def check_journal_request(params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    '''Hand the route the academic year to show, defaulting to the current one.'''
+    teacher_journals = params.get('teacher_id') and not params.get('class_id')
+    if not teacher_journals and (not params.get('class_id') or not params.get('subject_id')):
+        raise HttpError(400, 'class_id and subject_id, or teacher_id, required')
+    year = params.get('year')
+    if year is None:
+        return dict(body, year=academic_year(date.today()))
+    if not str(year).isdigit() or not MIN_ACADEMIC_YEAR <= int(year) <= academic_year(date.today()) + 1:
+        raise HttpError(400, 'year must be the starting year of an academic year, e.g. 2025')
+    return dict(body, year=int(year))
+
+
+def check_grades_request(params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    '''Validate a batch up front and hand the route its insert rows in place of the raw items.'''
+    if not isinstance(body.get('grades'), list):
+        return body
+    items = body['grades']
+    if not items or len(items) > MAX_BATCH_GRADES:
+        raise HttpError(400, f'grades must contain 1 to {MAX_BATCH_GRADES} items')
+    rows, errors = validate_grade_rows(items, body.get('teacher_id'))
+    if errors:
+        raise HttpError(400, {'success': False, 'errors': errors})
+    return dict(body, grades=rows)
+
+
+def check_grade_id(params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    if not params.get('id'):
+        raise HttpError(400, 'grade id required')
+    if params.get('teacher_id') is not None and not str(params['teacher_id']).isdigit():
+        raise HttpError(400, 'teacher_id must be a positive integer')
+    return body
+
+
+def get_teacher_journals(cur, event: Dict[str, Any], params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    '''Journals of all (class, subject) assignments of a teacher: two queries however many there are.'''
+    year = body['year']
+    etag = version_etag(cur, TEACHER_JOURNAL_TABLES, dict(params, year=year))
+    if etag_matches(request_header(event, 'if-none-match'), etag):
+        return conditional_response(event, '', etag)
+    
+    cur.execute(TEACHER_JOURNALS_SQL, (date(year, 9, 1), date(year + 1, 9, 1), params.get('teacher_id')))
+    
+    journals = []
+    current = None
+    for r in cur.fetchall():
+        if current is None or (current['class_id'], current['subject_id']) != (r[0], r[2]):
+            current = {'class_id': r[0], 'class_name': r[1], 'subject_id': r[2], 'subject_name': r[3], 'data': []}
+            journals.append(current)
+        if r[4] is not None:
+            current['data'].append({
+                'student_id': r[4],
+                'student_name': r[5],
+                'grades': r[6],
+                'average': round(r[8] / r[7], 2) if r[7] else 0
+            })
+    
+    return conditional_response(event, dumps({'journals': journals, 'year': year}), etag)
+
+
+def get_journal(cur, event: Dict[str, Any], params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    if not params.get('class_id'):
+        return get_teacher_journals(cur, event, params, body)
+    
+    class_id = params.get('class_id')
+    subject_id = params.get('subject_id')
+    year = body['year']
+    
+    etag = version_etag(cur, JOURNAL_TABLES, dict(params, year=year))
+    if etag_matches(request_header(event, 'if-none-match'), etag):
+        return conditional_response(event, '', etag)
+    
+    cur.execute("""
+        SELECT s.id, u.full_name,
+               COALESCE(
+                   json_agg(
+                       json_build_object(
+                           'id', g.id,
+                           'grade', g.grade,
+                           'date', to_char(g.grade_date, 'YYYY-MM-DD'),
+                           'comment', g.comment
+                       ) ORDER BY g.grade_date, g.id
+                   ) FILTER (WHERE g.id IS NOT NULL),
+                   '[]'
+               ) AS grades,
+               COUNT(g.id) AS grade_count,
+               COALESCE(SUM(g.grade), 0) AS grade_sum
+        FROM students s
+        JOIN users u ON s.user_id = u.id
+        LEFT JOIN grades g ON g.student_id = s.id AND g.subject_id = %s
+                           AND g.grade_date >= %s AND g.grade_date < %s
+        WHERE s.class_id = %s
+        GROUP BY s.id, u.full_name
+        ORDER BY u.full_name
+    """, (subject_id, date(year, 9, 1), date(year + 1, 9, 1), class_id))
+    
+    result = [{
+        'student_id': r[0],
+        'student_name': r[1],
+        'grades': r[2],
+        'average': round(r[4] / r[3], 2) if r[3] else 0
+    } for r in cur.fetchall()]
+    
+    return conditional_response(event, dumps({'data': result, 'year': year}), etag)
+
+
+def add_grades(cur, event: Dict[str, Any], params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    if isinstance(body.get('grades'), list):
+        from psycopg2.extras import execute_values
+        
+        rows = body['grades']
+        errors = check_grade_references(cur, rows) + check_academic_years(cur, [r[4] for r in rows])
+        if errors:
+            raise HttpError(400, {'success': False, 'errors': errors})
+        
+        inserted = execute_values(cur, INSERT_GRADES_SQL.format(values='%s'), rows, page_size=1000, fetch=True)
+        return json_response(200, {'success': True, 'ids': [r[0] for r in inserted]})
+    
+    try:
+        grade_date = date.fromisoformat(body.get('grade_date'))
+    except (TypeError, ValueError):
+        grade_date = None
+    errors = check_academic_years(cur, [grade_date]) if grade_date else []
+    if errors:
+        raise HttpError(400, {'success': False, 'errors': errors})
+    cur.execute(
+        INSERT_GRADES_SQL.format(values='(%s, %s, %s, %s, %s, %s)'),
+        (body.get('student_id'), body.get('subject_id'), body.get('teacher_id'),
+         body.get('grade'), body.get('grade_date'), body.get('comment', ''))
+    )
+    return json_response(200, {'success': True, 'id': cur.fetchone()[0]})
+
+
+def update_grade(cur, event: Dict[str, Any], params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    key = {'id': params.get('id'), 'teacher_id': params.get('teacher_id')}
+    cur.execute(UPDATE_GRADE_SQL, dict(key, comment=body.get('comment', '')))
+    if key['teacher_id'] is not None and cur.rowcount == 0:
+        raise HttpError(404, 'Grade not found')
+    return json_response(200, {'success': True})
+
+
+def delete_grade(cur, event: Dict[str, Any], params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    teacher_id = params.get('teacher_id')
+    cur.execute(DELETE_GRADE_SQL, {'id': params.get('id'), 'teacher_id': teacher_id})
+    if teacher_id is not None and cur.fetchone()[0] == 0:
+        raise HttpError(404, 'Grade not found')
+    return json_response(200, {'success': True})
+
+
+ROUTES = {
+    'GET': get_journal,
+    'POST': add_grades,
+    'PUT': update_grade,
+    'DELETE': delete_grade
+}
+
+# Roles allowed to call each method once tokens are required.
+ROLES = {
+    'GET': ('admin', 'teacher', 'student'),
+    'POST': ('admin', 'teacher'),
+    'PUT': ('admin', 'teacher'),
+    'DELETE': ('admin', 'teacher')
+}
+
+# Request checks that need no database; they run before a connection is
+# taken and return the body the route receives.
+VALIDATORS = {
+    'GET': check_journal_request,
+    'POST': check_grades_request,
+    'PUT': check_grade_id,
+    'DELETE': check_grade_id
+}
+
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
-    Business: Grades journal - view and add grades for students
-    Args: event with httpMethod, queryStringParameters (class_id, subject_id)
+    Business: Grades journal - view and add grades for students, one at a time or a whole class in one batch
+    Args: event with httpMethod, queryStringParameters (class_id and subject_id, or teacher_id for all of a teacher's journals; year, default current), body (grade or {grades: [...]})
     Returns: HTTP response with grades data or success status
     '''
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
-    
-    dsn = os.environ.get('DATABASE_URL')
-    params = event.get('queryStringParameters', {}) or {}
+        return {'statusCode': 200, 'headers': PREFLIGHT_HEADERS, 'isBase64Encoded': False, 'body': ''}
+    
+    route = ROUTES.get(method)
+    if route is None:
+        return json_response(405, {'error': 'Method not allowed'})
     
+    params = event.get('queryStringParameters') or {}
+    
+    conn = None
     try:
-        conn = psycopg2.connect(dsn)
+        identity = request_identity(event)
+        params, body = authorize(method, params, parse_body(event) if method in ('POST', 'PUT') else {}, identity)
+        body = VALIDATORS[method](params, body)
+        conn = get_pool().getconn()
         cur = conn.cursor()
-        
-        if method == 'GET':
-            class_id = params.get('class_id')
-            subject_id = params.get('subject_id')
-            
-            if not class_id or not subject_id:
-                cur.close()
-                conn.close()
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'class_id and subject_id required'})
-                }
-            
-            cur.execute("""
-                SELECT s.id, u.full_name
-                FROM students s
-                JOIN users u ON s.user_id = u.id
-                WHERE s.class_id = %s
-                ORDER BY u.full_name
-            """, (class_id,))
-            students = cur.fetchall()
-            
-            result = []
-            for student in students:
-                student_id = student[0]
-                student_name = student[1]
-                
-                cur.execute("""
-                    SELECT id, grade, grade_date, comment
-                    FROM grades
-                    WHERE student_id = %s AND subject_id = %s
-                    ORDER BY grade_date
-                """, (student_id, subject_id))
-                grades_rows = cur.fetchall()
-                
-                grades = [{'id': g[0], 'grade': g[1], 'date': str(g[2]), 'comment': g[3]} for g in grades_rows]
-                
-                avg_grade = 0
-                if grades:
-                    avg_grade = round(sum(g['grade'] for g in grades) / len(grades), 2)
-                
-                result.append({
-                    'student_id': student_id,
-                    'student_name': student_name,
-                    'grades': grades,
-                    'average': avg_grade
-                })
-            
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'data': result})
-            }
-        
-        elif method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            student_id = body_data.get('student_id')
-            subject_id = body_data.get('subject_id')
-            grade = body_data.get('grade')
-            grade_date = body_data.get('grade_date')
-            comment = body_data.get('comment', '')
-            teacher_id = body_data.get('teacher_id')
-            
-            cur.execute("""
-                INSERT INTO grades (student_id, subject_id, teacher_id, grade, grade_date, comment)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                RETURNING id
-            """, (student_id, subject_id, teacher_id, grade, grade_date, comment))
-            
-            new_id = cur.fetchone()[0]
-            conn.commit()
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'success': True, 'id': new_id})
-            }
-        
-        elif method == 'PUT':
-            grade_id = params.get('id')
-            body_data = json.loads(event.get('body', '{}'))
-            comment = body_data.get('comment', '')
-            
-            if not grade_id:
-                cur.close()
-                conn.close()
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'grade id required'})
-                }
-            
-            cur.execute("UPDATE grades SET comment = %s WHERE id = %s", (comment, grade_id))
-            conn.commit()
+        try:
+            response = route(cur, event, params, body)
+        finally:
             cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'success': True})
-            }
-        
-        elif method == 'DELETE':
-            grade_id = params.get('id')
-            
-            if not grade_id:
-                cur.close()
-                conn.close()
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'grade id required'})
-                }
-            
-            cur.execute("DELETE FROM grades WHERE id = %s", (grade_id,))
+        if method != 'GET':
             conn.commit()
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'success': True})
-            }
-        
-        else:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 405,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'error': 'Method not allowed'})
-            }
+        return response
+    
+    except HttpError as e:
+        return json_response(e.status, e.payload)
     
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'error': str(e)})
-        }
\ No newline at end of file
+        return json_response(500, {'error': str(e)})
+    
+    finally:
+        if conn is not None:
+            get_pool().putconn(conn)
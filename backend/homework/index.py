@@ -1,190 +1,523 @@
+import base64
+import hashlib
+import hmac
 import json
 import os
-import psycopg2
-from typing import Dict, Any
+import threading
+import time
+from datetime import date
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    import orjson
+
+    def dumps(value: Any) -> str:
+        return orjson.dumps(value).decode()
+
+    loads = orjson.loads
+except ImportError:
+    dumps = json.dumps
+    loads = json.loads
+
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+PREFLIGHT_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, If-None-Match, X-Auth-Token',
+    'Access-Control-Max-Age': '86400'
+}
+CONDITIONAL_HEADERS = dict(JSON_HEADERS, **{'Access-Control-Expose-Headers': 'ETag', 'Cache-Control': 'no-cache'})
+
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+DB_POOL_CHECK_AFTER = float(os.environ.get('DB_POOL_CHECK_AFTER', '30'))
+HOMEWORK_PAGE_SIZE = 100
+HOMEWORK_MAX_PAGE_SIZE = 500
+
+# Session tokens issued by the auth function: comma-separated kid:secret
+# pairs (AUTH_TOKEN_KEYS). While unset, requests carry no identity check.
+TOKEN_KEYS = {
+    kid.strip(): secret.strip().encode()
+    for kid, secret in (item.split(':', 1) for item in os.environ.get('AUTH_TOKEN_KEYS', '').split(',') if ':' in item)
+}
+
+# Tables the homework listing is built from; their change counters make up its ETag.
+HOMEWORK_TABLES = ('homework', 'classes', 'subjects', 'teachers', 'users')
+
+# Academic years that have a partition of a table (homework_2025 holds the
+# year from 1 September 2025). A date outside them has no partition to go
+# to, and Postgres would reject the statement (see V0009).
+PARTITION_YEARS_SQL = """
+    SELECT substring(c.relname FROM '_([0-9]{4})$')::integer
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = %s::regclass
+"""
+
+
+class ConnectionPool:
+    '''
+    Postgres connections kept open between warm invocations of the function.
+    Connections idle longer than idle_timeout are closed; ones idle longer
+    than check_after are pinged before reuse. max_size 0 disables pooling.
+    psycopg2 is imported when the pool is built, so requests answered without
+    the database (preflights, 405s, validation errors) never load the driver.
+    '''
+
+    def __init__(self, dsn: str, max_size: int, idle_timeout: float, check_after: float):
+        import psycopg2
+        self.driver = psycopg2
+        self.dsn = dsn
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self._idle: List[Tuple[Any, float]] = []
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    def getconn(self, timeout: float = 10.0):
+        if self.max_size <= 0:
+            return self.driver.connect(self.dsn)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._evict_idle()
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    break
+                if self._in_use < self.max_size:
+                    conn, released_at = None, 0.0
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RuntimeError('Database connection pool exhausted')
+                self._cond.wait(remaining)
+            self._in_use += 1
+        try:
+            if conn is not None and not self._is_healthy(conn, released_at):
+                self._close(conn)
+                conn = None
+            if conn is None:
+                conn = self.driver.connect(self.dsn)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def putconn(self, conn) -> None:
+        if self.max_size <= 0:
+            self._close(conn)
+            return
+        reusable = not conn.closed
+        if reusable:
+            try:
+                conn.rollback()
+            except self.driver.Error:
+                reusable = False
+                self._close(conn)
+        with self._cond:
+            self._in_use -= 1
+            if reusable:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        keep = []
+        for conn, released_at in self._idle:
+            if now - released_at > self.idle_timeout:
+                self._close(conn)
+            else:
+                keep.append((conn, released_at))
+        self._idle = keep
+
+    def _is_healthy(self, conn, released_at: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - released_at < self.check_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.close()
+            conn.rollback()
+            return True
+        except self.driver.Error:
+            return False
+
+    def _close(self, conn) -> None:
+        try:
+            conn.close()
+        except self.driver.Error:
+            pass
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    os.environ.get('DATABASE_URL'),
+                    DB_POOL_MAX_SIZE,
+                    DB_POOL_IDLE_TIMEOUT,
+                    DB_POOL_CHECK_AFTER
+                )
+    return _pool
+
+
+class HttpError(Exception):
+    '''Raised by a route to answer with a non-2xx status; the transaction is rolled back.'''
+
+    def __init__(self, status: int, error: Any):
+        super().__init__(error)
+        self.status = status
+        self.payload = error if isinstance(error, dict) else {'error': error}
+
+
+def json_response(status: int, payload: Any) -> Dict[str, Any]:
+    return {'statusCode': status, 'headers': JSON_HEADERS, 'isBase64Encoded': False, 'body': dumps(payload)}
+
+
+def parse_body(event: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        body = loads(event.get('body') or '{}')
+    except ValueError:
+        raise HttpError(400, 'Invalid JSON body')
+    if not isinstance(body, dict):
+        raise HttpError(400, 'JSON object expected')
+    return body
+
+
+def request_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def verify_token(token: str) -> Dict[str, Any]:
+    '''Claims of a token signed with one of TOKEN_KEYS; 401 if it is malformed, forged or expired.'''
+    kid, _, rest = token.partition('.')
+    payload, _, signature = rest.partition('.')
+    key = TOKEN_KEYS.get(kid)
+    if key is None:
+        raise HttpError(401, 'Invalid token')
+    expected = hmac.new(key, f'{kid}.{payload}'.encode(), hashlib.sha256).digest()
+    try:
+        if not hmac.compare_digest(expected, base64.urlsafe_b64decode(signature + '=' * (-len(signature) % 4))):
+            raise HttpError(401, 'Invalid token')
+        claims = loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+    except ValueError:
+        raise HttpError(401, 'Invalid token')
+    if claims.get('exp', 0) < time.time():
+        raise HttpError(401, 'Token expired')
+    return claims
+
+
+def request_identity(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    '''Claims of the X-Auth-Token header, or None while AUTH_TOKEN_KEYS is not configured.'''
+    if not TOKEN_KEYS:
+        return None
+    token = request_header(event, 'x-auth-token')
+    if not token:
+        raise HttpError(401, 'Authentication required')
+    return verify_token(token)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(',')]
+    return '*' in candidates or etag in [c[2:] if c.startswith('W/') else c for c in candidates]
+
+
+def version_etag(cur, tables: Tuple[str, ...], params: Dict[str, Any]) -> str:
+    '''
+    ETag derived from the change counters of the tables a response reads plus
+    the request parameters. A few index rows per table, no scan of the data itself.
+    '''
+    cur.execute(
+        "SELECT table_name, version FROM table_versions WHERE table_name = ANY(%s) ORDER BY table_name",
+        (list(tables),)
+    )
+    versions = ','.join(f'{name}:{version}' for name, version in cur.fetchall())
+    request = '&'.join(f'{k}={v}' for k, v in sorted(params.items()))
+    return '"' + hashlib.blake2b(f'{request}|{versions}'.encode(), digest_size=12).hexdigest() + '"'
+
+
+def conditional_response(event: Dict[str, Any], body: str, etag: str) -> Dict[str, Any]:
+    headers = dict(CONDITIONAL_HEADERS, ETag=etag)
+    if etag_matches(request_header(event, 'if-none-match'), etag):
+        return {'statusCode': 304, 'headers': headers, 'isBase64Encoded': False, 'body': ''}
+    return {'statusCode': 200, 'headers': headers, 'isBase64Encoded': False, 'body': body}
+
+
+def encode_cursor(due_date: date, homework_id: int) -> str:
+    return base64.urlsafe_b64encode(f'{due_date.isoformat()}|{homework_id}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[date, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        due_date, homework_id = raw.split('|')
+        return date.fromisoformat(due_date), int(homework_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('invalid cursor')
+
+
+def build_homework_query(params: Dict[str, Any]) -> Tuple[str, List[Any], int]:
+    '''
+    Keyset-paginated homework listing ordered by (due_date, id) descending.
+    Filters: class_id, subject_id, date_from, date_to; paging: limit, cursor.
+    Selects limit + 1 rows so the caller can tell whether another page exists.
+    Raises ValueError for malformed parameters.
+    '''
+    conditions = []
+    args: List[Any] = []
+    for name in ('class_id', 'subject_id'):
+        if params.get(name):
+            if not str(params[name]).isdigit():
+                raise ValueError(f'{name} must be an integer')
+            conditions.append(f'h.{name} = %s')
+            args.append(int(params[name]))
+    for name, op in (('date_from', '>='), ('date_to', '<=')):
+        if params.get(name):
+            try:
+                args.append(date.fromisoformat(params[name]))
+            except ValueError:
+                raise ValueError(f'{name} must be YYYY-MM-DD')
+            conditions.append(f'h.due_date {op} %s')
+    if params.get('cursor'):
+        conditions.append('(h.due_date, h.id) < (%s, %s)')
+        args.extend(decode_cursor(params['cursor']))
+
+    limit = params.get('limit') or HOMEWORK_PAGE_SIZE
+    if not str(limit).isdigit() or not 1 <= int(limit) <= HOMEWORK_MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {HOMEWORK_MAX_PAGE_SIZE}')
+    limit = int(limit)
+    args.append(limit + 1)
+
+    if params.get('class_id'):
+        columns = 'sub.name as subject_name, u.full_name as teacher_name'
+        class_join = ''
+    else:
+        columns = 'c.name as class_name, sub.name as subject_name, u.full_name as teacher_name, h.class_id'
+        class_join = 'JOIN classes c ON h.class_id = c.id'
+    where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+    query = f"""
+        SELECT h.id, h.description, h.due_date, {columns}
+        FROM homework h
+        {class_join}
+        JOIN subjects sub ON h.subject_id = sub.id
+        LEFT JOIN teachers t ON h.teacher_id = t.id
+        LEFT JOIN users u ON t.user_id = u.id
+        {where}
+        ORDER BY h.due_date DESC, h.id DESC
+        LIMIT %s
+    """
+    return query, args, limit
+
+
+def authorize(method: str, params: Dict[str, Any], body: Dict[str, Any],
+              identity: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    '''
+    Check the caller's role against ROLES and replace ids the client sent with
+    the ones in its token: a student lists only their own class, a teacher
+    sets homework under their own teacher_id and edits or deletes only that.
+    '''
+    if identity is None:
+        return params, body
+    role = identity.get('role')
+    if role not in ROLES[method]:
+        raise HttpError(403, 'Forbidden')
+    if role == 'student':
+        # Without a class the listing would fall back to the whole school
+        if not identity.get('class_id'):
+            raise HttpError(403, 'Student is not assigned to a class')
+        params = dict(params, class_id=identity.get('class_id'))
+    elif role == 'teacher' and method == 'POST':
+        body = dict(body, teacher_id=identity.get('teacher_id'))
+    elif role == 'teacher' and method in ('PUT', 'DELETE'):
+        if not identity.get('teacher_id'):
+            raise HttpError(403, 'Forbidden')
+        params = dict(params, teacher_id=identity['teacher_id'])
+    return params, body
+
+
+def check_listing_request(params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        build_homework_query(params)
+    except ValueError as e:
+        raise HttpError(400, str(e))
+    return body
+
+
+def academic_year(day: date) -> int:
+    '''Academic years run from 1 September; the one starting in 2025 is year 2025.'''
+    return day.year if day.month >= 9 else day.year - 1
+
+
+def check_homework_id(params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    if not params.get('id'):
+        raise HttpError(400, 'homework id required')
+    if params.get('teacher_id') is not None and not str(params['teacher_id']).isdigit():
+        raise HttpError(400, 'teacher_id must be a positive integer')
+    return body
+
+
+def list_homework(cur, event: Dict[str, Any], params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    query, args, limit = build_homework_query(params)
+    
+    etag = version_etag(cur, HOMEWORK_TABLES, params)
+    if etag_matches(request_header(event, 'if-none-match'), etag):
+        return conditional_response(event, '', etag)
+    
+    cur.execute(query, args)
+    rows = cur.fetchall()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][2], rows[-1][0])
+    
+    if params.get('class_id'):
+        data = [{
+            'id': r[0],
+            'description': r[1],
+            'due_date': str(r[2]),
+            'subject_name': r[3],
+            'teacher_name': r[4]
+        } for r in rows]
+    else:
+        data = [{
+            'id': r[0],
+            'description': r[1],
+            'due_date': str(r[2]),
+            'class_name': r[3],
+            'subject_name': r[4],
+            'teacher_name': r[5],
+            'class_id': r[6]
+        } for r in rows]
+    
+    return conditional_response(event, dumps({'data': data, 'next_cursor': next_cursor}), etag)
+
+
+def check_due_date(cur, value: Any) -> date:
+    '''due_date as a date, in an academic year that has a homework partition.'''
+    try:
+        due_date = date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise HttpError(400, 'due_date must be YYYY-MM-DD')
+    cur.execute(PARTITION_YEARS_SQL, ('homework',))
+    if academic_year(due_date) not in {r[0] for r in cur.fetchall()}:
+        raise HttpError(400, f'due_date {due_date} is outside the academic years kept in homework')
+    return due_date
+
+
+def create_homework(cur, event: Dict[str, Any], params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    cur.execute("""
+        INSERT INTO homework (class_id, subject_id, teacher_id, description, due_date)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING id
+    """, (body.get('class_id'), body.get('subject_id'), body.get('teacher_id'),
+          body.get('description', ''), check_due_date(cur, body.get('due_date'))))
+    return json_response(200, {'success': True, 'id': cur.fetchone()[0]})
+
+
+def update_homework(cur, event: Dict[str, Any], params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    homework_id = params.get('id')
+    teacher_id = params.get('teacher_id')
+    # With a teacher's token only their own homework matches
+    cur.execute("""
+        UPDATE homework 
+        SET description = %s, due_date = %s
+        WHERE id = %s AND (%s::integer IS NULL OR teacher_id = %s)
+    """, (body.get('description'), check_due_date(cur, body.get('due_date')), homework_id, teacher_id, teacher_id))
+    if teacher_id is not None and cur.rowcount == 0:
+        raise HttpError(404, 'Homework not found')
+    return json_response(200, {'success': True})
+
+
+def delete_homework(cur, event: Dict[str, Any], params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    homework_id = params.get('id')
+    teacher_id = params.get('teacher_id')
+    cur.execute("DELETE FROM homework WHERE id = %s AND (%s::integer IS NULL OR teacher_id = %s)",
+                (homework_id, teacher_id, teacher_id))
+    if teacher_id is not None and cur.rowcount == 0:
+        raise HttpError(404, 'Homework not found')
+    return json_response(200, {'success': True})
+
+
+ROUTES = {
+    'GET': list_homework,
+    'POST': create_homework,
+    'PUT': update_homework,
+    'DELETE': delete_homework
+}
+
+# Roles allowed to call each method once tokens are required.
+ROLES = {
+    'GET': ('admin', 'teacher', 'student'),
+    'POST': ('admin', 'teacher'),
+    'PUT': ('admin', 'teacher'),
+    'DELETE': ('admin', 'teacher')
+}
+
+# Request checks that need no database; they run before a connection is
+# taken and return the body the route receives.
+VALIDATORS = {
+    'GET': check_listing_request,
+    'PUT': check_homework_id,
+    'DELETE': check_homework_id
+}
+
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Homework management - create, view homework assignments
-    Args: event with httpMethod, queryStringParameters, body
+    Args: event with httpMethod, queryStringParameters (class_id, subject_id, date_from, date_to, limit, cursor), body
     Returns: HTTP response with homework data or success status
     '''
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return {'statusCode': 200, 'headers': PREFLIGHT_HEADERS, 'isBase64Encoded': False, 'body': ''}
     
-    dsn = os.environ.get('DATABASE_URL')
-    params = event.get('queryStringParameters', {}) or {}
+    route = ROUTES.get(method)
+    if route is None:
+        return json_response(405, {'error': 'Method not allowed'})
     
+    params = event.get('queryStringParameters') or {}
+    
+    conn = None
     try:
-        conn = psycopg2.connect(dsn)
+        identity = request_identity(event)
+        params, body = authorize(method, params, parse_body(event) if method in ('POST', 'PUT') else {}, identity)
+        if method in VALIDATORS:
+            body = VALIDATORS[method](params, body)
+        conn = get_pool().getconn()
         cur = conn.cursor()
-        
-        if method == 'GET':
-            class_id = params.get('class_id')
-            
-            if class_id:
-                cur.execute("""
-                    SELECT h.id, h.description, h.due_date, 
-                           sub.name as subject_name, u.full_name as teacher_name
-                    FROM homework h
-                    JOIN subjects sub ON h.subject_id = sub.id
-                    LEFT JOIN teachers t ON h.teacher_id = t.id
-                    LEFT JOIN users u ON t.user_id = u.id
-                    WHERE h.class_id = %s
-                    ORDER BY h.due_date DESC
-                """, (class_id,))
-            else:
-                cur.execute("""
-                    SELECT h.id, h.description, h.due_date, 
-                           c.name as class_name, sub.name as subject_name, 
-                           u.full_name as teacher_name, h.class_id
-                    FROM homework h
-                    JOIN classes c ON h.class_id = c.id
-                    JOIN subjects sub ON h.subject_id = sub.id
-                    LEFT JOIN teachers t ON h.teacher_id = t.id
-                    LEFT JOIN users u ON t.user_id = u.id
-                    ORDER BY h.due_date DESC
-                """)
-            
-            rows = cur.fetchall()
-            
-            if class_id:
-                data = [{
-                    'id': r[0],
-                    'description': r[1],
-                    'due_date': str(r[2]),
-                    'subject_name': r[3],
-                    'teacher_name': r[4]
-                } for r in rows]
-            else:
-                data = [{
-                    'id': r[0],
-                    'description': r[1],
-                    'due_date': str(r[2]),
-                    'class_name': r[3],
-                    'subject_name': r[4],
-                    'teacher_name': r[5],
-                    'class_id': r[6]
-                } for r in rows]
-            
+        try:
+            response = route(cur, event, params, body)
+        finally:
             cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'data': data})
-            }
-        
-        elif method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            class_id = body_data.get('class_id')
-            subject_id = body_data.get('subject_id')
-            teacher_id = body_data.get('teacher_id')
-            description = body_data.get('description', '')
-            due_date = body_data.get('due_date')
-            
-            cur.execute("""
-                INSERT INTO homework (class_id, subject_id, teacher_id, description, due_date)
-                VALUES (%s, %s, %s, %s, %s)
-                RETURNING id
-            """, (class_id, subject_id, teacher_id, description, due_date))
-            
-            new_id = cur.fetchone()[0]
-            conn.commit()
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'success': True, 'id': new_id})
-            }
-        
-        elif method == 'PUT':
-            homework_id = params.get('id')
-            if not homework_id:
-                cur.close()
-                conn.close()
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'homework id required'})
-                }
-            
-            body_data = json.loads(event.get('body', '{}'))
-            description = body_data.get('description')
-            due_date = body_data.get('due_date')
-            
-            cur.execute("""
-                UPDATE homework 
-                SET description = %s, due_date = %s
-                WHERE id = %s
-            """, (description, due_date, homework_id))
-            
-            conn.commit()
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'success': True})
-            }
-        
-        elif method == 'DELETE':
-            homework_id = params.get('id')
-            if not homework_id:
-                cur.close()
-                conn.close()
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'homework id required'})
-                }
-            
-            cur.execute("DELETE FROM homework WHERE id = %s", (homework_id,))
+        if method != 'GET':
             conn.commit()
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'success': True})
-            }
-        
-        else:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 405,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'error': 'Method not allowed'})
-            }
+        return response
+    
+    except HttpError as e:
+        return json_response(e.status, e.payload)
     
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'error': str(e)})
-        }
\ No newline at end of file
+        return json_response(500, {'error': str(e)})
+    
+    finally:
+        if conn is not None:
+            get_pool().putconn(conn)
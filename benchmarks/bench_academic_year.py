@@ -0,0 +1,106 @@
+'''
+Journals on a school with several years of grades, before and after grades
+and homework were partitioned by academic year (V0009).
+
+  unpartitioned  schema up to V0008; with --baseline REV the grades handler
+                 is the one at that revision, which reads every year
+  partitioned    the current schema and handlers: journals read the
+                 current year's partition only
+
+Each schema gets the same school. Reported per request: statements, p50 and
+p99. Then the oldest year is removed: a DELETE of its grades and homework
+plus a stats rebuild on the unpartitioned tables, the admin rollover
+(DETACH and the same rebuild) on the partitioned ones.
+
+    BENCH_DATABASE_URL=postgresql://localhost/diary_bench python benchmarks/bench_academic_year.py [--years 5] [--classes 20] [--baseline REV]
+'''
+import argparse
+import importlib.util
+import subprocess
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+from common import ROOT, connect, install_query_counter, load_handler, make_event, measure, reset_schema, seed_school
+
+REPEAT = 50
+
+DELETE_YEAR_SQL = (
+    'DELETE FROM grades WHERE grade_date < %s',
+    'DELETE FROM homework WHERE due_date < %s',
+)
+
+
+def load_revision(rev: str, name: str):
+    source = subprocess.run(
+        ['git', 'show', f'{rev}:backend/{name}/index.py'], cwd=ROOT, check=True, capture_output=True
+    ).stdout
+    path = Path(tempfile.mkdtemp()) / 'index.py'
+    path.write_bytes(source)
+    spec = importlib.util.spec_from_file_location(f'{name}_{rev}', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def seed(before, args):
+    setup = connect()
+    reset_schema(setup, before)
+    ids = seed_school(setup, classes=args.classes, students_per_class=30, subjects=8, grades_per_subject=40,
+                      years=args.years, teachers=args.classes * 2)
+    setup.close()
+    return ids
+
+
+def journals(schema, grades, admin, ids):
+    class_id, subject_id, teacher_id = ids['classes'][0], ids['subjects'][0], ids['teachers'][0]
+    cases = (
+        ('class journal', grades, make_event('GET', {'class_id': class_id, 'subject_id': subject_id})),
+        ('teacher journals', grades, make_event('GET', {'teacher_id': teacher_id})),
+        ('admin homework', admin, make_event('GET', {'entity': 'homework', 'class_id': class_id})),
+    )
+    for label, module, event in cases:
+        row = measure(lambda: module.handler(event, None), REPEAT)
+        print(f'{schema:>13} {label:>17} {row["queries"]:>8.1f} {row["p50_ms"]:>9.2f} {row["p99_ms"]:>9.2f}')
+
+
+def drop_oldest_year(schema, admin, years):
+    today = date.today()
+    current = today.year if today.month >= 9 else today.year - 1
+    started = time.perf_counter()
+    if schema == 'partitioned':
+        response = admin.handler(make_event('POST', {'entity': 'academic_year'}, {'keep_years': years - 1}), None)
+    else:
+        conn = connect()
+        with conn.cursor() as cur:
+            for sql in DELETE_YEAR_SQL:
+                cur.execute(sql, (date(current - years + 2, 9, 1),))
+        conn.commit()
+        conn.close()
+        response = admin.handler(make_event('POST', {'entity': 'stats_rebuild'}, {}), None)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f'{schema:>13} {"drop oldest year":>17} {"":>8} {elapsed:>9.0f} {"":>9}  {response["body"][:80]}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--classes', type=int, default=20)
+    parser.add_argument('--baseline', metavar='REV')
+    args = parser.parse_args()
+    install_query_counter()
+
+    grades, admin = load_handler('grades'), load_handler('admin')
+    old_grades = load_revision(args.baseline, 'grades') if args.baseline else grades
+
+    print(f'{args.years} academic years, {args.classes} classes of 30')
+    print(f'{"schema":>13} {"request":>17} {"queries":>8} {"p50 ms":>9} {"p99 ms":>9}')
+    for schema, before, module in (('unpartitioned', 'V0009', old_grades), ('partitioned', None, grades)):
+        ids = seed(before, args)
+        journals(schema, module, admin, ids)
+        drop_oldest_year(schema, admin, args.years)
+
+
+if __name__ == '__main__':
+    main()
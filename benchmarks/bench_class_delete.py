@@ -0,0 +1,107 @@
+'''
+Deleting last year's classes from a school with five years of grades, while
+teachers keep grading the classes that stay.
+
+  single   the old admin DELETE, all statements in one transaction with the
+           grades of the whole class; teacher_classes is cleared too, which
+           the old DELETE did not do and so failed on any class with teachers
+  batched  the admin function as it is now: grades and homework in
+           transactions of CLASS_DELETE_BATCH_SIZE rows, then the rest
+           in one statement, repeating the DELETE while done is false
+
+A transaction that deleted grades holds the class_subject_stats rows of
+the class until it commits, and before V0010 also the 'grades' row of
+table_versions, which held up every other grade write in the school. A
+background thread posts grades to a remaining class
+through the grades function the whole time; its worst latency shows how
+long writers were held up. Users left behind without a student row are
+counted at the end.
+
+    BENCH_DATABASE_URL=postgresql://localhost/diary_bench python benchmarks/bench_class_delete.py [--classes 4]
+'''
+import argparse
+import json
+import threading
+import time
+from datetime import date
+
+from common import connect, load_handler, make_event, percentile, reset_schema, seed_school
+
+OLD_STATEMENTS = (
+    "DELETE FROM schedule WHERE class_id = %s",
+    "DELETE FROM homework WHERE class_id = %s",
+    "DELETE FROM grades WHERE student_id IN (SELECT id FROM students WHERE class_id = %s)",
+    "DELETE FROM class_subject_stats WHERE class_id = %s",
+    "DELETE FROM teacher_classes WHERE class_id = %s",
+    "DELETE FROM students WHERE class_id = %s",
+    "DELETE FROM classes WHERE id = %s",
+)
+
+ORPHANS_SQL = '''
+    SELECT COUNT(*) FROM users u
+    WHERE u.role = 'student' AND NOT EXISTS (SELECT 1 FROM students s WHERE s.user_id = u.id)
+'''
+
+
+def single(admin, conn, class_id):
+    with conn.cursor() as cur:
+        for statement in OLD_STATEMENTS:
+            cur.execute(statement, (class_id,))
+    conn.commit()
+    return 1
+
+
+def batched(admin, conn, class_id):
+    calls = 0
+    while True:
+        calls += 1
+        response = admin.handler(make_event('DELETE', {'entity': 'class', 'id': class_id}), None)
+        assert response['statusCode'] == 200, response['body']
+        if json.loads(response['body'])['done']:
+            return calls
+
+
+def writer(grades, ids, stop, latencies):
+    student_id, subject_id = ids['students'][-1], ids['subjects'][0]
+    event = make_event('POST', body={'student_id': student_id, 'subject_id': subject_id, 'grade': 4,
+                                     'grade_date': date.today().isoformat(), 'comment': ''})
+    while not stop.is_set():
+        started = time.perf_counter()
+        grades.handler(event, None)
+        latencies.append((time.perf_counter() - started) * 1000)
+        time.sleep(0.01)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--classes', type=int, default=4, help='classes deleted per variant')
+    args = parser.parse_args()
+    admin, grades = load_handler('admin'), load_handler('grades')
+    setup = connect()
+
+    print(f'{"variant":>8} {"s/class":>8} {"calls":>6} {"write p50":>10} {"write max":>10} {"orphans":>8}')
+    for variant, fn in (('single', single), ('batched', batched)):
+        reset_schema(setup)
+        ids = seed_school(setup, classes=args.classes + 1, students_per_class=30, subjects=10,
+                          grades_per_subject=20, years=5)
+        stop, latencies = threading.Event(), []
+        thread = threading.Thread(target=writer, args=(grades, ids, stop, latencies))
+        thread.start()
+        calls = 0
+        started = time.perf_counter()
+        for class_id in ids['classes'][:args.classes]:
+            calls += fn(admin, setup, class_id)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        thread.join()
+        with setup.cursor() as cur:
+            cur.execute(ORPHANS_SQL)
+            orphans = cur.fetchone()[0]
+        setup.commit()
+        print(f'{variant:>8} {elapsed / args.classes:>8.2f} {calls:>6} {percentile(latencies, 50):>10.1f} '
+              f'{max(latencies):>10.1f} {orphans:>8}')
+    setup.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+'''
+A student's week: the diary endpoint against what the frontend had to do
+before it existed.
+
+"composed" is the old page load: the class schedule and homework from the
+admin function, then one grades journal per subject, each of which reads
+the whole class. "diary" is one call to the diary function; "revalidate"
+repeats it with the ETag of the previous response: the same statement,
+answered 304 without a body.
+
+    BENCH_DATABASE_URL=postgresql://localhost/diary_bench python benchmarks/bench_diary.py
+'''
+from common import connect, install_query_counter, load_handler, make_event, measure, reset_schema, seed_school
+
+SUBJECTS = (5, 10, 15)
+REPEAT = 50
+
+
+def main():
+    install_query_counter()
+    admin, grades, diary = load_handler('admin'), load_handler('grades'), load_handler('diary')
+    setup = connect()
+    print(f'{"subjects":>8} {"variant":>10} {"queries":>8} {"p50 ms":>9} {"p99 ms":>9}')
+    for subjects in SUBJECTS:
+        reset_schema(setup)
+        ids = seed_school(setup, classes=2, students_per_class=30, subjects=subjects, grades_per_subject=20)
+        class_id, student_id = ids['classes'][0], ids['students'][0]
+
+        def composed():
+            admin.handler(make_event('GET', {'entity': 'schedule', 'class_id': class_id}), None)
+            admin.handler(make_event('GET', {'entity': 'homework', 'class_id': class_id}), None)
+            for subject_id in ids['subjects']:
+                grades.handler(make_event('GET', {'class_id': class_id, 'subject_id': subject_id}), None)
+
+        week = make_event('GET', {'student_id': student_id})
+        etag = diary.handler(week, None)['headers']['ETag']
+        revalidate = make_event('GET', {'student_id': student_id}, headers={'If-None-Match': etag})
+        assert diary.handler(revalidate, None)['statusCode'] == 304
+
+        for variant, fn in (('composed', composed),
+                            ('diary', lambda: diary.handler(week, None)),
+                            ('revalidate', lambda: diary.handler(revalidate, None))):
+            row = measure(fn, REPEAT)
+            print(f'{subjects:>8} {variant:>10} {row["queries"]:>8.1f} {row["p50_ms"]:>9.2f} {row["p99_ms"]:>9.2f}')
+    setup.close()
+
+
+if __name__ == '__main__':
+    main()
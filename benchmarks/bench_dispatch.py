@@ -0,0 +1,159 @@
+'''
+CPU cost of the request path itself: routing, body parsing, serialisation
+and header building, with the database taken out of the picture.
+
+Handlers run against an in-process connection that answers every statement
+with canned rows, so the numbers are process time spent in Python per
+request. With --baseline REV the same events are replayed through the
+handlers as they were at that git revision, for a before/after table.
+
+    python benchmarks/bench_dispatch.py [--baseline REV]
+'''
+import importlib.util
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from common import BACKEND, ROOT, make_event, percentile
+
+REPEAT = 5000
+
+JOURNAL_ROWS = [
+    (n, f'Student {n:03d}',
+     [{'id': n * 10 + k, 'grade': 2 + (n + k) % 4, 'date': '2025-10-0%d' % (k + 1), 'comment': ''} for k in range(8)],
+     8, 28)
+    for n in range(30)
+]
+HOMEWORK_ROWS = [
+    (n, f'Exercise {n}', date(2025, 12, 1) - timedelta(days=n), 'Subject', 'Teacher', 'Class', 1)
+    for n in range(101)
+]
+# scrypt hash of 'pass'; after the first login the verified-credential cache answers.
+PASSWORD_HASH = 'scrypt$16384$8$1$sAhMlsIMkt1J1bw9frfSnA$gmvjTUY2y2iFBHJm6E2gZt0F7bB8V2lKMbJGYjxJtkE'
+# First matching pattern answers the statement; anything else gets a single (1,) row.
+CANNED = [
+    (re.compile(r'FROM table_versions'), [('grades', 7), ('homework', 7), ('students', 7), ('users', 7)]),
+    (re.compile(r'EXECUTE login_user'), [(1, 'teacher0', 'teacher', 'Teacher 0', '#3B82F6', None, PASSWORD_HASH, 3, None, None)]),
+    (re.compile(r'json_agg'), JOURNAL_ROWS),
+    (re.compile(r'FROM homework'), HOMEWORK_ROWS),
+    (re.compile(r'FROM classes ORDER BY'), [(n, f'{5 + n % 7}A', 2025) for n in range(40)]),
+    (re.compile(r'FROM teachers t'), [(n, f'Teacher {n}', f'teacher{n}', 'pass', n) for n in range(80)]),
+]
+
+
+class CannedCursor:
+    rowcount = 1
+
+    def __init__(self):
+        self.rows = [(1,)]
+
+    def execute(self, query, vars=None):
+        query = query if isinstance(query, str) else query.decode()
+        self.rows = next((rows for pattern, rows in CANNED if pattern.search(query)), [(1,)])
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CannedConnection:
+    closed = 0
+    autocommit = False
+
+    def cursor(self, *args, **kwargs):
+        return CannedCursor()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def cases():
+    return [
+        ('auth', 'login', make_event('POST', body={'login': 'teacher0', 'password': 'pass'})),
+        ('grades', 'journal', make_event('GET', {'class_id': 1, 'subject_id': 1})),
+        ('homework', 'class page', make_event('GET', {'class_id': 1})),
+        ('admin', 'classes', make_event('GET', {'entity': 'classes'})),
+        ('admin', 'teachers', make_event('GET', {'entity': 'teachers'})),
+        ('admin', 'preflight', make_event('OPTIONS')),
+    ]
+
+
+def load(name, path):
+    spec = importlib.util.spec_from_file_location(f'dispatch_{name}_{abs(hash(path))}', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def baseline_sources(rev, workdir):
+    paths = {}
+    for name in {name for name, _, _ in cases()}:
+        source = subprocess.run(
+            ['git', 'show', f'{rev}:backend/{name}/index.py'], cwd=ROOT, check=True, capture_output=True
+        ).stdout
+        path = os.path.join(workdir, f'{name}.py')
+        with open(path, 'wb') as f:
+            f.write(source)
+        paths[name] = path
+    return paths
+
+
+def run(paths):
+    modules = {name: load(name, path) for name, path in paths.items()}
+    results = {}
+    for name, label, event in cases():
+        handler = modules[name].handler
+        handler(event, None)
+        samples = []
+        for _ in range(REPEAT):
+            started = time.process_time_ns()
+            handler(event, None)
+            samples.append((time.process_time_ns() - started) / 1000)
+        results[(name, label)] = (percentile(samples, 50), sum(samples) / len(samples))
+    return results
+
+
+def main():
+    import psycopg2
+    psycopg2.connect = lambda *args, **kwargs: CannedConnection()
+    os.environ.setdefault('DATABASE_URL', 'postgresql://canned')
+    os.environ['REFERENCE_CACHE_TTL'] = '0'
+
+    baseline = None
+    if '--baseline' in sys.argv:
+        rev = sys.argv[sys.argv.index('--baseline') + 1]
+        with tempfile.TemporaryDirectory() as workdir:
+            baseline = run(baseline_sources(rev, workdir))
+    current = run({name: str(BACKEND / name / 'index.py') for name, _, _ in cases()})
+
+    print(f'{"handler":>9} {"case":>11} {"p50 us":>9} {"mean us":>9}' + (f' {"base p50":>9} {"speedup":>8}' if baseline else ''))
+    for key, (p50, mean) in current.items():
+        line = f'{key[0]:>9} {key[1]:>11} {p50:>9.1f} {mean:>9.1f}'
+        if baseline:
+            line += f' {baseline[key][0]:>9.1f} {baseline[key][0] / p50:>7.2f}x'
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
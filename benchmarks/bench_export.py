@@ -0,0 +1,77 @@
+'''
+Grade export throughput and memory: rows per second and peak RSS of the
+process that builds the file, for schools of growing size.
+
+"export" is the export function: a named cursor read EXPORT_BATCH_SIZE rows
+at a time, written straight into gzip-compressed CSV (or XLSX with --format
+xlsx). "fetchall" is the same export with a batch size larger than the
+school, so every row is fetched into one list first, the way the grades
+function reads a journal. Each run happens in a fresh interpreter so peak
+RSS belongs to that run alone: for "export" it should grow only with the
+compressed file, for "fetchall" with the number of rows.
+
+    BENCH_DATABASE_URL=postgresql://localhost/diary_bench python benchmarks/bench_export.py [--format xlsx]
+'''
+import argparse
+import json
+import subprocess
+import sys
+
+from common import ROOT, connect, reset_schema, seed_school
+
+CLASSES = (5, 20, 60)
+
+PROBE = '''
+import base64, json, resource, sys, time
+sys.path.insert(0, sys.argv[1])
+from common import load_handler, make_event
+export = load_handler('export')
+variant, file_format = sys.argv[2], sys.argv[3]
+event = make_event('GET', {'format': file_format})
+if variant == 'fetchall':
+    # one fetchmany that takes every row, as a plain fetchall would
+    export.EXPORT_BATCH_SIZE = 10 ** 9
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+started = time.perf_counter()
+response = export.handler(event, None)
+elapsed = time.perf_counter() - started
+assert response['statusCode'] == 200, response['body']
+print(json.dumps({
+    'seconds': elapsed,
+    'file_kb': len(base64.b64decode(response['body'])) / 1024,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'growth_mb': (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / 1024,
+}))
+'''
+
+
+def run(variant, file_format):
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE, str(ROOT / 'benchmarks'), variant, file_format],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--format', choices=('csv', 'xlsx'), default='csv')
+    args = parser.parse_args()
+
+    setup = connect()
+    print(f'{"classes":>8} {"rows":>9} {"variant":>9} {"rows/s":>10} {"file KB":>9} {"peak RSS MB":>12} {"growth MB":>10}')
+    for classes in CLASSES:
+        reset_schema(setup)
+        seed_school(setup, classes=classes, students_per_class=30, subjects=10, grades_per_subject=20)
+        with setup.cursor() as cur:
+            cur.execute('SELECT COUNT(*) FROM grades')
+            rows = cur.fetchone()[0]
+        for variant in ('export', 'fetchall'):
+            row = run(variant, args.format)
+            print(f'{classes:>8} {rows:>9} {variant:>9} {rows / row["seconds"]:>10.0f} {row["file_kb"]:>9.0f} '
+                  f'{row["rss_mb"]:>12.1f} {row["growth_mb"]:>10.1f}')
+    setup.close()
+
+
+if __name__ == '__main__':
+    main()
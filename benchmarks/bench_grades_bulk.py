@@ -0,0 +1,67 @@
+'''
+Grade entry throughput: one POST per grade versus one batch POST.
+
+Single-row requests are only timed up to SINGLE_LIMIT rows; beyond that the
+batch is the only practical option and the single-row column is left blank.
+
+    BENCH_DATABASE_URL=postgresql://localhost/diary_bench python benchmarks/bench_grades_bulk.py
+'''
+import random
+import time
+from datetime import date, timedelta
+
+from common import QUERY_COUNT, connect, install_query_counter, load_handler, make_event, reset_schema, seed_school
+
+SIZES = (10, 1000, 100000)
+SINGLE_LIMIT = 1000
+
+
+def make_rows(ids, count):
+    rnd = random.Random(count)
+    start = date.today() - timedelta(days=120)
+    return [{
+        'student_id': rnd.choice(ids['students']),
+        'subject_id': rnd.choice(ids['subjects']),
+        'grade': rnd.randint(2, 5),
+        'grade_date': (start + timedelta(days=rnd.randrange(120))).isoformat(),
+        'comment': '',
+    } for _ in range(count)]
+
+
+def timed(fn):
+    queries = QUERY_COUNT['n']
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started, QUERY_COUNT['n'] - queries
+
+
+def main():
+    install_query_counter()
+    grades = load_handler('grades')
+    setup = connect()
+    reset_schema(setup)
+    ids = seed_school(setup, classes=10, students_per_class=30, subjects=5, grades_per_subject=0)
+    setup.close()
+    teacher_id = ids['teachers'][0]
+
+    print(f'{"rows":>8} {"single rows/s":>14} {"single queries":>15} {"batch rows/s":>13} {"batch queries":>14}')
+    for size in SIZES:
+        rows = make_rows(ids, size)
+
+        single = ''
+        single_queries = ''
+        if size <= SINGLE_LIMIT:
+            events = [make_event('POST', body=dict(row, teacher_id=teacher_id)) for row in rows]
+            elapsed, queries = timed(lambda: [grades.handler(e, None) for e in events])
+            single, single_queries = f'{size / elapsed:.0f}', f'{queries}'
+
+        event = make_event('POST', body={'teacher_id': teacher_id, 'grades': rows})
+        response = {}
+        elapsed, queries = timed(lambda: response.update(grades.handler(event, None)))
+        assert response['statusCode'] == 200, response['body'][:500]
+
+        print(f'{size:>8} {single:>14} {single_queries:>15} {size / elapsed:>13.0f} {queries:>14}')
+
+
+if __name__ == '__main__':
+    main()
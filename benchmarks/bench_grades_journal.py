@@ -0,0 +1,63 @@
+'''
+Journal page (grades GET) round trips and latency by class size.
+
+Compares the previous per-student query loop with the current handler.
+
+    BENCH_DATABASE_URL=postgresql://localhost/diary_bench python benchmarks/bench_grades_journal.py
+'''
+import json
+
+from common import connect, install_query_counter, load_handler, make_event, measure, reset_schema, seed_school
+
+SIZES = (30, 300, 3000)
+REPEAT = 30
+
+
+def legacy_journal(conn, class_id, subject_id):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT s.id, u.full_name
+        FROM students s
+        JOIN users u ON s.user_id = u.id
+        WHERE s.class_id = %s
+        ORDER BY u.full_name
+    """, (class_id,))
+    result = []
+    for student_id, student_name in cur.fetchall():
+        cur.execute("""
+            SELECT id, grade, grade_date, comment
+            FROM grades
+            WHERE student_id = %s AND subject_id = %s
+            ORDER BY grade_date
+        """, (student_id, subject_id))
+        grades = [{'id': g[0], 'grade': g[1], 'date': str(g[2]), 'comment': g[3]} for g in cur.fetchall()]
+        avg_grade = round(sum(g['grade'] for g in grades) / len(grades), 2) if grades else 0
+        result.append({'student_id': student_id, 'student_name': student_name, 'grades': grades, 'average': avg_grade})
+    cur.close()
+    return json.dumps({'data': result})
+
+
+def main():
+    install_query_counter()
+    grades = load_handler('grades')
+    setup = connect()
+    print(f'{"students":>8} {"variant":>8} {"queries":>8} {"p50 ms":>9} {"p99 ms":>9}')
+    for size in SIZES:
+        reset_schema(setup)
+        ids = seed_school(setup, classes=1, students_per_class=size, subjects=3, grades_per_subject=10)
+        class_id, subject_id = ids['classes'][0], ids['subjects'][0]
+
+        conn = connect()
+        legacy = measure(lambda: legacy_journal(conn, class_id, subject_id), REPEAT)
+        conn.close()
+
+        event = make_event('GET', {'class_id': class_id, 'subject_id': subject_id})
+        current = measure(lambda: grades.handler(event, None), REPEAT)
+
+        for name, row in (('legacy', legacy), ('current', current)):
+            print(f'{size:>8} {name:>8} {row["queries"]:>8.0f} {row["p50_ms"]:>9.2f} {row["p99_ms"]:>9.2f}')
+    setup.close()
+
+
+if __name__ == '__main__':
+    main()
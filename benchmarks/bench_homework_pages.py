@@ -0,0 +1,66 @@
+'''
+Homework listing payload and latency as the table grows.
+
+For each dataset size, times the first page and a deep page (reached by
+following next_cursor) of the school-wide listing, next to the size of
+the unpaginated listing the handler used to return.
+
+    BENCH_DATABASE_URL=postgresql://localhost/diary_bench python benchmarks/bench_homework_pages.py
+'''
+import json
+
+from common import connect, load_handler, make_event, measure, reset_schema, seed_school
+
+YEARS = (1, 2, 4, 8)
+REPEAT = 50
+
+
+def legacy_listing(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT h.id, h.description, h.due_date,
+               c.name as class_name, sub.name as subject_name,
+               u.full_name as teacher_name, h.class_id
+        FROM homework h
+        JOIN classes c ON h.class_id = c.id
+        JOIN subjects sub ON h.subject_id = sub.id
+        LEFT JOIN teachers t ON h.teacher_id = t.id
+        LEFT JOIN users u ON t.user_id = u.id
+        ORDER BY h.due_date DESC
+    """)
+    data = [{'id': r[0], 'description': r[1], 'due_date': str(r[2]), 'class_name': r[3],
+             'subject_name': r[4], 'teacher_name': r[5], 'class_id': r[6]} for r in cur.fetchall()]
+    cur.close()
+    return json.dumps({'data': data})
+
+
+def main():
+    homework = load_handler('homework')
+    setup = connect()
+    print(f'{"rows":>8} {"full KB":>9} {"full p50 ms":>12} {"page KB":>8} {"first p50 ms":>13} {"deep p50 ms":>12}')
+    for years in YEARS:
+        reset_schema(setup)
+        seed_school(setup, classes=40, students_per_class=1, subjects=10, grades_per_subject=0, years=years)
+        with setup.cursor() as cur:
+            cur.execute('SELECT count(*) FROM homework')
+            rows = cur.fetchone()[0]
+        full_kb = len(legacy_listing(setup).encode()) / 1024
+        full_ms = measure(lambda: legacy_listing(setup), 5)['p50_ms']
+
+        first = make_event('GET')
+        response = homework.handler(first, None)
+        page_kb = len(response['body'].encode()) / 1024
+
+        cursor = None
+        for _ in range(20):
+            cursor = json.loads(homework.handler(make_event('GET', {'cursor': cursor} if cursor else {}), None)['body'])['next_cursor']
+        deep = make_event('GET', {'cursor': cursor})
+
+        first_ms = measure(lambda: homework.handler(first, None), REPEAT)['p50_ms']
+        deep_ms = measure(lambda: homework.handler(deep, None), REPEAT)['p50_ms']
+        print(f'{rows:>8} {full_kb:>9.0f} {full_ms:>12.2f} {page_kb:>8.1f} {first_ms:>13.2f} {deep_ms:>12.2f}')
+    setup.close()
+
+
+if __name__ == '__main__':
+    main()
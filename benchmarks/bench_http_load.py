@@ -0,0 +1,164 @@
+'''
+HTTP load generator (wrk-style, stdlib only) for comparing the FastAPI
+server's Postgres mode with the cloud functions.
+
+Keeps --concurrency keep-alive connections busy for --duration seconds
+against one path and reports throughput and latency percentiles. The
+target is either a running server:
+
+    DATABASE_URL=postgresql://localhost/diary_bench uvicorn main:app --app-dir server --port 8000
+    BENCH_DATABASE_URL=postgresql://localhost/diary_bench python benchmarks/bench_http_load.py --target http://127.0.0.1:8000
+
+or, with --functions, the backend/*/index.py handlers served in-process
+behind a threaded HTTP adapter that turns each request into a function
+event (--no-pool makes every invocation open its own connection, like a
+cold function). The scratch database is reseeded first unless --no-seed
+is given; the default path is the journal of the first seeded class.
+'''
+import argparse
+import http.client
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from common import connect, load_handler, percentile, reset_schema, seed_school
+
+FUNCTIONS = ('auth', 'profile', 'grades', 'homework', 'diary', 'export', 'admin')
+
+
+def serve_functions(port, pool):
+    if not pool:
+        os.environ['DB_POOL_MAX_SIZE'] = '0'
+    handlers = {name: load_handler(name).handler for name in FUNCTIONS}
+
+    class Adapter(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # One buffered write per response, otherwise headers and body go out as
+        # separate segments and delayed ACKs add ~40 ms to every request.
+        wbufsize = 1 << 16
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def dispatch(self):
+            url = urlsplit(self.path)
+            handler = handlers.get(url.path.strip('/'))
+            length = int(self.headers.get('Content-Length') or 0)
+            event = {
+                'httpMethod': self.command,
+                'queryStringParameters': dict(parse_qsl(url.query)),
+                'headers': dict(self.headers),
+                'body': self.rfile.read(length).decode() if length else '',
+                'isBase64Encoded': False,
+            }
+            response = handler(event, None) if handler else {'statusCode': 404, 'headers': {}, 'body': ''}
+            body = response.get('body', '').encode()
+            self.send_response(response['statusCode'])
+            for name, value in response.get('headers', {}).items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = do_POST = do_PUT = do_DELETE = do_OPTIONS = dispatch
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Adapter)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def worker(host, port, method, path, body, deadline, samples, statuses):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    headers = {'Content-Type': 'application/json'} if body else {}
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            status = 'error'
+        samples.append((time.perf_counter() - started) * 1000)
+        statuses[status] = statuses.get(status, 0) + 1
+    conn.close()
+
+
+def run_load(base_url, method, path, body, concurrency, duration):
+    url = urlsplit(base_url)
+    deadline = time.perf_counter() + duration
+    results = [([], {}) for _ in range(concurrency)]
+    threads = [
+        threading.Thread(target=worker, args=(url.hostname, url.port or 80, method, path, body, deadline, *result))
+        for result in results
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    samples = [s for result in results for s in result[0]]
+    statuses = {}
+    for _, counts in results:
+        for status, count in counts.items():
+            statuses[status] = statuses.get(status, 0) + count
+    return {
+        'requests': len(samples),
+        'rps': len(samples) / elapsed,
+        'p50_ms': percentile(samples, 50),
+        'p95_ms': percentile(samples, 95),
+        'p99_ms': percentile(samples, 99),
+        'statuses': statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--target', help='base URL of a running server, e.g. http://127.0.0.1:8000')
+    parser.add_argument('--functions', action='store_true', help='serve backend/*/index.py in-process instead')
+    parser.add_argument('--no-pool', action='store_true', help='with --functions: one connection per invocation')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--method', default='GET')
+    parser.add_argument('--path', help='request path with query string (default: journal of the first class)')
+    parser.add_argument('--body', help='JSON request body')
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--no-seed', action='store_true')
+    args = parser.parse_args()
+    if not args.target and not args.functions:
+        parser.error('give --target URL or --functions')
+
+    path = args.path
+    if not args.no_seed:
+        setup = connect()
+        reset_schema(setup)
+        ids = seed_school(setup, classes=20, students_per_class=30, subjects=8, grades_per_subject=12)
+        setup.close()
+        path = path or f'/grades?class_id={ids["classes"][0]}&subject_id={ids["subjects"][0]}'
+    if not path:
+        parser.error('--path is required with --no-seed')
+
+    base_url = args.target
+    if args.functions:
+        serve_functions(args.port, pool=not args.no_pool)
+        base_url = f'http://127.0.0.1:{args.port}'
+
+    body = args.body.encode() if args.body else None
+    result = run_load(base_url, args.method, path, body, args.concurrency, args.duration)
+    print(f'{args.method} {base_url}{path}  concurrency {args.concurrency}, {args.duration:.0f}s')
+    print(f'{result["requests"]} requests, {result["rps"]:.0f} req/s, '
+          f'p50 {result["p50_ms"]:.1f} ms, p95 {result["p95_ms"]:.1f} ms, p99 {result["p99_ms"]:.1f} ms')
+    print('statuses: ' + json.dumps({str(k): v for k, v in sorted(result['statuses'].items(), key=str)}))
+
+
+if __name__ == '__main__':
+    main()
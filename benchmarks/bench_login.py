@@ -0,0 +1,111 @@
+'''
+Login throughput at peak with hashed passwords.
+
+A burst of logins from CONCURRENCY threads goes through the auth handler
+in three phases:
+
+  first   every user logs in once; rows still hold the seeded plaintext
+          password, so each login verifies, hashes and writes the upgrade
+  cold    the same users again with the verified-credential cache cleared,
+          so each login pays one scrypt verification
+  warm    the same users again within AUTH_VERIFIED_TTL: cache hits, no KDF
+
+The raw cost of one scrypt hash is printed after the phases. Cold throughput is bound
+by AUTH_KDF_CONCURRENCY and the cores behind it; logins that wait longer
+than AUTH_KDF_WAIT for a slot come back as 503 and are counted as rejected.
+Warm throughput is bound by the database round trips per login, shown in
+the queries column. With --baseline REV the phases are repeated with the
+auth handler as it was at that git revision, against a freshly seeded school.
+
+    BENCH_DATABASE_URL=postgresql://localhost/diary_bench python benchmarks/bench_login.py [--users 400] [--concurrency 16] [--baseline REV]
+'''
+import argparse
+import importlib.util
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from common import (BACKEND, QUERY_COUNT, ROOT, bench_dsn, connect, install_query_counter, make_event, percentile,
+                    reset_schema, seed_school)
+
+
+def burst(module, events, concurrency):
+    def one(event):
+        started = time.perf_counter()
+        status = module.handler(event, None)['statusCode']
+        return status, (time.perf_counter() - started) * 1000
+
+    start_queries = QUERY_COUNT['n']
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, events))
+    elapsed = time.perf_counter() - started
+    latencies = [ms for status, ms in results if status == 200]
+    return {
+        'ok': len(latencies),
+        'rejected': sum(1 for status, _ in results if status == 503),
+        'failed': sum(1 for status, _ in results if status not in (200, 503)),
+        'per_sec': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50),
+        'p99_ms': percentile(latencies, 99),
+        'queries': (QUERY_COUNT['n'] - start_queries) / len(events),
+    }
+
+
+def load_auth(path, name):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run(path, name, users, concurrency):
+    setup = connect()
+    reset_schema(setup)
+    seed_school(setup, classes=1, students_per_class=1, subjects=1, grades_per_subject=1, teachers=users)
+    setup.close()
+
+    module = load_auth(path, name)
+    module._pool = module.ConnectionPool(bench_dsn(), concurrency, module.DB_POOL_IDLE_TIMEOUT, module.DB_POOL_CHECK_AFTER)
+    events = [make_event('POST', body={'login': f'teacher{i}', 'password': 'pass'}) for i in range(users)]
+
+    print(f'{"phase":>6} {"logins/s":>10} {"p50 ms":>9} {"p99 ms":>9} {"queries":>8} {"ok":>6} {"503":>6} {"failed":>6}')
+    for phase in ('first', 'cold', 'warm'):
+        if phase == 'cold' and hasattr(module, 'verified_credentials'):
+            module.verified_credentials = module.VerifiedCredentials(module.VERIFIED_TTL, module.VERIFIED_CACHE_SIZE)
+        row = burst(module, events, concurrency)
+        print(f'{phase:>6} {row["per_sec"]:>10.1f} {row["p50_ms"]:>9.2f} {row["p99_ms"]:>9.2f} {row["queries"]:>8.2f} '
+              f'{row["ok"]:>6} {row["rejected"]:>6} {row["failed"]:>6}')
+    return module
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--baseline', metavar='REV')
+    args = parser.parse_args()
+    install_query_counter()
+
+    print(f'current tree, {args.concurrency} concurrent logins')
+    module = run(BACKEND / 'auth' / 'index.py', 'login_current', args.users, args.concurrency)
+    started = time.perf_counter()
+    module.hash_password('pass')
+    print(f'scrypt N={module.SCRYPT_N}: {(time.perf_counter() - started) * 1000:.1f} ms per hash, '
+          f'{module.KDF_CONCURRENCY} KDF slots')
+
+    if args.baseline:
+        source = subprocess.run(
+            ['git', 'show', f'{args.baseline}:backend/auth/index.py'], cwd=ROOT, check=True, capture_output=True
+        ).stdout
+        with tempfile.TemporaryDirectory() as workdir:
+            path = Path(workdir) / 'index.py'
+            path.write_bytes(source)
+            print(f'\n{args.baseline}')
+            run(path, 'login_baseline', args.users, args.concurrency)
+
+
+if __name__ == '__main__':
+    main()
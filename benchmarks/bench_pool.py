@@ -0,0 +1,41 @@
+'''
+Per-request latency of the handlers with and without the warm connection pool.
+
+The "per-request" variant sets the pool size to 0, which makes every
+invocation connect and disconnect like the handlers used to. Point
+BENCH_DATABASE_URL at a server reached over TCP (and sslmode=require if
+production uses TLS) to see the handshake cost the pool removes.
+
+    BENCH_DATABASE_URL=postgresql://localhost/diary_bench python benchmarks/bench_pool.py
+'''
+from common import bench_dsn, connect, load_handler, make_event, measure, reset_schema, seed_school
+
+REPEAT = 300
+
+
+def main():
+    setup = connect()
+    reset_schema(setup)
+    ids = seed_school(setup, classes=4, students_per_class=30, subjects=5)
+    setup.close()
+
+    cases = [
+        ('auth', make_event('POST', body={'login': 'teacher0', 'password': 'pass'})),
+        ('grades', make_event('GET', {'class_id': ids['classes'][0], 'subject_id': ids['subjects'][0]})),
+        ('homework', make_event('GET', {'class_id': ids['classes'][0]})),
+        ('admin', make_event('GET', {'entity': 'classes'})),
+    ]
+    print(f'{"handler":>9} {"mode":>12} {"p50 ms":>9} {"p99 ms":>9}')
+    for name, event in cases:
+        module = load_handler(name)
+        for mode, size in (('per-request', 0), ('pooled', module.DB_POOL_MAX_SIZE)):
+            module._pool = module.ConnectionPool(
+                bench_dsn(), size, module.DB_POOL_IDLE_TIMEOUT, module.DB_POOL_CHECK_AFTER
+            )
+            module.handler(event, None)
+            row = measure(lambda: module.handler(event, None), REPEAT)
+            print(f'{name:>9} {mode:>12} {row["p50_ms"]:>9.2f} {row["p99_ms"]:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
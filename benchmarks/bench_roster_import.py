@@ -0,0 +1,101 @@
+'''
+Onboarding a school: ROWS new students (and a tenth as many teachers) created
+one admin POST at a time against one roster import.
+
+  per row       POST entity=student / entity=teacher per person, the way the
+                admin page adds people: two INSERTs and a commit each
+  roster json   POST entity=roster with the rows as objects
+  roster csv    POST entity=roster with the same rows as CSV text
+
+Each variant starts from a freshly seeded school so logins never collide;
+the queries column counts execute() calls, the roster's COPY is one more.
+Password hashing is part of every variant but is not what this compares, so
+AUTH_SCRYPT_N is lowered to 1024 unless set; the roster hashes on
+ROSTER_HASH_WORKERS threads, which is reported with the cost of one hash at
+the production work factor.
+
+    BENCH_DATABASE_URL=postgresql://localhost/diary_bench python benchmarks/bench_roster_import.py [--rows 10000]
+'''
+import argparse
+import csv
+import io
+import os
+import time
+
+from common import QUERY_COUNT, connect, install_query_counter, load_handler, make_event, reset_schema, seed_school
+
+os.environ.setdefault('AUTH_SCRYPT_N', '1024')
+
+CLASSES = 50
+
+
+def roster(rows, class_names):
+    people = []
+    for i in range(rows):
+        if i % 10 == 9:
+            people.append({'role': 'teacher', 'login': f'new_teacher{i}', 'password': f'pw{i}',
+                           'full_name': f'Новый учитель {i}', 'class_name': ''})
+        else:
+            people.append({'role': 'student', 'login': f'new_student{i}', 'password': f'pw{i}',
+                           'full_name': f'Новый ученик {i}', 'class_name': class_names[i % len(class_names)]})
+    return people
+
+
+def as_csv(people):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=['role', 'login', 'password', 'full_name', 'class_name'])
+    writer.writeheader()
+    writer.writerows(people)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10000)
+    args = parser.parse_args()
+    install_query_counter()
+    admin = load_handler('admin')
+    setup = connect()
+
+    def fresh_school():
+        reset_schema(setup)
+        seed_school(setup, classes=CLASSES, students_per_class=1, subjects=1, grades_per_subject=1)
+        with setup.cursor() as cur:
+            cur.execute('SELECT id, name FROM classes ORDER BY id')
+            return cur.fetchall()
+
+    def per_row(people, classes):
+        class_ids = {name: class_id for class_id, name in classes}
+        for person in people:
+            entity = person['role']
+            body = dict(person, class_id=class_ids.get(person['class_name']))
+            assert admin.handler(make_event('POST', {'entity': entity}, body), None)['statusCode'] == 200
+
+    def roster_json(people, classes):
+        response = admin.handler(make_event('POST', {'entity': 'roster'}, {'rows': people}), None)
+        assert response['statusCode'] == 200, response['body']
+
+    def roster_csv(people, classes):
+        response = admin.handler(make_event('POST', {'entity': 'roster'}, {'csv': as_csv(people)}), None)
+        assert response['statusCode'] == 200, response['body']
+
+    print(f'{args.rows} rows, {admin.ROSTER_HASH_WORKERS} hash workers, scrypt N={admin.SCRYPT_N}')
+    print(f'{"variant":>12} {"seconds":>9} {"rows/s":>9} {"queries":>8}')
+    for variant, fn in (('per row', per_row), ('roster json', roster_json), ('roster csv', roster_csv)):
+        classes = fresh_school()
+        people = roster(args.rows, [name for _, name in classes])
+        queries = QUERY_COUNT['n']
+        started = time.perf_counter()
+        fn(people, classes)
+        elapsed = time.perf_counter() - started
+        print(f'{variant:>12} {elapsed:>9.2f} {args.rows / elapsed:>9.0f} {QUERY_COUNT["n"] - queries:>8}')
+    setup.close()
+
+    admin.SCRYPT_N = 16384
+    started = time.perf_counter()
+    admin.hash_password('pass')
+    print(f'one hash at N=16384: {(time.perf_counter() - started) * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
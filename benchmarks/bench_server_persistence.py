@@ -0,0 +1,82 @@
+'''
+Mock server persistence: write throughput and startup time by dataset size.
+
+For each size the grades table is filled through the write log, then the
+server is "restarted" three ways: replaying the whole log on top of an
+empty snapshot, loading a snapshot plus a 10% log tail, and loading a
+snapshot alone. The restarts skip close(), like a crash would. A short
+run with fsync after every write shows what the batching buys.
+
+    python benchmarks/bench_server_persistence.py
+'''
+import os
+import sys
+import tempfile
+import time
+
+from common import ROOT
+
+sys.path.insert(0, str(ROOT / 'server'))
+from persistence import Persistence  # noqa: E402
+from store import Store  # noqa: E402
+
+SIZES = (10000, 100000, 1000000)
+FSYNC_EACH_ROWS = 1000
+INDEXES = {'students': ('class_id',), 'grades': (('class_id', 'subject_id'),)}
+
+
+def new_store():
+    students = [{'id': n, 'full_name': f'Student {n}', 'class_id': n % 40 + 1} for n in range(1, 1201)]
+    return Store({'students': students, 'grades': []}, indexes=INDEXES)
+
+
+def grade(n):
+    return {'student_id': n % 1200 + 1, 'class_id': (n % 1200 + 1) % 40 + 1, 'subject_id': n % 10 + 1,
+            'grade': n % 4 + 2, 'grade_date': '2025-10-01', 'comment': ''}
+
+
+def fill(persistence, db, start, count):
+    started = time.perf_counter()
+    for n in range(start, start + count):
+        db['grades'].insert(grade(n))
+    persistence.flush()
+    return count / (time.perf_counter() - started)
+
+
+def restart(directory, fsync_interval=0.05):
+    db = new_store()
+    persistence = Persistence(directory, fsync_interval=fsync_interval, snapshot_every=10 ** 9)
+    stats = persistence.open(db)
+    return persistence, db, stats
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        persistence, db, _ = restart(directory, fsync_interval=0)
+        per_write = fill(persistence, db, 0, FSYNC_EACH_ROWS)
+    print(f'fsync after every write: {per_write:.0f} rows/s')
+    print()
+    print(f'{"rows":>8} {"batched rows/s":>15} {"full log s":>11} {"snap+tail s":>12} {"snapshot s":>11} {"snapshot MB":>12}')
+    for size in SIZES:
+        with tempfile.TemporaryDirectory() as directory:
+            persistence, db, _ = restart(directory)
+            batched = fill(persistence, db, 0, size)
+
+            persistence, db, full_log = restart(directory)
+            assert len(db['grades']) == size
+            persistence.snapshot()
+            fill(persistence, db, size, size // 10)
+
+            persistence, db, with_tail = restart(directory)
+            assert len(db['grades']) == size + size // 10
+            persistence.snapshot()
+
+            persistence, db, snapshot_only = restart(directory)
+            megabytes = os.path.getsize(os.path.join(directory, 'snapshot.jsonl')) / 2 ** 20
+            print(f'{size:>8} {batched:>15.0f} {full_log["seconds"]:>11.2f} {with_tail["seconds"]:>12.2f} '
+                  f'{snapshot_only["seconds"]:>11.2f} {megabytes:>12.1f}')
+            persistence.close()
+
+
+if __name__ == '__main__':
+    main()
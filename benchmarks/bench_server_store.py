@@ -0,0 +1,101 @@
+'''
+The FastAPI mock server's store: indexed tables versus the old lists.
+
+Replays the server's hot operations (login lookup, journal filter, create,
+delete) against
+the list-of-dicts `db` the server used to keep and against server/store.py,
+at growing dataset sizes. Needs no database and no FastAPI.
+
+    python benchmarks/bench_server_store.py
+'''
+import random
+import sys
+import time
+
+from common import ROOT
+
+sys.path.insert(0, str(ROOT / 'server'))
+from store import Store  # noqa: E402
+
+SIZES = (1000, 10000, 100000)
+OPS = 200
+
+
+def make_data(size):
+    users = [{'id': n, 'login': f'user{n}', 'password': 'pass', 'role': 'student', 'full_name': f'User {n}'}
+             for n in range(1, size + 1)]
+    students = [{'id': n, 'login': f'user{n}', 'class_id': n % 50 + 1} for n in range(1, size + 1)]
+    grades = [{'id': n, 'student_id': n % size + 1, 'class_id': (n % size + 1) % 50 + 1, 'subject_id': n % 10 + 1,
+               'grade': 5} for n in range(1, size + 1)]
+    return {'users': users, 'students': students, 'grades': grades}
+
+
+def legacy_ops(db, logins, ids):
+    def login():
+        for name in logins:
+            user = next((u for u in db['users'] if u['login'] == name and u['password'] == 'pass'), None)
+            next((s for s in db['students'] if s['login'] == user['login']), None)
+
+    def journal():
+        for n in range(OPS):
+            [g for g in db['grades'] if g['class_id'] == n % 50 + 1 and g['subject_id'] == n % 10 + 1]
+
+    def create():
+        for _ in range(OPS):
+            new_id = max([item['id'] for item in db['grades']], default=0) + 1
+            db['grades'].append({'id': new_id, 'grade': 4})
+
+    def delete():
+        for row_id in ids:
+            db['grades'] = [g for g in db['grades'] if g['id'] != row_id]
+
+    return login, journal, create, delete
+
+
+def store_ops(db, logins, ids):
+    def login():
+        for name in logins:
+            user = next((u for u in db['users'].find('login', name) if u['password'] == 'pass'), None)
+            db['students'].first('login', user['login'])
+
+    def journal():
+        for n in range(OPS):
+            db['grades'].find(('class_id', 'subject_id'), (n % 50 + 1, n % 10 + 1))
+
+    def create():
+        for _ in range(OPS):
+            db['grades'].insert({'grade': 4})
+
+    def delete():
+        for row_id in ids:
+            db['grades'].delete(row_id)
+
+    return login, journal, create, delete
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return OPS / (time.perf_counter() - started)
+
+
+def main():
+    print(f'{"rows":>8} {"op":>7} {"lists ops/s":>12} {"store ops/s":>12} {"speedup":>8}')
+    for size in SIZES:
+        rnd = random.Random(size)
+        logins = [f'user{rnd.randint(1, size)}' for _ in range(OPS)]
+        ids = rnd.sample(range(1, size + 1), OPS)
+        data = make_data(size)
+        legacy = legacy_ops({k: [dict(r) for r in v] for k, v in data.items()}, logins, ids)
+        store = store_ops(Store(data, indexes={
+            'users': ('login',),
+            'students': ('login', 'class_id'),
+            'grades': (('class_id', 'subject_id'),),
+        }), logins, ids)
+        for name, old, new in zip(('login', 'journal', 'create', 'delete'), legacy, store):
+            before, after = timed(old), timed(new)
+            print(f'{size:>8} {name:>7} {before:>12.0f} {after:>12.0f} {after / before:>7.0f}x')
+
+
+if __name__ == '__main__':
+    main()
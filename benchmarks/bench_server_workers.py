@@ -0,0 +1,97 @@
+'''
+Mock server throughput versus uvicorn worker count with the shared SQLite store.
+
+For each worker count a fresh `uvicorn main:app --workers N` is started with
+SQLITE_PATH pointing at a new WAL file, then several load-generator
+processes (bench_http_load.run_load) hit it with journal reads and grade
+writes. The single-process in-memory store is measured first as the
+baseline. Reads run before writes so the journal stays small. Worker
+counts beyond the machine's cores only add contention, so run it on the
+box you are sizing.
+
+    python benchmarks/bench_server_workers.py [--workers 1,2,4,8] [--duration 10]
+'''
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_http_load import run_load
+from common import ROOT
+
+PORT = 8097
+LOADERS = 4
+CONNECTIONS_PER_LOADER = 32
+READ = ('GET', '/grades?class_id=1&subject_id=1', None)
+WRITE = ('POST', '/grades', json.dumps({
+    'student_id': 1, 'subject_id': 1, 'grade': 5, 'grade_date': '2025-10-01', 'comment': ''}).encode())
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f'server did not start on port {port}')
+
+
+def start_server(workers, sqlite_path):
+    env = dict(os.environ)
+    env.pop('DATABASE_URL', None)
+    env.pop('PERSIST_DIR', None)
+    if sqlite_path:
+        env['SQLITE_PATH'] = sqlite_path
+    else:
+        env.pop('SQLITE_PATH', None)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(PORT), '--workers', str(workers),
+         '--log-level', 'warning', '--no-access-log'],
+        cwd=ROOT / 'server', env=env
+    )
+    wait_for_port(PORT)
+    return server
+
+
+def load(args):
+    method, path, body, duration = args
+    return run_load(f'http://127.0.0.1:{PORT}', method, path, body, CONNECTIONS_PER_LOADER, duration)
+
+
+def measure(request, duration):
+    with multiprocessing.Pool(LOADERS) as pool:
+        results = pool.map(load, [(*request, duration)] * LOADERS)
+    errors = sum(n for r in results for status, n in r['statuses'].items() if status != 200)
+    return sum(r['rps'] for r in results), max(r['p99_ms'] for r in results), errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', default='1,2,4,8')
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    print(f'{os.cpu_count()} cores, {LOADERS} load processes x {CONNECTIONS_PER_LOADER} connections')
+    print(f'{"store":>8} {"workers":>8} {"read req/s":>11} {"read p99":>9} {"write req/s":>12} {"write p99":>10} {"errors":>7}')
+    runs = [('memory', 1)] + [('sqlite', int(n)) for n in args.workers.split(',')]
+    for store, workers in runs:
+        with tempfile.TemporaryDirectory() as directory:
+            server = start_server(workers, os.path.join(directory, 'diary.db') if store == 'sqlite' else None)
+            try:
+                read_rps, read_p99, read_errors = measure(READ, args.duration)
+                write_rps, write_p99, write_errors = measure(WRITE, args.duration)
+            finally:
+                server.terminate()
+                server.wait()
+        print(f'{store:>8} {workers:>8} {read_rps:>11.0f} {read_p99:>8.1f}ms {write_rps:>12.0f} {write_p99:>9.1f}ms '
+              f'{read_errors + write_errors:>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+'''
+Benchmark suite: a seeded school, a weighted mix of the requests the
+handlers really get, and results saved so commits can be compared.
+
+The scratch database gets --classes classes of --students students with
+--years years of grades. The events of common.handler_events() are drawn
+--requests times with the weights in MIX, which lean towards journal and
+diary reads as in term time, and every endpoint is drawn at least
+MIN_PER_ENDPOINT times. The sequence is replayed:
+
+  direct  through each backend/<name>/index.py handler in-process, with
+          the function event, one request at a time
+  http    with --http, over keep-alive connections from --concurrency
+          threads, to the handlers served behind the event adapter of
+          bench_http_load.py, or to a running server given as --target
+
+Per endpoint: requests, p50/p95/p99 latency, statements per request (direct
+only) and the memory one request allocates at its peak (tracemalloc, median
+of ALLOC_REPEAT calls, in a separate pass so tracing does not skew the
+timings). Responses other than 2xx and 304 are counted as errors.
+
+--out writes the results as JSON labelled with the git revision. --compare
+BASE.json prints every metric of this run next to its change against an
+earlier one, marking changes worse than --threshold percent; given two
+files it compares them without running anything. With --strict, marked
+regressions make the exit status non-zero.
+
+    BENCH_DATABASE_URL=postgresql://localhost/diary_bench python benchmarks/bench_suite.py --http --out before.json
+    BENCH_DATABASE_URL=postgresql://localhost/diary_bench python benchmarks/bench_suite.py --http --compare before.json
+    python benchmarks/bench_suite.py --compare before.json after.json
+'''
+import argparse
+import http.client
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+
+from common import (QUERY_COUNT, ROOT, connect, handler_events, install_query_counter, load_handler, percentile,
+                    reset_schema, seed_school)
+
+# Relative request rates; endpoints of handler_events() not listed get weight 1.
+# The stats check is a maintenance request, not traffic.
+MIX = {
+    'grades: journal': 25,
+    'grades: teacher journals': 5,
+    'grades: add grade': 8,
+    'diary: student week': 25,
+    'homework: class homework': 10,
+    'homework: all homework': 2,
+    'auth: login teacher': 2,
+    'auth: login student': 6,
+    'admin: class schedule': 4,
+    'admin: stats check': 0,
+}
+MIN_PER_ENDPOINT = 20
+ALLOC_REPEAT = 10
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'queries', 'alloc_kb')
+
+
+def git_label() -> str:
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+
+    revision = git('rev-parse', '--short', 'HEAD') or 'unknown'
+    return revision + ('+dirty' if git('status', '--porcelain', '--untracked-files=no') else '')
+
+
+def traffic(events, requests, seed):
+    '''The replay sequence of (endpoint, function, event): weighted draws plus the per-endpoint minimum.'''
+    keyed = [(f'{name}: {label}', name, event) for name, label, event in events]
+    keyed = [item for item in keyed if MIX.get(item[0], 1) > 0]
+    rnd = random.Random(seed)
+    sequence = rnd.choices(keyed, weights=[MIX.get(key, 1) for key, _, _ in keyed], k=requests)
+    sequence += keyed * MIN_PER_ENDPOINT
+    rnd.shuffle(sequence)
+    return keyed, sequence
+
+
+def is_error(status) -> bool:
+    return not (isinstance(status, int) and (200 <= status < 300 or status == 304))
+
+
+def summarise(samples, queries, errors, elapsed):
+    result = {
+        key: {
+            'requests': len(times),
+            'p50_ms': percentile(times, 50),
+            'p95_ms': percentile(times, 95),
+            'p99_ms': percentile(times, 99),
+            'errors': errors.get(key, 0),
+        }
+        for key, times in samples.items()
+    }
+    for key, count in queries.items():
+        result[key]['queries'] = count / len(samples[key])
+    every = [t for times in samples.values() for t in times]
+    result['*'] = {
+        'requests': len(every),
+        'rps': len(every) / elapsed,
+        'p50_ms': percentile(every, 50),
+        'p95_ms': percentile(every, 95),
+        'p99_ms': percentile(every, 99),
+        'errors': sum(errors.values()),
+    }
+    if queries:
+        result['*']['queries'] = sum(queries.values()) / len(every)
+    return result
+
+
+def run_direct(handlers, keyed, sequence):
+    for key, name, event in keyed:
+        handlers[name].handler(event, None)
+
+    samples, queries, errors = defaultdict(list), defaultdict(int), defaultdict(int)
+    started = time.perf_counter()
+    for key, name, event in sequence:
+        before = QUERY_COUNT['n']
+        call_started = time.perf_counter()
+        response = handlers[name].handler(event, None)
+        samples[key].append((time.perf_counter() - call_started) * 1000)
+        queries[key] += QUERY_COUNT['n'] - before
+        if is_error(response['statusCode']):
+            errors[key] += 1
+    return summarise(samples, queries, errors, time.perf_counter() - started)
+
+
+def allocations(handlers, keyed):
+    '''Median peak of memory allocated while one request runs, in KiB.'''
+    result = {}
+    tracemalloc.start()
+    try:
+        for key, name, event in keyed:
+            peaks = []
+            for _ in range(ALLOC_REPEAT):
+                tracemalloc.reset_peak()
+                current = tracemalloc.get_traced_memory()[0]
+                handlers[name].handler(event, None)
+                peaks.append(tracemalloc.get_traced_memory()[1] - current)
+            result[key] = percentile(peaks, 50) / 1024
+    finally:
+        tracemalloc.stop()
+    return result
+
+
+def http_request(name, event):
+    params = event.get('queryStringParameters') or {}
+    path = f'/{name}' + (f'?{urlencode(params)}' if params else '')
+    body = event.get('body') or None
+    return event['httpMethod'], path, body.encode() if body else None
+
+
+def run_http(base_url, keyed, sequence, concurrency):
+    url = urlsplit(base_url)
+    samples, errors = defaultdict(list), defaultdict(int)
+    lock = threading.Lock()
+
+    def worker(chunk):
+        conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+        for key, name, event in chunk:
+            method, path, body = http_request(name, event)
+            headers = {'Content-Type': 'application/json'} if body else {}
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+                status = 'error'
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                samples[key].append(elapsed)
+                if is_error(status):
+                    errors[key] += 1
+        conn.close()
+
+    worker(keyed)
+    samples.clear()
+    errors.clear()
+    threads = [threading.Thread(target=worker, args=(sequence[i::concurrency],)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarise(samples, {}, errors, time.perf_counter() - started)
+
+
+def print_results(mode, rows):
+    print(f'\n{mode}')
+    print(f'{"endpoint":>26} {"n":>6} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"queries":>8} {"alloc KiB":>10} {"errors":>6}')
+    for key in sorted(rows, key=lambda k: (k == '*', k)):
+        row = rows[key]
+        queries = f'{row["queries"]:>8.2f}' if 'queries' in row else f'{"-":>8}'
+        alloc = f'{row["alloc_kb"]:>10.1f}' if 'alloc_kb' in row else f'{"-":>10}'
+        label = f'all ({row["rps"]:.0f} req/s)' if key == '*' else key
+        print(f'{label:>26} {row["requests"]:>6} {row["p50_ms"]:>8.2f} {row["p95_ms"]:>8.2f} {row["p99_ms"]:>8.2f} '
+              f'{queries} {alloc} {row["errors"]:>6}')
+
+
+def compare(base, current, threshold):
+    '''Print current metrics with their change against base; returns the number of marked regressions.'''
+    if base.get('config') != current.get('config'):
+        print(f'note: runs used different settings\n  {base.get("config")}\n  {current.get("config")}')
+    regressions = 0
+    for mode in ('direct', 'http'):
+        if not base.get(mode) or not current.get(mode):
+            continue
+        print(f'\n{mode}: {base["label"]} -> {current["label"]}, change in %, ! worse than {threshold:.0f}%')
+        print(f'{"endpoint":>26} ' + ' '.join(f'{metric:>17}' for metric in METRICS))
+        for key in sorted(set(base[mode]) | set(current[mode]), key=lambda k: (k == '*', k)):
+            old_row, new_row = base[mode].get(key, {}), current[mode].get(key, {})
+            cells = []
+            for metric in METRICS:
+                old, new = old_row.get(metric), new_row.get(metric)
+                if old is None or new is None:
+                    cells.append(f'{"-":>17}')
+                    continue
+                change = (new - old) / old * 100 if old else (0.0 if new == old else float('inf'))
+                worse = change > threshold
+                regressions += worse
+                cells.append(f'{new:>9.2f} {change:>+6.0f}{"!" if worse else " "}')
+            print(f'{"all" if key == "*" else key:>26} ' + ' '.join(cells))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--classes', type=int, default=20)
+    parser.add_argument('--students', type=int, default=30, help='students per class')
+    parser.add_argument('--subjects', type=int, default=8)
+    parser.add_argument('--grades', type=int, default=12, help='grades per student, subject and year')
+    parser.add_argument('--years', type=int, default=1)
+    parser.add_argument('--teachers', type=int, default=40)
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--http', action='store_true', help='replay over HTTP as well')
+    parser.add_argument('--target', help='with --http: base URL of a running server instead of the function adapter')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--out', help='write the results to this JSON file')
+    parser.add_argument('--compare', nargs='+', metavar='JSON', help='BASE.json, or BASE.json NEW.json to compare files only')
+    parser.add_argument('--threshold', type=float, default=10.0)
+    parser.add_argument('--strict', action='store_true', help='exit non-zero on marked regressions')
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) > 2:
+        parser.error('--compare takes one or two files')
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[0], encoding='utf-8') as base, open(args.compare[1], encoding='utf-8') as new:
+            regressions = compare(json.load(base), json.load(new), args.threshold)
+        sys.exit(1 if args.strict and regressions else 0)
+
+    config = {k: getattr(args, k) for k in ('classes', 'students', 'subjects', 'grades', 'years', 'teachers',
+                                            'requests', 'seed', 'concurrency')}
+    install_query_counter()
+    setup = connect()
+    reset_schema(setup)
+    ids = seed_school(setup, classes=args.classes, students_per_class=args.students, subjects=args.subjects,
+                      grades_per_subject=args.grades, years=args.years, teachers=args.teachers, seed=args.seed)
+    setup.close()
+
+    keyed, sequence = traffic(handler_events(ids), args.requests, args.seed)
+    handlers = {name: load_handler(name) for name in {name for _, name, _ in keyed}}
+    results = {'label': git_label(), 'created': datetime.now().isoformat(timespec='seconds'), 'config': config}
+
+    results['direct'] = run_direct(handlers, keyed, sequence)
+    for key, kib in allocations(handlers, keyed).items():
+        results['direct'][key]['alloc_kb'] = kib
+    print(f'{results["label"]}: {args.classes} classes of {args.students}, {args.years} year(s) of grades, '
+          f'{len(sequence)} requests')
+    print_results('direct', results['direct'])
+
+    if args.http:
+        base_url = args.target
+        if not base_url:
+            from bench_http_load import serve_functions
+
+            serve_functions(args.port, pool=True)
+            base_url = f'http://127.0.0.1:{args.port}'
+        results['http'] = run_http(base_url, keyed, sequence, args.concurrency)
+        print_results(f'http {base_url}, concurrency {args.concurrency}', results['http'])
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare[0], encoding='utf-8') as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        sys.exit(1 if args.strict and regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+'''
+A teacher's journals across every assigned class: one journal request per
+(class, subject) pair against a single grades call with teacher_id.
+
+"per pair" is what the teacher page did before: it walks teacher_classes and
+asks the grades function for each journal in turn, so queries and latency
+grow with the number of assignments. "teacher" answers all of them from one
+version check and one query, whatever the number of classes.
+
+    BENCH_DATABASE_URL=postgresql://localhost/diary_bench python benchmarks/bench_teacher_journals.py
+'''
+from common import connect, install_query_counter, load_handler, make_event, measure, reset_schema, seed_school
+
+CLASSES = (2, 6, 12)
+REPEAT = 30
+
+
+def main():
+    install_query_counter()
+    grades = load_handler('grades')
+    setup = connect()
+    print(f'{"classes":>8} {"journals":>9} {"variant":>9} {"queries":>8} {"p50 ms":>9} {"p99 ms":>9}')
+    for classes in CLASSES:
+        reset_schema(setup)
+        # one teacher, so every teacher_classes row belongs to them
+        ids = seed_school(setup, classes=classes, students_per_class=30, subjects=2, grades_per_subject=15, teachers=1)
+        teacher_id = ids['teachers'][0]
+        with setup.cursor() as cur:
+            cur.execute('SELECT class_id, subject_id FROM teacher_classes WHERE teacher_id = %s', (teacher_id,))
+            pairs = cur.fetchall()
+
+        def per_pair():
+            for class_id, subject_id in pairs:
+                grades.handler(make_event('GET', {'class_id': class_id, 'subject_id': subject_id}), None)
+
+        teacher = make_event('GET', {'teacher_id': teacher_id})
+        assert grades.handler(teacher, None)['statusCode'] == 200
+
+        for variant, fn in (('per pair', per_pair), ('teacher', lambda: grades.handler(teacher, None))):
+            row = measure(fn, REPEAT)
+            print(f'{classes:>8} {len(pairs):>9} {variant:>9} {row["queries"]:>8.1f} {row["p50_ms"]:>9.2f} {row["p99_ms"]:>9.2f}')
+    setup.close()
+
+
+if __name__ == '__main__':
+    main()
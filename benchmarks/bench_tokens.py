@@ -0,0 +1,103 @@
+'''
+Cost of session-token checks, the part of a request that replaced trusting
+ids from the body.
+
+Tokens are issued by the auth function and verified by the grades function
+with the same code the handlers run, so no database is involved. Two keys
+are configured to cover rotation: tokens signed with the retired key must
+still verify until they expire. Reported per operation in microseconds.
+
+With BENCH_DATABASE_URL set, the per-request identity lookup a token saves
+(user, teacher and student rows by user id) is measured for comparison.
+
+    python benchmarks/bench_tokens.py
+'''
+import importlib.util
+import os
+import time
+
+from common import BACKEND, percentile
+
+REPEAT = 20000
+os.environ['AUTH_TOKEN_KEYS'] = 'current:bench-secret-2,retired:bench-secret-1'
+
+IDENTITY_SQL = '''
+    SELECT u.id, u.role, t.id, s.id, s.class_id
+    FROM users u
+    LEFT JOIN teachers t ON t.user_id = u.id
+    LEFT JOIN students s ON s.user_id = u.id
+    WHERE u.id = %s
+'''
+
+
+def load(name):
+    spec = importlib.util.spec_from_file_location(f'tokens_{name}', BACKEND / name / 'index.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def timed(fn, repeat=REPEAT):
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        fn()
+        samples.append((time.perf_counter_ns() - started) / 1000)
+    return percentile(samples, 50), percentile(samples, 99)
+
+
+def rejects(fn):
+    def call():
+        try:
+            fn()
+        except Exception:
+            return
+        raise AssertionError('token was accepted')
+    return call
+
+
+def main():
+    auth, grades = load('auth'), load('grades')
+    claims = {'user_id': 42, 'role': 'teacher', 'teacher_id': 7, 'student_id': None, 'class_id': None}
+    token = auth.issue_token(claims)
+
+    auth.TOKEN_KEYS = {'retired': b'bench-secret-1'}
+    retired = auth.issue_token(claims)
+    auth.TOKEN_TTL = -1
+    expired = auth.issue_token(claims)
+    auth.TOKEN_KEYS = {'current': b'bench-secret-2', 'retired': b'bench-secret-1'}
+    auth.TOKEN_TTL = 43200
+    forged = token[:-4] + ('AAAA' if not token.endswith('AAAA') else 'BBBB')
+
+    event = {'httpMethod': 'POST', 'headers': {'X-Auth-Token': token}}
+    body = {'student_id': 1, 'subject_id': 1, 'grade': 5, 'grade_date': '2025-10-01', 'teacher_id': 99}
+    cases = [
+        ('issue', lambda: auth.issue_token(claims)),
+        ('verify current key', lambda: grades.verify_token(token)),
+        ('verify retired key', lambda: grades.verify_token(retired)),
+        ('reject forged', rejects(lambda: grades.verify_token(forged))),
+        ('reject expired', rejects(lambda: grades.verify_token(expired))),
+        ('header + authorize', lambda: grades.authorize('POST', {}, body, grades.request_identity(event))),
+    ]
+
+    print(f'token: {len(token)} bytes')
+    print(f'{"operation":>20} {"p50 us":>9} {"p99 us":>9}')
+    for label, fn in cases:
+        p50, p99 = timed(fn)
+        print(f'{label:>20} {p50:>9.2f} {p99:>9.2f}')
+
+    if os.environ.get('BENCH_DATABASE_URL'):
+        from common import connect, reset_schema, seed_school
+
+        conn = connect()
+        reset_schema(conn)
+        seed_school(conn, classes=4, students_per_class=30, subjects=2, grades_per_subject=1)
+        cur = conn.cursor()
+        p50, p99 = timed(lambda: (cur.execute(IDENTITY_SQL, (1,)), cur.fetchone()), 2000)
+        print(f'{"db identity lookup":>20} {p50:>9.2f} {p99:>9.2f}')
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+'''
+Shared helpers for the backend benchmarks.
+
+Every benchmark works against a scratch Postgres database given in
+BENCH_DATABASE_URL. The public schema of that database is dropped and
+rebuilt from db_migrations/ on every run, so never point it at real data.
+'''
+import importlib.util
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+BACKEND = ROOT / 'backend'
+MIGRATIONS = ROOT / 'db_migrations'
+
+QUERY_COUNT = {'n': 0}
+QUERY_LOG: Dict[str, Any] = {'enabled': False, 'statements': []}
+
+
+def bench_dsn() -> str:
+    dsn = os.environ.get('BENCH_DATABASE_URL')
+    if not dsn:
+        sys.exit('BENCH_DATABASE_URL must point at a scratch Postgres database (its public schema is wiped)')
+    return dsn
+
+
+def install_query_counter() -> None:
+    '''
+    Make every psycopg2 connection opened from now on count executed
+    statements in QUERY_COUNT, and record their text in QUERY_LOG while
+    it is enabled. Call before the first handler connects.
+    '''
+    import psycopg2
+    import psycopg2.extensions
+
+    if getattr(psycopg2.connect, 'counting', False):
+        return
+
+    class CountingCursor(psycopg2.extensions.cursor):
+        def execute(self, query, vars=None):
+            QUERY_COUNT['n'] += 1
+            if QUERY_LOG['enabled']:
+                QUERY_LOG['statements'].append(self.mogrify(query, vars).decode())
+            return super().execute(query, vars)
+
+    original_connect = psycopg2.connect
+
+    def counting_connect(*args, **kwargs):
+        kwargs.setdefault('cursor_factory', CountingCursor)
+        return original_connect(*args, **kwargs)
+
+    counting_connect.counting = True
+    psycopg2.connect = counting_connect
+
+
+def connect():
+    import psycopg2
+    return psycopg2.connect(bench_dsn())
+
+
+def reset_schema(conn, before: Optional[str] = None) -> None:
+    '''
+    Drop everything in the public schema and apply db_migrations/ in order;
+    with `before` (e.g. 'V0009') only the migrations that sort before it.
+    '''
+    with conn.cursor() as cur:
+        cur.execute('DROP SCHEMA public CASCADE; CREATE SCHEMA public')
+        for path in sorted(MIGRATIONS.glob('V*.sql')):
+            if before and path.name >= before:
+                break
+            cur.execute(path.read_text(encoding='utf-8'))
+    conn.commit()
+
+
+def load_handler(name: str):
+    '''Import backend/<name>/index.py as a standalone module, the way the function runtime does.'''
+    os.environ['DATABASE_URL'] = bench_dsn()
+    spec = importlib.util.spec_from_file_location(f'backend_{name}_index', BACKEND / name / 'index.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_event(method: str = 'GET', params: Optional[Dict[str, Any]] = None,
+               body: Optional[Any] = None, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    import json
+    return {
+        'httpMethod': method,
+        'queryStringParameters': {k: str(v) for k, v in (params or {}).items()},
+        'headers': headers or {},
+        'body': json.dumps(body) if body is not None else '',
+        'isBase64Encoded': False,
+    }
+
+
+def handler_events(ids: Dict[str, List[int]]) -> List[Tuple[str, str, Dict[str, Any]]]:
+    '''Representative (handler, label, event) requests against a school created by seed_school.'''
+    class_id, subject_id = ids['classes'][0], ids['subjects'][0]
+    student_id, teacher_id = ids['students'][0], ids['teachers'][0]
+    return [
+        ('auth', 'login teacher', make_event('POST', body={'login': 'teacher0', 'password': 'pass'})),
+        ('auth', 'login student', make_event('POST', body={'login': 'student0_0', 'password': 'pass'})),
+        ('grades', 'journal', make_event('GET', {'class_id': class_id, 'subject_id': subject_id})),
+        ('grades', 'teacher journals', make_event('GET', {'teacher_id': teacher_id})),
+        ('grades', 'add grade', make_event('POST', body={
+            'student_id': student_id, 'subject_id': subject_id, 'teacher_id': teacher_id,
+            'grade': 5, 'grade_date': date.today().isoformat(), 'comment': ''})),
+        ('homework', 'class homework', make_event('GET', {'class_id': class_id})),
+        ('homework', 'all homework', make_event('GET')),
+        ('diary', 'student week', make_event('GET', {'student_id': student_id})),
+        ('export', 'class journal', make_event('GET', {'class_id': class_id})),
+        ('admin', 'classes', make_event('GET', {'entity': 'classes'})),
+        ('admin', 'subjects', make_event('GET', {'entity': 'subjects'})),
+        ('admin', 'teachers', make_event('GET', {'entity': 'teachers'})),
+        ('admin', 'students', make_event('GET', {'entity': 'students'})),
+        ('admin', 'teacher subjects', make_event('GET', {'entity': 'teacher_subjects', 'teacher_id': teacher_id})),
+        ('admin', 'class schedule', make_event('GET', {'entity': 'schedule', 'class_id': class_id})),
+        ('admin', 'class homework', make_event('GET', {'entity': 'homework', 'class_id': class_id})),
+        ('admin', 'class stats', make_event('GET', {'entity': 'stats', 'class_id': class_id})),
+        ('admin', 'school stats', make_event('GET', {'entity': 'stats'})),
+        ('admin', 'stats check', make_event('GET', {'entity': 'stats_check'})),
+        ('profile', 'avatar', make_event('POST', body={'user_id': 1, 'avatar_color': '#10B981'})),
+    ]
+
+
+def seed_school(conn, classes: int = 1, students_per_class: int = 30, subjects: int = 5,
+                grades_per_subject: int = 10, years: int = 1, teachers: int = 10,
+                seed: int = 42) -> Dict[str, List[int]]:
+    '''
+    Fill the schema with a synthetic school. Grades are spread over the
+    last `years` academic years; `grades_per_subject` is per student, subject and year.
+    '''
+    from psycopg2.extras import execute_values
+
+    rnd = random.Random(seed)
+    today = date.today()
+    first_day = date(today.year - years + (1 if today.month >= 9 else 0), 9, 1)
+    span_days = max((today - first_day).days, 1)
+
+    with conn.cursor() as cur:
+        # grades and homework are partitioned by academic year from V0009 on
+        cur.execute("SELECT to_regproc('academic_year_partition') IS NOT NULL")
+        if cur.fetchone()[0]:
+            cur.execute(
+                "SELECT academic_year_partition(parent, start_year)"
+                " FROM unnest(ARRAY['grades', 'homework']) parent, generate_series(%s, %s) start_year",
+                (first_day.year, first_day.year + years - 1))
+
+        subject_ids = [r[0] for r in execute_values(
+            cur, 'INSERT INTO subjects (name) VALUES %s RETURNING id',
+            [(f'Subject {i}',) for i in range(subjects)], fetch=True)]
+        class_ids = [r[0] for r in execute_values(
+            cur, 'INSERT INTO classes (name, year) VALUES %s RETURNING id',
+            [(f'{5 + i % 7}{chr(0x410 + i // 7 % 32)}', today.year) for i in range(classes)], fetch=True)]
+
+        teacher_users = [r[0] for r in execute_values(
+            cur, 'INSERT INTO users (login, password, role, full_name) VALUES %s RETURNING id',
+            [(f'teacher{i}', 'pass', 'teacher', f'Teacher {i:05d}') for i in range(teachers)],
+            page_size=5000, fetch=True)]
+        teacher_ids = [r[0] for r in execute_values(
+            cur, 'INSERT INTO teachers (user_id) VALUES %s RETURNING id',
+            [(u,) for u in teacher_users], page_size=5000, fetch=True)]
+
+        student_rows = [
+            (f'student{c}_{i}', 'pass', 'student', f'Student {rnd.randrange(10 ** 6):06d}')
+            for c in range(classes) for i in range(students_per_class)
+        ]
+        student_users = [r[0] for r in execute_values(
+            cur, 'INSERT INTO users (login, password, role, full_name) VALUES %s RETURNING id',
+            student_rows, page_size=5000, fetch=True)]
+        student_ids = [r[0] for r in execute_values(
+            cur, 'INSERT INTO students (user_id, class_id) VALUES %s RETURNING id',
+            [(u, class_ids[n // students_per_class]) for n, u in enumerate(student_users)],
+            page_size=5000, fetch=True)]
+
+        grades = (
+            (s, subj, rnd.choice(teacher_ids), rnd.randint(2, 5),
+             first_day + timedelta(days=rnd.randrange(span_days)), '')
+            for s in student_ids for subj in subject_ids for _ in range(grades_per_subject * years)
+        )
+        execute_values(
+            cur, 'INSERT INTO grades (student_id, subject_id, teacher_id, grade, grade_date, comment) VALUES %s',
+            grades, page_size=10000)
+
+        homework = (
+            (c, subj, rnd.choice(teacher_ids), f'Exercise {n}', first_day + timedelta(days=rnd.randrange(span_days)))
+            for c in class_ids for subj in subject_ids for n in range(20 * years)
+        )
+        execute_values(
+            cur, 'INSERT INTO homework (class_id, subject_id, teacher_id, description, due_date) VALUES %s',
+            homework, page_size=10000)
+
+        schedule = [
+            (c, subject_ids[(day + lesson) % len(subject_ids)], rnd.choice(teacher_ids), day, lesson)
+            for c in class_ids for day in range(1, 6) for lesson in range(1, 7)
+        ]
+        execute_values(
+            cur, 'INSERT INTO schedule (class_id, subject_id, teacher_id, day_of_week, lesson_number) VALUES %s',
+            schedule, page_size=10000)
+
+        execute_values(
+            cur, 'INSERT INTO teacher_classes (teacher_id, class_id, subject_id) VALUES %s ON CONFLICT DO NOTHING',
+            [(teacher_ids[(c + s) % len(teacher_ids)], c, s) for c in class_ids for s in subject_ids],
+            page_size=10000)
+
+        cur.execute('ANALYZE')
+    conn.commit()
+    return {'classes': class_ids, 'subjects': subject_ids, 'teachers': teacher_ids, 'students': student_ids}
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    '''Run fn `repeat` times and return latency percentiles (ms) and statements per call.'''
+    samples = []
+    start_queries = QUERY_COUNT['n']
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        'p50_ms': percentile(samples, 50),
+        'p99_ms': percentile(samples, 99),
+        'queries': (QUERY_COUNT['n'] - start_queries) / repeat,
+    }
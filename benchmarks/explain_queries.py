@@ -0,0 +1,85 @@
+'''
+EXPLAIN ANALYZE report for every statement the handlers issue.
+
+Seeds a large school, replays common.handler_events() through the real
+handlers while recording the SQL they send, then explains each distinct
+statement inside a rolled-back transaction. A sequential scan over one of
+the WATCHED tables is reported as a regression; with --strict the script
+exits non-zero so it can guard CI.
+
+    BENCH_DATABASE_URL=postgresql://localhost/diary_bench python benchmarks/explain_queries.py [--strict]
+'''
+import re
+import sys
+
+from common import QUERY_LOG, connect, handler_events, install_query_counter, load_handler, reset_schema, seed_school
+
+WATCHED = ('grades', 'students', 'homework', 'schedule', 'users', 'teachers', 'class_subject_stats')
+# A partition (grades_2025) counts as its parent table.
+SEQ_SCAN = re.compile(r'Seq Scan on (\w+?)(?:_\d{4})?\b')
+# Full listings read the whole table by design.
+EXPECTED_SCANS = {
+    'admin: teachers': {'teachers', 'users'},
+    'admin: students': {'students', 'users'},
+    'admin: school stats': {'students', 'teachers'},
+    'admin: stats check': {'grades', 'students', 'class_subject_stats'},
+}
+
+
+def main():
+    strict = '--strict' in sys.argv
+    install_query_counter()
+
+    setup = connect()
+    reset_schema(setup)
+    ids = seed_school(setup, classes=60, students_per_class=30, subjects=10, grades_per_subject=12,
+                      years=3, teachers=120)
+
+    handlers = {}
+    captured = []
+    for name, label, event in handler_events(ids):
+        if name not in handlers:
+            handlers[name] = load_handler(name)
+        QUERY_LOG['statements'] = []
+        QUERY_LOG['enabled'] = True
+        handlers[name].handler(event, None)
+        QUERY_LOG['enabled'] = False
+        for statement in QUERY_LOG['statements']:
+            if statement.strip() != 'SELECT 1':
+                captured.append((f'{name}: {label}', statement))
+
+    regressions = []
+    seen = set()
+    cur = setup.cursor()
+    for label, statement in captured:
+        if statement in seen:
+            continue
+        seen.add(statement)
+        if statement.startswith('PREPARE '):
+            # Prepared statements outlive the rollback below; their EXECUTE is explained instead.
+            cur.execute(statement)
+            continue
+        cur.execute('EXPLAIN (ANALYZE, BUFFERS) ' + statement)
+        plan = '\n'.join(r[0] for r in cur.fetchall())
+        setup.rollback()
+
+        print('=' * 100)
+        print(label)
+        print(' '.join(statement.split()))
+        print('-' * 100)
+        print(plan)
+        scans = sorted({t for t in SEQ_SCAN.findall(plan) if t in WATCHED} - EXPECTED_SCANS.get(label, set()))
+        if scans:
+            regressions.append((label, scans))
+
+    print('=' * 100)
+    for label, scans in regressions:
+        print(f'SEQ SCAN  {label}: {", ".join(scans)}')
+    print(f'{len(seen)} statements explained, {len(regressions)} with sequential scans on watched tables')
+    setup.close()
+    if strict and regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
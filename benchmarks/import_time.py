@@ -0,0 +1,94 @@
+'''
+Cold-start cost of every cloud function: module import time measured with
+`python -X importtime` in a fresh interpreter, plus a check that an OPTIONS
+preflight and a 405 are answered without loading the database driver.
+
+Each function is imported RUNS times and the median cumulative time of its
+`index` module is compared against the budget; the heaviest imports it
+pulls in are listed to show where the time goes. Exits non-zero when a
+function is over budget or loads psycopg2 on the no-database paths.
+
+    python benchmarks/import_time.py [--budget-ms 40] [--runs 7]
+'''
+import json
+import statistics
+import subprocess
+import sys
+
+from common import BACKEND
+
+RUNS = 7
+BUDGET_MS = 40.0
+TOP = 5
+
+PROBE = '''
+import sys
+sys.path.insert(0, sys.argv[1])
+import index
+import json
+for method in ('OPTIONS', 'PATCH'):
+    index.handler({'httpMethod': method, 'queryStringParameters': {}, 'headers': {}, 'body': ''}, None)
+print(json.dumps({'driver_loaded': 'psycopg2' in sys.modules}))
+'''
+
+
+def parse_importtime(stderr):
+    '''Rows of (module, self_us, cumulative_us, depth) from -X importtime output.'''
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def probe(function_dir):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE, str(function_dir)],
+        capture_output=True, text=True, check=True
+    )
+    rows = parse_importtime(result.stderr)
+    total = next(cumulative for name, _, cumulative, _ in rows if name == 'index')
+    return total, rows, json.loads(result.stdout.strip().splitlines()[-1])['driver_loaded']
+
+
+def main():
+    budget = float(sys.argv[sys.argv.index('--budget-ms') + 1]) if '--budget-ms' in sys.argv else BUDGET_MS
+    runs = int(sys.argv[sys.argv.index('--runs') + 1]) if '--runs' in sys.argv else RUNS
+
+    failures = []
+    print(f'{"function":>10} {"import ms":>10} {"budget":>7} {"driver":>7}  heaviest imports')
+    for function_dir in sorted(p.parent for p in BACKEND.glob('*/index.py')):
+        name = function_dir.name
+        samples = []
+        for _ in range(runs):
+            total, rows, driver_loaded = probe(function_dir)
+            samples.append(total)
+        median_ms = statistics.median(samples) / 1000
+
+        # -X importtime prints a module after everything it imported.
+        end = next(n for n, row in enumerate(rows) if row[0] == 'index')
+        start = end
+        while start > 0 and rows[start - 1][3] > rows[end][3]:
+            start -= 1
+        children = [(module, cumulative) for module, _, cumulative, depth in rows[start:end] if depth == rows[end][3] + 1]
+        heaviest = ', '.join(f'{module} {cumulative / 1000:.1f}' for module, cumulative in
+                             sorted(children, key=lambda r: -r[1])[:TOP])
+
+        verdict = 'ok' if median_ms <= budget else 'OVER'
+        print(f'{name:>10} {median_ms:>10.2f} {verdict:>7} {"loaded" if driver_loaded else "no":>7}  {heaviest}')
+        if median_ms > budget:
+            failures.append(f'{name}: {median_ms:.2f} ms import time exceeds the {budget:.0f} ms budget')
+        if driver_loaded:
+            failures.append(f'{name}: psycopg2 is imported before the first database request')
+
+    for failure in failures:
+        print(failure)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
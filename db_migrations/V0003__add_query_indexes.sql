@@ -0,0 +1,20 @@
+-- Journal: grades of one student in one subject ordered by date.
+-- comment is left out of INCLUDE because long comments would exceed the b-tree row size limit.
+CREATE INDEX IF NOT EXISTS idx_grades_student_subject_date
+    ON grades (student_id, subject_id, grade_date) INCLUDE (id, grade);
+
+-- Class roster for the journal and the per-class stats.
+CREATE INDEX IF NOT EXISTS idx_students_class_id ON students (class_id) INCLUDE (user_id);
+
+-- Role lookups right after login.
+CREATE INDEX IF NOT EXISTS idx_students_user_id ON students (user_id) INCLUDE (class_id);
+CREATE INDEX IF NOT EXISTS idx_teachers_user_id ON teachers (user_id);
+
+-- Homework of a class, newest due date first.
+CREATE INDEX IF NOT EXISTS idx_homework_class_due_date ON homework (class_id, due_date DESC, id DESC);
+
+-- Weekly timetable of a class.
+CREATE INDEX IF NOT EXISTS idx_schedule_class_day_lesson ON schedule (class_id, day_of_week, lesson_number);
+
+-- users(login), teacher_subjects(teacher_id) and teacher_classes(teacher_id) are already
+-- served by the indexes behind their UNIQUE constraints.
@@ -0,0 +1,5 @@
+-- Keyset pagination of the school-wide homework listing, newest due date first.
+CREATE INDEX IF NOT EXISTS idx_homework_due_date_id ON homework (due_date DESC, id DESC);
+
+-- Same listing filtered by subject.
+CREATE INDEX IF NOT EXISTS idx_homework_subject_due_date ON homework (subject_id, due_date DESC, id DESC);
@@ -0,0 +1,18 @@
+-- Running grade totals per class and subject, kept up to date by the grades
+-- and admin functions so the admin dashboard never has to scan grades.
+CREATE TABLE class_subject_stats (
+    class_id INTEGER NOT NULL REFERENCES classes(id),
+    subject_id INTEGER NOT NULL REFERENCES subjects(id),
+    grade_count INTEGER NOT NULL DEFAULT 0,
+    graded_count INTEGER NOT NULL DEFAULT 0,
+    grade_sum BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (class_id, subject_id)
+);
+
+INSERT INTO class_subject_stats (class_id, subject_id, grade_count, graded_count, grade_sum)
+SELECT s.class_id, g.subject_id, COUNT(*), COUNT(g.grade), COALESCE(SUM(g.grade), 0)
+FROM grades g
+JOIN students s ON s.id = g.student_id
+WHERE s.class_id IS NOT NULL AND g.subject_id IS NOT NULL
+GROUP BY s.class_id, g.subject_id;
@@ -0,0 +1,45 @@
+-- Per-table change counters used as cheap ETag sources by the read endpoints.
+-- A statement-level trigger bumps the counter of every table a statement writes,
+-- in the writer's transaction, so a reader never sees new data with an old version.
+CREATE TABLE table_versions (
+    table_name VARCHAR(63) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO table_versions (table_name) VALUES
+    ('users'), ('classes'), ('subjects'), ('students'), ('teachers'),
+    ('teacher_classes'), ('teacher_subjects'), ('grades'), ('schedule'),
+    ('homework'), ('class_subject_stats');
+
+CREATE FUNCTION bump_table_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE table_versions
+    SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE table_name = TG_TABLE_NAME;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER users_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON users
+    FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version();
+CREATE TRIGGER classes_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON classes
+    FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version();
+CREATE TRIGGER subjects_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON subjects
+    FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version();
+CREATE TRIGGER students_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON students
+    FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version();
+CREATE TRIGGER teachers_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON teachers
+    FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version();
+CREATE TRIGGER teacher_classes_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON teacher_classes
+    FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version();
+CREATE TRIGGER teacher_subjects_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON teacher_subjects
+    FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version();
+CREATE TRIGGER grades_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON grades
+    FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version();
+CREATE TRIGGER schedule_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON schedule
+    FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version();
+CREATE TRIGGER homework_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON homework
+    FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version();
+CREATE TRIGGER class_subject_stats_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON class_subject_stats
+    FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version();
@@ -0,0 +1,5 @@
+-- Diary week view: all grades of one student within a date range, across subjects.
+-- idx_grades_student_subject_date leads with subject_id after student_id, so a
+-- date range over every subject would have to probe each subject separately.
+CREATE INDEX IF NOT EXISTS idx_grades_student_date
+    ON grades (student_id, grade_date) INCLUDE (id, subject_id, grade);
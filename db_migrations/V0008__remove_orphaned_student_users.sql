@@ -0,0 +1,7 @@
+-- Class deletion used to remove the students rows of a class but keep their
+-- users, which could still log in with no student behind them. The admin
+-- function now deletes them together; this removes the ones left behind.
+DELETE FROM users u
+WHERE u.role = 'student'
+  AND NOT EXISTS (SELECT 1 FROM students s WHERE s.user_id = u.id)
+  AND NOT EXISTS (SELECT 1 FROM teachers t WHERE t.user_id = u.id);
@@ -0,0 +1,157 @@
+-- Grades and homework range-partitioned by academic year (1 September to
+-- 31 August), one partition per year: grades_2025 holds grade dates from
+-- 2025-09-01 up to 2026-09-01. Journals of the current year only touch the
+-- current partition and its indexes, and past years can be detached and
+-- archived without a long DELETE.
+--
+-- There is no default partition: a row dated outside every partition is
+-- rejected, and academic_year_rollover() keeps next year's partition ready.
+-- Partition keys must be part of the primary key, so ids are unique per
+-- year; they still come from the one shared sequence.
+
+CREATE FUNCTION academic_year(day DATE) RETURNS INTEGER AS $$
+    SELECT CASE WHEN EXTRACT(MONTH FROM day) >= 9
+                THEN EXTRACT(YEAR FROM day)
+                ELSE EXTRACT(YEAR FROM day) - 1
+           END::INTEGER
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Creates <parent>_<start_year> unless a table of that name exists, attached
+-- or detached; returns its name when it was created, NULL otherwise.
+CREATE FUNCTION academic_year_partition(parent TEXT, start_year INTEGER) RETURNS TEXT AS $$
+DECLARE
+    partition_name TEXT := parent || '_' || start_year;
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN NULL;
+    END IF;
+    EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                   partition_name, parent, make_date(start_year, 9, 1), make_date(start_year + 1, 9, 1));
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Yearly rollover: partitions for new_year and the year after it, then
+-- partitions older than the last keep_years years are detached. Detached
+-- partitions stay as plain tables (grades_2019, ...) for archiving or DROP;
+-- their copies of the foreign keys are dropped, otherwise archived rows
+-- would block deleting the students and classes they mention.
+-- DETACH does not fire the version triggers, so the ETag counters of the
+-- parents are bumped here; class_subject_stats still counts the detached
+-- rows until it is rebuilt, which the admin rollover route does.
+CREATE FUNCTION academic_year_rollover(new_year INTEGER, keep_years INTEGER DEFAULT 2)
+RETURNS TABLE (action TEXT, partition_name TEXT) AS $$
+DECLARE
+    parent TEXT;
+    start_year INTEGER;
+    detached RECORD;
+    fk RECORD;
+BEGIN
+    FOREACH parent IN ARRAY ARRAY['grades', 'homework'] LOOP
+        FOR start_year IN new_year .. new_year + 1 LOOP
+            partition_name := academic_year_partition(parent, start_year);
+            IF partition_name IS NOT NULL THEN
+                action := 'created';
+                RETURN NEXT;
+            END IF;
+        END LOOP;
+        FOR detached IN
+            SELECT c.oid, c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = parent::regclass
+              AND substring(c.relname FROM '_([0-9]{4})$')::INTEGER <= new_year - keep_years
+            ORDER BY c.relname
+        LOOP
+            EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', parent, detached.relname);
+            FOR fk IN SELECT conname FROM pg_constraint WHERE conrelid = detached.oid AND contype = 'f' LOOP
+                EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', detached.relname, fk.conname);
+            END LOOP;
+            action := 'detached';
+            partition_name := detached.relname;
+            RETURN NEXT;
+        END LOOP;
+    END LOOP;
+    UPDATE table_versions
+    SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE table_name IN ('grades', 'homework');
+END;
+$$ LANGUAGE plpgsql;
+
+-- Existing tables are moved aside, their rows copied into the partitioned
+-- tables and the old tables dropped. Their indexes and primary keys go first
+-- so the names are free for the new tables.
+ALTER TABLE grades RENAME TO grades_unpartitioned;
+DROP TRIGGER grades_version ON grades_unpartitioned;
+DROP INDEX idx_grades_student_subject_date;
+DROP INDEX idx_grades_student_date;
+ALTER TABLE grades_unpartitioned DROP CONSTRAINT grades_pkey;
+ALTER SEQUENCE grades_id_seq OWNED BY NONE;
+
+ALTER TABLE homework RENAME TO homework_unpartitioned;
+DROP TRIGGER homework_version ON homework_unpartitioned;
+DROP INDEX idx_homework_class_due_date;
+DROP INDEX idx_homework_due_date_id;
+DROP INDEX idx_homework_subject_due_date;
+ALTER TABLE homework_unpartitioned DROP CONSTRAINT homework_pkey;
+ALTER SEQUENCE homework_id_seq OWNED BY NONE;
+
+CREATE TABLE grades (
+    id INTEGER NOT NULL DEFAULT nextval('grades_id_seq'),
+    student_id INTEGER REFERENCES students(id),
+    subject_id INTEGER REFERENCES subjects(id),
+    teacher_id INTEGER REFERENCES teachers(id),
+    grade INTEGER CHECK (grade >= 1 AND grade <= 5),
+    grade_date DATE NOT NULL,
+    comment TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, grade_date)
+) PARTITION BY RANGE (grade_date);
+
+CREATE TABLE homework (
+    id INTEGER NOT NULL DEFAULT nextval('homework_id_seq'),
+    class_id INTEGER REFERENCES classes(id),
+    subject_id INTEGER REFERENCES subjects(id),
+    teacher_id INTEGER REFERENCES teachers(id),
+    description TEXT NOT NULL,
+    due_date DATE NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, due_date)
+) PARTITION BY RANGE (due_date);
+
+ALTER SEQUENCE grades_id_seq OWNED BY grades.id;
+ALTER SEQUENCE homework_id_seq OWNED BY homework.id;
+
+-- One partition for every year that has data, plus the current and the next one.
+SELECT academic_year_partition(parent, start_year)
+FROM unnest(ARRAY['grades', 'homework']) parent,
+     (
+         SELECT academic_year(grade_date) AS start_year FROM grades_unpartitioned
+         UNION SELECT academic_year(due_date) FROM homework_unpartitioned
+         UNION SELECT academic_year(CURRENT_DATE)
+         UNION SELECT academic_year(CURRENT_DATE) + 1
+     ) years;
+
+INSERT INTO grades (id, student_id, subject_id, teacher_id, grade, grade_date, comment, created_at)
+SELECT id, student_id, subject_id, teacher_id, grade, grade_date, comment, created_at FROM grades_unpartitioned;
+
+INSERT INTO homework (id, class_id, subject_id, teacher_id, description, due_date, created_at)
+SELECT id, class_id, subject_id, teacher_id, description, due_date, created_at FROM homework_unpartitioned;
+
+DROP TABLE grades_unpartitioned;
+DROP TABLE homework_unpartitioned;
+
+-- Indexes on the parents are created on every partition, present and future.
+CREATE INDEX idx_grades_student_subject_date
+    ON grades (student_id, subject_id, grade_date) INCLUDE (id, grade);
+CREATE INDEX idx_grades_student_date
+    ON grades (student_id, grade_date) INCLUDE (id, subject_id, grade);
+
+CREATE INDEX idx_homework_class_due_date ON homework (class_id, due_date DESC, id DESC);
+CREATE INDEX idx_homework_due_date_id ON homework (due_date DESC, id DESC);
+CREATE INDEX idx_homework_subject_due_date ON homework (subject_id, due_date DESC, id DESC);
+
+CREATE TRIGGER grades_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON grades
+    FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version();
+CREATE TRIGGER homework_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON homework
+    FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version();
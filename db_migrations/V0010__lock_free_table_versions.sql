@@ -0,0 +1,100 @@
+-- table_versions without a row lock: the V0006 trigger updated one row per
+-- table, which stayed locked until the writing transaction committed, so all
+-- writers of a table (a morning of grade entry, a batch import) queued behind
+-- each other school-wide.
+--
+-- Writers now only INSERT into table_changes, which never blocks another
+-- writer. table_versions becomes a view summing the changes of each table:
+-- every committed write adds to the sum, so a reader's version is new as soon
+-- as it can see new data, whatever order the writers commit in. The readers'
+-- query (table_name, version FROM table_versions) does not change.
+--
+-- Every 64th change folds the rows of its table into one row with the same
+-- sum. It takes only rows nobody else holds (SKIP LOCKED), so it never
+-- waits, and the sum a reader sees is the same before and after.
+
+CREATE TABLE table_changes (
+    id BIGSERIAL PRIMARY KEY,
+    table_name VARCHAR(63) NOT NULL,
+    changes BIGINT NOT NULL DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_table_changes_table_name ON table_changes (table_name) INCLUDE (changes);
+
+INSERT INTO table_changes (table_name, changes)
+SELECT table_name, version FROM table_versions;
+
+DROP TABLE table_versions;
+
+CREATE VIEW table_versions AS
+    SELECT table_name, SUM(changes)::BIGINT AS version, MAX(created_at) AS updated_at
+    FROM table_changes
+    GROUP BY table_name;
+
+CREATE FUNCTION record_table_change(changed_table TEXT) RETURNS void AS $$
+DECLARE
+    change_id BIGINT;
+BEGIN
+    INSERT INTO table_changes (table_name) VALUES (changed_table) RETURNING id INTO change_id;
+    IF change_id % 64 = 0 THEN
+        WITH folded AS (
+            DELETE FROM table_changes
+            WHERE id IN (
+                SELECT id FROM table_changes
+                WHERE table_name = changed_table AND id <> change_id
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING changes
+        )
+        INSERT INTO table_changes (table_name, changes)
+        SELECT changed_table, SUM(changes) FROM folded HAVING COUNT(*) > 0;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- The triggers of V0006 and V0009 call this function by name, so they keep working.
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+BEGIN
+    PERFORM record_table_change(TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Same as in V0009 except for the version bump at the end, which no longer
+-- updates table_versions (now a view).
+CREATE OR REPLACE FUNCTION academic_year_rollover(new_year INTEGER, keep_years INTEGER DEFAULT 2)
+RETURNS TABLE (action TEXT, partition_name TEXT) AS $$
+DECLARE
+    parent TEXT;
+    start_year INTEGER;
+    detached RECORD;
+    fk RECORD;
+BEGIN
+    FOREACH parent IN ARRAY ARRAY['grades', 'homework'] LOOP
+        FOR start_year IN new_year .. new_year + 1 LOOP
+            partition_name := academic_year_partition(parent, start_year);
+            IF partition_name IS NOT NULL THEN
+                action := 'created';
+                RETURN NEXT;
+            END IF;
+        END LOOP;
+        FOR detached IN
+            SELECT c.oid, c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = parent::regclass
+              AND substring(c.relname FROM '_([0-9]{4})$')::INTEGER <= new_year - keep_years
+            ORDER BY c.relname
+        LOOP
+            EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', parent, detached.relname);
+            FOR fk IN SELECT conname FROM pg_constraint WHERE conrelid = detached.oid AND contype = 'f' LOOP
+                EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', detached.relname, fk.conname);
+            END LOOP;
+            action := 'detached';
+            partition_name := detached.relname;
+            RETURN NEXT;
+        END LOOP;
+        PERFORM record_table_change(parent);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,31 @@
+"""
+Сборка недели дневника ученика, общая для mock- и production-режимов
+(та же форма ответа, что у функции backend/diary).
+"""
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+
+def build_week(week_start: date, lessons: List[Dict[str, Any]], homework: List[Dict[str, Any]],
+               grades: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Дни недели с уроками; задание и оценка попадают в первый урок того же предмета в этот день, иначе — в сам день."""
+    days = [{
+        "date": (week_start + timedelta(days=offset)).isoformat(),
+        "day_of_week": offset + 1,
+        "lessons": [],
+        "homework": [],
+        "grades": [],
+    } for offset in range(7)]
+
+    slots = {}
+    for lesson in lessons:
+        entry = dict(lesson, homework=[], grades=[])
+        days[lesson["day_of_week"] - 1]["lessons"].append(entry)
+        slots.setdefault((lesson["day_of_week"], lesson["subject_id"]), entry)
+
+    for key, items, date_field in (("homework", homework, "due_date"), ("grades", grades, "date")):
+        for item in items:
+            day_of_week = (date.fromisoformat(item[date_field]) - week_start).days + 1
+            slot = slots.get((day_of_week, item["subject_id"]))
+            (slot or days[day_of_week - 1])[key].append(item)
+    return days
@@ -0,0 +1,179 @@
+"""
+Выгрузка журнала и итогов четверти в CSV/XLSX, общая для функции backend/export
+и production-режима сервера (тот же SQL, те же колонки, тот же файл).
+
+ExportFile пишется построчно и отдаёт готовые байты кусками через take(),
+поэтому выгрузку всей школы можно стримить клиенту, держа в памяти только
+текущую пачку строк. CSV сжимается gzip на лету, XLSX собирается потоковым
+zip без таблицы общих строк (строки хранятся прямо в ячейках).
+"""
+import csv
+import io
+import re
+import zipfile
+import zlib
+from decimal import Decimal
+from typing import Any, Iterable, List
+from xml.sax.saxutils import escape
+
+EXPORT_COLUMNS = {
+    "journal": ("Класс", "Ученик", "Предмет", "Дата", "Оценка", "Комментарий"),
+    "report": ("Класс", "Ученик", "Предмет", "Оценок", "Средний балл")
+}
+
+# journal — все оценки в выгрузке по строке на оценку; report — итог за четверть:
+# строка на ученика и предмет с числом оценок и средним баллом.
+# {where} собирается из постоянных условий, значения остаются параметрами
+EXPORT_SQL = {
+    "journal": """
+        SELECT c.name, u.full_name, sub.name, to_char(g.grade_date, 'YYYY-MM-DD'), g.grade, g.comment
+        FROM grades g
+        JOIN students s ON s.id = g.student_id
+        JOIN classes c ON c.id = s.class_id
+        JOIN users u ON u.id = s.user_id
+        JOIN subjects sub ON sub.id = g.subject_id
+        WHERE {where}
+        ORDER BY c.name, c.id, u.full_name, s.id, sub.name, g.grade_date, g.id
+    """,
+    "report": """
+        SELECT c.name, u.full_name, sub.name, COUNT(*), ROUND(AVG(g.grade), 2)
+        FROM grades g
+        JOIN students s ON s.id = g.student_id
+        JOIN classes c ON c.id = s.class_id
+        JOIN users u ON u.id = s.user_id
+        JOIN subjects sub ON sub.id = g.subject_id
+        WHERE {where}
+        GROUP BY c.id, c.name, s.id, u.full_name, sub.id, sub.name
+        ORDER BY c.name, c.id, u.full_name, s.id, sub.name
+    """
+}
+
+# Параллель — число в начале названия класса: 5 у «5А»
+LEVEL_SQL = "substring(c.name FROM '^[0-9]+')"
+
+XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Оценки" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    )
+}
+XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+XLSX_SHEET_END = "</sheetData></worksheet>"
+# Управляющие символы, которые XML 1.0 не допускает даже экранированными; встречаются только в комментариях
+XML_INVALID = re.compile("[\\x00-\\x08\\x0b\\x0c\\x0e-\\x1f]")
+
+
+class ChunkSink:
+    """Файловый объект только на запись: zipfile пишет в него, take() забирает накопленное."""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+
+class XlsxWriter:
+    """Один лист .xlsx, строки дописываются в поток zip по мере поступления."""
+
+    def __init__(self, fileobj: Any):
+        self.zip = zipfile.ZipFile(fileobj, "w", zipfile.ZIP_DEFLATED)
+        for name, xml in XLSX_PARTS.items():
+            self.zip.writestr(name, xml)
+        # Размер листа заранее неизвестен, а в несикаемый поток zipfile пишет zip64 только по явной просьбе
+        self.sheet = self.zip.open("xl/worksheets/sheet1.xml", "w", force_zip64=True)
+        self.sheet.write(XLSX_SHEET_START.encode())
+
+    def writerow(self, values: Iterable[Any]) -> None:
+        cells = []
+        for value in values:
+            if value is None:
+                cells.append("<c/>")
+            elif isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+                cells.append(f"<c><v>{value}</v></c>")
+            else:
+                text = escape(XML_INVALID.sub("", str(value)))
+                cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+        self.sheet.write(f"<row>{''.join(cells)}</row>".encode())
+
+    def writerows(self, rows: Iterable[Iterable[Any]]) -> None:
+        for row in rows:
+            self.writerow(row)
+
+    def close(self) -> None:
+        self.sheet.write(XLSX_SHEET_END.encode())
+        self.sheet.close()
+        self.zip.close()
+
+
+class ExportFile:
+    """Файл выгрузки с заголовком kind; writerows дописывает пачку строк, take() и finish() отдают байты."""
+
+    def __init__(self, kind: str, file_format: str):
+        self.format = file_format
+        if file_format == "csv":
+            # BOM — чтобы Excel открыл кириллицу как UTF-8; wbits=31 — формат gzip
+            self._text = io.StringIO("\ufeff")
+            self._text.seek(0, io.SEEK_END)
+            self._writer = csv.writer(self._text)
+            self._gzip = zlib.compressobj(wbits=31)
+        else:
+            self._sink = ChunkSink()
+            self._writer = XlsxWriter(self._sink)
+        self._writer.writerow(EXPORT_COLUMNS[kind])
+
+    def writerows(self, rows: Iterable[Iterable[Any]]) -> None:
+        self._writer.writerows(rows)
+
+    def take(self) -> bytes:
+        if self.format == "xlsx":
+            return self._sink.take()
+        data = self._text.getvalue()
+        self._text.seek(0)
+        self._text.truncate()
+        return self._gzip.compress(data.encode())
+
+    def finish(self) -> bytes:
+        if self.format == "xlsx":
+            self._writer.close()
+            return self._sink.take()
+        return self.take() + self._gzip.flush()
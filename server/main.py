@@ -1,10 +1,21 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import APIRouter, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from datetime import date, timedelta
 from typing import Optional, List
+import logging
+import os
 import uvicorn
 
+import passwords
+from diary import build_week
+from persistence import Persistence
+from sqlite_store import SqliteStore
+from store import Store
+
 app = FastAPI()
+# Маршруты на mock-данных; при заданном DATABASE_URL вместо них подключается pg_routes
+mock = APIRouter()
 
 app.add_middleware(
     CORSMiddleware,
@@ -12,10 +23,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Content-Disposition"],
 )
 
 # Mock база данных
-db = {
+SEED = {
     "users": [
         {"id": 1, "login": "22", "password": "22", "role": "admin", "full_name": "Администратор", "avatar_color": "#FF5733", "avatar_emoji": "🚀"},
         {"id": 2, "login": "teacher1", "password": "123", "role": "teacher", "full_name": "Иванов Иван Иванович", "avatar_color": "#2563EB", "avatar_emoji": "👨‍🏫"},
@@ -42,6 +54,40 @@ db = {
     "schedule": [],
     "homework": [],
 }
+INDEXES = {
+    "users": ("login",),
+    "teachers": ("user_id",),
+    "students": ("login", "class_id"),
+    "schedule": ("class_id",),
+    "homework": ("class_id",),
+    "grades": (("class_id", "subject_id"), "student_id"),
+}
+
+# Несколько воркеров (WORKERS=8 python main.py или uvicorn --workers 8) видят общие данные
+# только через файл SQLite: SQLITE_PATH=./diary.db
+if os.environ.get("SQLITE_PATH"):
+    db = SqliteStore(os.environ["SQLITE_PATH"], SEED, INDEXES)
+else:
+    db = Store(SEED, indexes=INDEXES)
+
+# Необязательное сохранение на диск между перезапусками: PERSIST_DIR=./data python main.py
+persistence = None
+if os.environ.get("PERSIST_DIR") and isinstance(db, Store) and not os.environ.get("DATABASE_URL"):
+    persistence = Persistence(
+        os.environ["PERSIST_DIR"],
+        fsync_interval=float(os.environ.get("PERSIST_FSYNC_INTERVAL", "0.05")),
+        snapshot_every=int(os.environ.get("PERSIST_SNAPSHOT_EVERY", "100000")),
+    )
+    stats = persistence.open(db)
+    logging.getLogger(__name__).info(
+        "Loaded %d rows from snapshot and %d log records in %.3fs",
+        stats["snapshot_rows"], stats["replayed"], stats["seconds"],
+    )
+
+@app.on_event("shutdown")
+async def close_persistence():
+    if persistence:
+        persistence.close()
 
 class LoginRequest(BaseModel):
     login: str
@@ -52,74 +98,165 @@ class ProfileUpdate(BaseModel):
     avatar_color: str
     avatar_emoji: str
 
-@app.post("/auth")
+@mock.post("/auth")
 async def login(request: LoginRequest):
-    user = next((u for u in db["users"] if u["login"] == request.login and u["password"] == request.password), None)
-    if not user:
+    user = db["users"].first("login", request.login)
+    try:
+        stored = await passwords.check_login(user and user["id"], user and user.get("password"), request.password)
+    except passwords.KdfBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if not stored:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if stored != user.get("password"):
+        # Открытый пароль из SEED переписывается в хеш при первом входе
+        user = db["users"].update(user["id"], password=stored)
     
     user_data = user.copy()
     user_data.pop("password", None)
     
     if user["role"] == "teacher":
-        teacher = next((t for t in db["teachers"] if t["user_id"] == user["id"]), None)
+        teacher = db["teachers"].first("user_id", user["id"])
         user_data["teacher_id"] = teacher["id"] if teacher else None
     elif user["role"] == "student":
-        student = next((s for s in db["students"] if s["login"] == user["login"]), None)
+        student = db["students"].first("login", user["login"])
         user_data["student_id"] = student["id"] if student else None
         user_data["class_id"] = student["class_id"] if student else None
     
     return {"success": True, "user": user_data}
 
-@app.post("/profile")
+@mock.post("/profile")
 async def update_profile(request: ProfileUpdate):
-    user = next((u for u in db["users"] if u["id"] == request.user_id), None)
-    if user:
-        user["avatar_color"] = request.avatar_color
-        user["avatar_emoji"] = request.avatar_emoji
+    db["users"].update(request.user_id, avatar_color=request.avatar_color, avatar_emoji=request.avatar_emoji)
     return {"success": True}
 
-@app.get("/admin")
+@mock.get("/admin")
 async def get_admin_data(entity: str, teacher_id: Optional[int] = None, class_id: Optional[int] = None):
     if entity in db:
-        return {"data": db[entity]}
+        return {"data": db[entity].all()}
     return {"data": []}
 
-@app.post("/admin")
+@mock.post("/admin")
 async def create_entity(entity: str, data: dict):
     if entity in db:
-        new_id = max([item["id"] for item in db[entity]], default=0) + 1
-        data["id"] = new_id
-        db[entity].append(data)
+        data.pop("id", None)
+        if "password" in data:
+            data["password"] = await passwords.hash_password(str(data["password"]))
+        new_id = db[entity].insert(data)
         return {"success": True, "id": new_id}
     raise HTTPException(status_code=400, detail="Invalid entity")
 
-@app.delete("/admin")
+@mock.delete("/admin")
 async def delete_entity(entity: str, id: int):
     if entity in db:
-        db[entity] = [item for item in db[entity] if item["id"] != id]
+        db[entity].delete(id)
         return {"success": True}
     raise HTTPException(status_code=400, detail="Invalid entity")
 
-@app.get("/grades")
-async def get_grades(class_id: int, subject_id: int):
-    return {"data": db["grades"]}
+@mock.get("/grades")
+async def get_grades(class_id: int, subject_id: int, year: Optional[int] = None):
+    # Та же форма, что у журнала в backend/grades: ученики класса с оценками и средним за учебный год
+    if year is None:
+        today = date.today()
+        year = today.year if today.month >= 9 else today.year - 1
+    first, last = date(year, 9, 1).isoformat(), date(year + 1, 9, 1).isoformat()
+    by_student = {}
+    for grade in db["grades"].find(("class_id", "subject_id"), (class_id, subject_id)):
+        if first <= str(grade.get("grade_date") or "") < last:
+            by_student.setdefault(grade.get("student_id"), []).append(grade)
+    
+    result = []
+    for student in sorted(db["students"].find("class_id", class_id), key=lambda s: s.get("full_name") or ""):
+        grades = sorted(by_student.get(student["id"], []), key=lambda g: (str(g.get("grade_date") or ""), g["id"]))
+        total = sum(g.get("grade") or 0 for g in grades)
+        result.append({
+            "student_id": student["id"],
+            "student_name": student.get("full_name"),
+            "grades": [{"id": g["id"], "grade": g.get("grade"), "date": g.get("grade_date"), "comment": g.get("comment") or ""} for g in grades],
+            "average": round(total / len(grades), 2) if grades else 0,
+        })
+    return {"data": result, "year": year}
 
-@app.post("/grades")
+@mock.post("/grades")
 async def add_grade(data: dict):
-    new_id = len(db["grades"]) + 1
-    data["id"] = new_id
-    db["grades"].append(data)
+    data.pop("id", None)
+    # Класс ученика сохраняется в оценке, чтобы она попала в индекс (class_id, subject_id)
+    student = db["students"].get(data.get("student_id"))
+    data["class_id"] = student["class_id"] if student else None
+    new_id = db["grades"].insert(data)
     return {"success": True, "id": new_id}
 
-@app.delete("/grades")
+@mock.delete("/grades")
 async def delete_grade(id: int):
-    db["grades"] = [g for g in db["grades"] if g["id"] != id]
+    db["grades"].delete(id)
     return {"success": True}
 
+@mock.get("/diary")
+async def get_week(student_id: int, week: Optional[str] = None):
+    # Неделя ученика в форме backend/diary: расписание класса, задания со сроком на неделе и оценки
+    student = db["students"].get(student_id)
+    if not student:
+        raise HTTPException(status_code=404, detail="Student not found")
+    try:
+        day = date.fromisoformat(week) if week else date.today()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="week must be YYYY-MM-DD")
+    week_start = day - timedelta(days=day.weekday())
+    week_end = week_start + timedelta(days=6)
+    first, last = week_start.isoformat(), week_end.isoformat()
+    
+    lessons = []
+    for slot in sorted(db["schedule"].find("class_id", student.get("class_id")), key=lambda s: (s.get("day_of_week") or 0, s.get("lesson_number") or 0)):
+        subject = db["subjects"].get(slot.get("subject_id")) or {}
+        teacher = db["teachers"].get(slot.get("teacher_id")) or {}
+        lessons.append({
+            "day_of_week": slot.get("day_of_week"),
+            "lesson_number": slot.get("lesson_number"),
+            "subject_id": slot.get("subject_id"),
+            "subject_name": subject.get("name"),
+            "teacher_name": teacher.get("full_name"),
+        })
+    homework = [
+        {"id": h["id"], "subject_id": h.get("subject_id"), "description": h.get("description"), "due_date": h["due_date"]}
+        for h in db["homework"].find("class_id", student.get("class_id")) if first <= str(h.get("due_date") or "") <= last
+    ]
+    grades = [
+        {"id": g["id"], "subject_id": g.get("subject_id"), "grade": g.get("grade"), "date": g["grade_date"], "comment": g.get("comment") or ""}
+        for g in db["grades"].find("student_id", student_id) if first <= str(g.get("grade_date") or "") <= last
+    ]
+    return {
+        "student_id": student_id,
+        "class_id": student.get("class_id"),
+        "week_start": first,
+        "week_end": last,
+        "days": build_week(week_start, lessons, sorted(homework, key=lambda h: (h["due_date"], h["id"])),
+                           sorted(grades, key=lambda g: (g["date"], g["id"]))),
+    }
+
 @app.get("/")
 async def root():
     return {"message": "School Diary API", "status": "running"}
 
+# Production-режим: DATABASE_URL=postgresql://... python main.py
+if os.environ.get("DATABASE_URL"):
+    import asyncpg
+    import pg_routes
+
+    app.include_router(pg_routes.router)
+    app.add_exception_handler(pg_routes.ApiError, pg_routes.api_error_handler)
+    app.add_exception_handler(asyncpg.PostgresError, pg_routes.database_error_handler)
+
+    @app.on_event("startup")
+    async def open_database():
+        await pg_routes.open_pool(os.environ["DATABASE_URL"])
+
+    @app.on_event("shutdown")
+    async def close_database():
+        await pg_routes.close_pool()
+else:
+    app.include_router(mock)
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    workers = int(os.environ.get("WORKERS", "1"))
+    if workers > 1 and not (os.environ.get("SQLITE_PATH") or os.environ.get("DATABASE_URL")):
+        raise SystemExit("WORKERS > 1 needs SQLITE_PATH or DATABASE_URL, otherwise every worker keeps its own data")
+    uvicorn.run("main:app" if workers > 1 else app, host="0.0.0.0", port=8000, workers=workers)
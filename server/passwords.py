@@ -0,0 +1,169 @@
+"""
+Хеширование паролей для mock- и production-режимов сервера, совместимое с backend/auth.
+
+Хеш хранится строкой scrypt$n$r$p$salt$hash (salt и hash — base64url без "="),
+поэтому пароли, заданные через функции, проверяются и здесь, и наоборот.
+Строки, ещё хранящие пароль открытым текстом, сравниваются за постоянное время
+и переписываются в хеш при первом успешном входе.
+
+scrypt намеренно медленный, поэтому он выполняется в отдельном пуле из
+KDF_CONCURRENCY потоков (hashlib отпускает GIL): event loop продолжает обслуживать
+остальные запросы, а пик входов не занимает больше KDF_CONCURRENCY ядер.
+Вход, который не дождался своей очереди за KDF_WAIT секунд, получает 503, как в backend/auth.
+Повторный вход тем же паролем в течение VERIFIED_TTL секунд проверяется по кешу.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional, Tuple
+
+SCRYPT_N = int(os.environ.get("AUTH_SCRYPT_N", "16384"))
+SCRYPT_R = 8
+SCRYPT_P = 1
+KDF_CONCURRENCY = int(os.environ.get("AUTH_KDF_CONCURRENCY", "2"))
+KDF_WAIT = float(os.environ.get("AUTH_KDF_WAIT", "5"))
+VERIFIED_TTL = float(os.environ.get("AUTH_VERIFIED_TTL", "300"))
+VERIFIED_CACHE_SIZE = int(os.environ.get("AUTH_VERIFIED_CACHE_SIZE", "10000"))
+
+_executor = ThreadPoolExecutor(max_workers=KDF_CONCURRENCY, thread_name_prefix="kdf")
+_login_slots = asyncio.Semaphore(KDF_CONCURRENCY)
+_dummy_hash: Optional[str] = None
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int, dklen: int) -> bytes:
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r * p, dklen=dklen)
+
+
+def is_password_hash(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith("scrypt$")
+
+
+def hash_password_sync(password: str) -> str:
+    salt = os.urandom(16)
+    digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P, 32)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+
+
+def verify_password_sync(password: str, stored: Optional[str]) -> bool:
+    if not is_password_hash(stored):
+        return hmac.compare_digest(password.encode(), (stored or "").encode())
+    try:
+        _, n, r, p, salt, digest = stored.split("$")
+        expected = _unb64(digest)
+        actual = _scrypt(password, _unb64(salt), int(n), int(r), int(p), len(expected))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_executor, hash_password_sync, password)
+
+
+async def verify_password(password: str, stored: Optional[str]) -> bool:
+    """Для stored=None (нет такого логина) проверка идёт по фиктивному хешу, чтобы ответ занимал столько же времени."""
+    global _dummy_hash
+    if stored is None:
+        if _dummy_hash is None:
+            _dummy_hash = await hash_password(_b64(os.urandom(16)))
+        await asyncio.get_running_loop().run_in_executor(_executor, verify_password_sync, password, _dummy_hash)
+        return False
+    return await asyncio.get_running_loop().run_in_executor(_executor, verify_password_sync, password, stored)
+
+
+class KdfBusy(Exception):
+    """Вход не дождался scrypt за KDF_WAIT секунд."""
+
+
+async def new_password(value: Any) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Пароль из формы редактирования: (новый хеш, None), если ввели новый пароль, или (None, хеш),
+    если форма прислала сохранённый хеш. Такой хеш принимается, только если он совпадает
+    с хешем в строке (проверяет UPDATE): хеши со старой стоимостью AUTH_SCRYPT_N остаются,
+    а свой хеш клиент записать не может.
+    """
+    if not value or not isinstance(value, str):
+        return None, None
+    if is_password_hash(value):
+        return None, value
+    return await hash_password(value), None
+
+
+class VerifiedCredentials:
+    """
+    Недавние успешные проверки пароля. Ключ — HMAC от (id, сохранённый хеш, пароль)
+    на случайном ключе процесса: в памяти нет ничего, что можно перебирать офлайн,
+    а смена пароля меняет хеш, и старая запись просто перестаёт совпадать.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._key = os.urandom(32)
+        self._entries: "OrderedDict[bytes, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _digest(self, user_id: Any, stored: str, password: str) -> bytes:
+        return hmac.new(self._key, f"{user_id}\0{stored}\0{password}".encode(), hashlib.sha256).digest()
+
+    def check(self, user_id: Any, stored: str, password: str) -> bool:
+        if self.ttl <= 0:
+            return False
+        key = self._digest(user_id, stored, password)
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires is None or expires < time.monotonic():
+                return False
+            self._entries.move_to_end(key)
+            return True
+
+    def add(self, user_id: Any, stored: str, password: str) -> None:
+        if self.ttl <= 0:
+            return
+        key = self._digest(user_id, stored, password)
+        with self._lock:
+            self._entries[key] = time.monotonic() + self.ttl
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+verified_credentials = VerifiedCredentials(VERIFIED_TTL, VERIFIED_CACHE_SIZE)
+
+
+async def check_login(user_id: Any, stored: Optional[str], password: str) -> Optional[str]:
+    """
+    Проверяет пароль пользователя (stored=None — логин не найден).
+    Возвращает None при неверном пароле, иначе хеш, который должен лежать в строке:
+    если он отличается от stored, вызывающий сохраняет его (перевод со старого открытого пароля).
+    """
+    if stored is not None and verified_credentials.check(user_id, stored, password):
+        return stored
+    # Очередь на scrypt ограничена по времени: при пике входов лучше быстрый 503, чем растущее ожидание
+    try:
+        await asyncio.wait_for(_login_slots.acquire(), KDF_WAIT)
+    except asyncio.TimeoutError:
+        raise KdfBusy("Too many logins in progress, try again")
+    try:
+        if not await verify_password(password, stored):
+            return None
+        if not is_password_hash(stored):
+            stored = await hash_password(password)
+    finally:
+        _login_slots.release()
+    verified_credentials.add(user_id, stored, password)
+    return stored
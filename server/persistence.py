@@ -0,0 +1,164 @@
+"""
+Необязательное сохранение состояния mock-сервера на диск.
+
+Каждое изменение Store дописывается строкой JSON в log.jsonl. fsync делается
+пачками раз в fsync_interval секунд фоновым потоком (0 — после каждой записи),
+поэтому при аварии теряется не больше этого окна. Раз в snapshot_every записей
+и при остановке состояние целиком пишется в snapshot.jsonl (через временный
+файл и os.replace), после чего журнал начинается заново.
+
+При старте снимок читается через mmap и поверх него повторяется только хвост
+журнала — записи с seq больше, чем у снимка. Оборванная последняя строка
+(сбой посреди записи) отбрасывается.
+"""
+import json
+import mmap
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from store import Store
+
+SNAPSHOT_FILE = "snapshot.jsonl"
+LOG_FILE = "log.jsonl"
+
+
+class Persistence:
+    def __init__(self, directory: str, fsync_interval: float = 0.05, snapshot_every: int = 100000):
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self.log_path = os.path.join(directory, LOG_FILE)
+        self.store: Optional[Store] = None
+        self.seq = 0
+        self.since_snapshot = 0
+        self._log = None
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def open(self, store: Store) -> Dict[str, Any]:
+        """Восстанавливает store с диска и начинает журналировать его изменения."""
+        started = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+        self.store = store
+        has_snapshot = os.path.exists(self.snapshot_path)
+        snapshot_rows = self._load_snapshot() if has_snapshot else 0
+        replayed = self._replay_log()
+
+        if has_snapshot:
+            self._log = open(self.log_path, "ab")
+        else:
+            # Первый запуск: исходные данные попадают в снимок, дальше читается только он
+            self.snapshot()
+        store.attach(self.append)
+
+        if self.fsync_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name="persistence-fsync", daemon=True)
+            self._flusher.start()
+        return {"snapshot_rows": snapshot_rows, "replayed": replayed, "seconds": time.perf_counter() - started}
+
+    def append(self, record: dict) -> None:
+        self.seq += 1
+        record["seq"] = self.seq
+        line = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode()
+        with self._lock:
+            self._log.write(line)
+            self._dirty = True
+            if self.fsync_interval <= 0:
+                self._sync()
+        self.since_snapshot += 1
+        if self.since_snapshot >= self.snapshot_every:
+            self.snapshot()
+
+    def flush(self) -> None:
+        """Сразу сбрасывает журнал на диск, не дожидаясь фонового fsync."""
+        with self._lock:
+            if self._dirty:
+                self._sync()
+
+    def snapshot(self) -> None:
+        """Пишет всё состояние в новый снимок и обнуляет журнал."""
+        tmp_path = self.snapshot_path + ".tmp"
+        tables = self.store.tables
+        with open(tmp_path, "wb") as f:
+            header = {"seq": self.seq, "next_ids": {name: table.next_id for name, table in tables.items()}}
+            f.write((json.dumps(header) + "\n").encode())
+            for name, table in tables.items():
+                f.write((json.dumps({"table": name, "rows": table.all()}, ensure_ascii=False, default=str) + "\n").encode())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self._fsync_directory()
+        # Всё, что было в журнале, теперь в снимке; при сбое до этой строки лишние записи отсеются по seq
+        with self._lock:
+            if self._log:
+                self._log.close()
+            self._log = open(self.log_path, "wb")
+            self._dirty = False
+        self.since_snapshot = 0
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._flusher:
+            self._flusher.join()
+        if self._log:
+            self.snapshot()
+            self._log.close()
+            self._log = None
+        self.store.attach(None)
+
+    def _load_snapshot(self) -> int:
+        tables = {}
+        with open(self.snapshot_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header = json.loads(mm.readline())
+            for line in iter(mm.readline, b""):
+                block = json.loads(line)
+                tables[block["table"]] = block["rows"]
+        self.store.load(tables, header["next_ids"])
+        self.seq = header["seq"]
+        return sum(len(rows) for rows in tables.values())
+
+    def _replay_log(self) -> int:
+        if not os.path.exists(self.log_path):
+            return 0
+        snapshot_seq = self.seq
+        replayed = 0
+        valid_bytes = 0
+        with open(self.log_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                valid_bytes += len(line)
+                if record["seq"] > snapshot_seq:
+                    self.store.apply(record)
+                    replayed += 1
+                self.seq = max(self.seq, record["seq"])
+        if valid_bytes < os.path.getsize(self.log_path):
+            with open(self.log_path, "r+b") as f:
+                f.truncate(valid_bytes)
+        self.since_snapshot = replayed
+        return replayed
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.fsync_interval):
+            self.flush()
+
+    def _sync(self) -> None:
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._dirty = False
+
+    def _fsync_directory(self) -> None:
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
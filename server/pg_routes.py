@@ -0,0 +1,1521 @@
+"""
+Production-режим сервера: те же маршруты и ответы, что у функций backend/*/index.py
+(auth, profile, grades, homework, diary, export, admin), но поверх Postgres через пул asyncpg.
+Включается переменной DATABASE_URL (см. main.py).
+
+asyncpg готовит каждый запрос один раз на соединение и дальше выполняет его как
+prepared statement из своего кеша, поэтому весь SQL здесь — постоянные строки
+с параметрами $n. Запросы не блокируют event loop, так что один воркер uvicorn
+держит сотни одновременных чтений журнала.
+"""
+import asyncio
+import base64
+import csv
+import io
+import json
+import os
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import asyncpg
+from fastapi import APIRouter, Request
+from fastapi.responses import Response, StreamingResponse
+
+import passwords
+import tokens
+from diary import build_week
+from export import EXPORT_SQL, LEVEL_SQL, ExportFile
+
+try:
+    import orjson
+
+    def dumps(value: Any) -> bytes:
+        return orjson.dumps(value)
+except ImportError:
+    def dumps(value: Any) -> bytes:
+        return json.dumps(value, ensure_ascii=False, default=str).encode()
+
+PG_POOL_MIN_SIZE = int(os.environ.get("PG_POOL_MIN_SIZE", "2"))
+PG_POOL_MAX_SIZE = int(os.environ.get("PG_POOL_MAX_SIZE", "20"))
+MAX_BATCH_GRADES = int(os.environ.get("MAX_BATCH_GRADES", "100000"))
+HOMEWORK_PAGE_SIZE = 100
+HOMEWORK_MAX_PAGE_SIZE = 500
+MAX_ROSTER_ROWS = int(os.environ.get("MAX_ROSTER_ROWS", "20000"))
+CLASS_DELETE_BATCH_SIZE = int(os.environ.get("CLASS_DELETE_BATCH_SIZE", "5000"))
+CLASS_DELETE_TIME_BUDGET = float(os.environ.get("CLASS_DELETE_TIME_BUDGET", "20"))
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "2000"))
+ACADEMIC_YEARS_KEPT = int(os.environ.get("ACADEMIC_YEARS_KEPT", "2"))
+MIN_ACADEMIC_YEAR = 2000
+
+router = APIRouter()
+_pool: Optional[asyncpg.Pool] = None
+
+
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    # json_agg журнала приходит уже разобранным, как у psycopg2
+    for name in ("json", "jsonb"):
+        await conn.set_type_codec(name, encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+
+async def open_pool(dsn: str) -> None:
+    global _pool
+    _pool = await asyncpg.create_pool(dsn, min_size=PG_POOL_MIN_SIZE, max_size=PG_POOL_MAX_SIZE, init=_init_connection)
+
+
+async def close_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+class ApiError(Exception):
+    """Ответ с кодом не 2xx в том же виде, что у функций: {"error": ...} или готовый dict."""
+
+    def __init__(self, status: int, error: Any):
+        super().__init__(error)
+        self.status = status
+        self.payload = error if isinstance(error, dict) else {"error": error}
+
+
+def json_response(status: int, payload: Any) -> Response:
+    return Response(content=dumps(payload), status_code=status, media_type="application/json")
+
+
+async def api_error_handler(request: Request, exc: ApiError) -> Response:
+    return json_response(exc.status, exc.payload)
+
+
+async def database_error_handler(request: Request, exc: asyncpg.PostgresError) -> Response:
+    return json_response(500, {"error": str(exc)})
+
+
+async def read_body(request: Request) -> Dict[str, Any]:
+    raw = await request.body()
+    try:
+        body = json.loads(raw or b"{}")
+    except ValueError:
+        raise ApiError(400, "Invalid JSON body")
+    if not isinstance(body, dict):
+        raise ApiError(400, "JSON object expected")
+    return body
+
+
+def to_int(value: Any, field: str) -> Optional[int]:
+    """Параметры запроса приходят строками, а asyncpg требует точных типов."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        raise ApiError(400, f"{field} must be an integer")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f"{field} must be an integer")
+
+
+def to_date(value: Any, field: str) -> Optional[date]:
+    if value is None or value == "":
+        return None
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f"{field} must be YYYY-MM-DD")
+
+
+def academic_year(day: date) -> int:
+    """Учебный год начинается 1 сентября; год, начавшийся в 2025-м, — это 2025."""
+    return day.year if day.month >= 9 else day.year - 1
+
+
+def to_academic_year(value: Any) -> Optional[int]:
+    year = to_int(value, "year")
+    if year is not None and not MIN_ACADEMIC_YEAR <= year <= academic_year(date.today()) + 1:
+        raise ApiError(400, "year must be the starting year of an academic year, e.g. 2025")
+    return year
+
+
+def required_id(params: Dict[str, Any], message: str) -> int:
+    value = to_int(params.get("id"), "id")
+    if not value:
+        raise ApiError(400, message)
+    return value
+
+
+# Кому открыт каждый метод, как ROLES в backend/*; /admin проверяет authorize_admin
+JOURNAL_ROLES = ("admin", "teacher", "student")
+STAFF_ROLES = ("admin", "teacher")
+SHARED_READS = ("classes", "subjects", "teacher_subjects", "schedule", "homework")
+
+
+def request_identity(request: Request, roles: Optional[Tuple[str, ...]] = None) -> Optional[Dict[str, Any]]:
+    """Данные из X-Auth-Token или None, пока AUTH_TOKEN_KEYS не задан; roles — кому открыт маршрут."""
+    if not tokens.TOKEN_KEYS:
+        return None
+    token = request.headers.get("x-auth-token")
+    if not token:
+        raise ApiError(401, "Authentication required")
+    try:
+        identity = tokens.verify_token(token)
+    except tokens.TokenError as e:
+        raise ApiError(401, str(e))
+    if roles is not None and identity.get("role") not in roles:
+        raise ApiError(403, "Forbidden")
+    return identity
+
+
+def student_class_id(identity: Dict[str, Any]) -> int:
+    """Класс ученика из токена: без него выборка по классу стала бы выборкой по всей школе."""
+    if not identity.get("class_id"):
+        raise ApiError(403, "Student is not assigned to a class")
+    return identity["class_id"]
+
+
+def role_of(identity: Optional[Dict[str, Any]]) -> Optional[str]:
+    return identity and identity.get("role")
+
+
+def own_teacher_id(identity: Optional[Dict[str, Any]]) -> Optional[int]:
+    """Учитель из токена, чьи записи можно менять и удалять; None — любые (админ или без токенов)."""
+    if role_of(identity) != "teacher":
+        return None
+    if not identity.get("teacher_id"):
+        raise ApiError(403, "Forbidden")
+    return identity["teacher_id"]
+
+
+# ---------------------------------------------------------------- auth, profile
+
+LOGIN_SQL = """
+    SELECT u.id, u.login, u.role, u.full_name, u.avatar_color, u.avatar_emoji,
+           t.id AS teacher_id, s.id AS student_id, s.class_id, u.password
+    FROM users u
+    LEFT JOIN teachers t ON u.role = 'teacher' AND t.user_id = u.id
+    LEFT JOIN students s ON u.role = 'student' AND s.user_id = u.id
+    WHERE u.login = $1
+    LIMIT 1
+"""
+
+
+@router.post("/auth")
+async def login(request: Request):
+    body = await read_body(request)
+    login_value, password = body.get("login"), body.get("password")
+    if not login_value or not password:
+        raise ApiError(400, "Login and password required")
+    if not isinstance(login_value, str) or not isinstance(password, str):
+        return json_response(401, {"success": False, "error": "Invalid credentials"})
+
+    async with _pool.acquire() as conn:
+        user = await conn.fetchrow(LOGIN_SQL, login_value)
+    try:
+        stored = await passwords.check_login(user and user["id"], user and user["password"], password)
+    except passwords.KdfBusy as e:
+        raise ApiError(503, str(e))
+    if not stored:
+        return json_response(401, {"success": False, "error": "Invalid credentials"})
+    if stored != user["password"]:
+        # строка ещё хранила открытый пароль: переписываем её в хеш, если за это время пароль не сменили
+        async with _pool.acquire() as conn:
+            await conn.execute("UPDATE users SET password = $1 WHERE id = $2 AND password = $3", stored, user["id"], user["password"])
+    data = dict(user)
+    del data["password"]
+    if not tokens.TOKEN_KEYS:
+        return json_response(200, {"success": True, "user": data})
+    # Остальные маршруты берут пользователя из этого токена, а не из id в запросе
+    token = tokens.issue_token({
+        "user_id": data["id"],
+        "role": data["role"],
+        "teacher_id": data["teacher_id"],
+        "student_id": data["student_id"],
+        "class_id": data["class_id"]
+    })
+    return json_response(200, {"success": True, "user": data, "token": token})
+
+
+@router.post("/profile")
+async def update_profile(request: Request):
+    identity = request_identity(request)
+    body = await read_body(request)
+    # С токенами пользователь меняет только свой профиль
+    user_id = identity["user_id"] if identity else to_int(body.get("user_id"), "user_id")
+    avatar_color = body.get("avatar_color")
+    avatar_emoji = body.get("avatar_emoji")
+
+    async with _pool.acquire() as conn:
+        if avatar_color and avatar_emoji:
+            await conn.execute("UPDATE users SET avatar_color = $1, avatar_emoji = $2 WHERE id = $3", avatar_color, avatar_emoji, user_id)
+        elif avatar_color:
+            await conn.execute("UPDATE users SET avatar_color = $1 WHERE id = $2", avatar_color, user_id)
+        elif avatar_emoji:
+            await conn.execute("UPDATE users SET avatar_emoji = $1 WHERE id = $2", avatar_emoji, user_id)
+    return json_response(200, {"success": True})
+
+
+# ---------------------------------------------------------------- grades
+
+JOURNAL_SQL = """
+    SELECT s.id, u.full_name,
+           COALESCE(
+               json_agg(
+                   json_build_object(
+                       'id', g.id,
+                       'grade', g.grade,
+                       'date', to_char(g.grade_date, 'YYYY-MM-DD'),
+                       'comment', g.comment
+                   ) ORDER BY g.grade_date, g.id
+               ) FILTER (WHERE g.id IS NOT NULL),
+               '[]'
+           ) AS grades,
+           COUNT(g.id) AS grade_count,
+           COALESCE(SUM(g.grade), 0) AS grade_sum
+    FROM students s
+    JOIN users u ON s.user_id = u.id
+    LEFT JOIN grades g ON g.student_id = s.id AND g.subject_id = $1
+                       AND g.grade_date >= $3 AND g.grade_date < $4
+    WHERE s.class_id = $2
+    GROUP BY s.id, u.full_name
+    ORDER BY u.full_name
+"""
+
+# Все журналы учителя одним запросом: строка на (назначение, ученик), строки одного
+# журнала идут подряд; класс без учеников даёт одну строку с пустым учеником
+TEACHER_JOURNALS_SQL = """
+    SELECT tc.class_id, c.name, tc.subject_id, sub.name, s.id, u.full_name,
+           COALESCE(
+               json_agg(
+                   json_build_object(
+                       'id', g.id,
+                       'grade', g.grade,
+                       'date', to_char(g.grade_date, 'YYYY-MM-DD'),
+                       'comment', g.comment
+                   ) ORDER BY g.grade_date, g.id
+               ) FILTER (WHERE g.id IS NOT NULL),
+               '[]'
+           ) AS grades,
+           COUNT(g.id) AS grade_count,
+           COALESCE(SUM(g.grade), 0) AS grade_sum
+    FROM teacher_classes tc
+    JOIN classes c ON c.id = tc.class_id
+    JOIN subjects sub ON sub.id = tc.subject_id
+    LEFT JOIN students s ON s.class_id = tc.class_id
+    LEFT JOIN users u ON u.id = s.user_id
+    LEFT JOIN grades g ON g.student_id = s.id AND g.subject_id = tc.subject_id
+                       AND g.grade_date >= $2 AND g.grade_date < $3
+    WHERE tc.teacher_id = $1
+    GROUP BY tc.class_id, c.name, tc.subject_id, sub.name, s.id, u.full_name
+    ORDER BY c.name, tc.class_id, sub.name, tc.subject_id, u.full_name
+"""
+
+# Как в backend/grades: вставка и поправка class_subject_stats одним запросом,
+# только строки приходят массивами через unnest — одна заготовка на любой размер пачки.
+INSERT_GRADES_SQL = """
+    WITH inserted AS (
+        INSERT INTO grades (student_id, subject_id, teacher_id, grade, grade_date, comment)
+        SELECT * FROM unnest($1::integer[], $2::integer[], $3::integer[], $4::integer[], $5::date[], $6::text[])
+        RETURNING id, student_id, subject_id, grade
+    ), stats AS (
+        INSERT INTO class_subject_stats AS cs (class_id, subject_id, grade_count, graded_count, grade_sum)
+        SELECT s.class_id, i.subject_id, COUNT(*), COUNT(i.grade), COALESCE(SUM(i.grade), 0)
+        FROM inserted i
+        JOIN students s ON s.id = i.student_id
+        WHERE s.class_id IS NOT NULL AND i.subject_id IS NOT NULL
+        GROUP BY s.class_id, i.subject_id
+        ON CONFLICT (class_id, subject_id) DO UPDATE SET
+            grade_count = cs.grade_count + EXCLUDED.grade_count,
+            graded_count = cs.graded_count + EXCLUDED.graded_count,
+            grade_sum = cs.grade_sum + EXCLUDED.grade_sum,
+            updated_at = CURRENT_TIMESTAMP
+    )
+    SELECT id FROM inserted ORDER BY id
+"""
+
+# Учебные годы, у которых есть секция таблицы (grades_2025 — год с 1 сентября 2025):
+# строку с датой вне их Postgres не примет, и весь запрос упадёт (см. V0009)
+PARTITION_YEARS_SQL = """
+    SELECT substring(c.relname FROM '_([0-9]{4})$')::integer
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = $1::regclass
+"""
+
+GRADE_REFERENCES_SQL = """
+    SELECT 'student_id', id FROM students WHERE id = ANY($1::integer[])
+    UNION ALL
+    SELECT 'subject_id', id FROM subjects WHERE id = ANY($2::integer[])
+    UNION ALL
+    SELECT 'teacher_id', id FROM teachers WHERE id = ANY($3::integer[])
+"""
+
+# Последний параметр — учитель из токена: учитель меняет и удаляет только свои оценки,
+# NULL — любые. Оба запроса сообщают, сколько оценок затронули.
+UPDATE_GRADE_SQL = """
+    UPDATE grades SET comment = $1
+    WHERE id = $2 AND ($3::integer IS NULL OR teacher_id = $3)
+"""
+
+DELETE_GRADE_SQL = """
+    WITH deleted AS (
+        DELETE FROM grades WHERE id = $1 AND ($2::integer IS NULL OR teacher_id = $2)
+        RETURNING student_id, subject_id, grade
+    ), stats AS (
+        UPDATE class_subject_stats cs SET
+            grade_count = cs.grade_count - delta.grade_count,
+            graded_count = cs.graded_count - delta.graded_count,
+            grade_sum = cs.grade_sum - delta.grade_sum,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT s.class_id, d.subject_id, COUNT(*) AS grade_count,
+                   COUNT(d.grade) AS graded_count, COALESCE(SUM(d.grade), 0) AS grade_sum
+            FROM deleted d
+            JOIN students s ON s.id = d.student_id
+            GROUP BY s.class_id, d.subject_id
+        ) delta
+        WHERE cs.class_id = delta.class_id AND cs.subject_id = delta.subject_id
+    )
+    SELECT COUNT(*) FROM deleted
+"""
+
+
+def _is_id(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+def validate_grade_rows(items: List[Any], default_teacher_id: Any) -> Tuple[List[tuple], List[Dict[str, Any]]]:
+    """Та же проверка пачки, что в backend/grades: строки для вставки и ошибки {index, field, error}."""
+    rows = []
+    errors = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({"index": index, "field": None, "error": "grade must be an object"})
+            continue
+        row_errors = []
+        for field in ("student_id", "subject_id"):
+            if not _is_id(item.get(field)):
+                row_errors.append({"index": index, "field": field, "error": f"{field} must be a positive integer"})
+        teacher_id = item.get("teacher_id", default_teacher_id)
+        if teacher_id is not None and not _is_id(teacher_id):
+            row_errors.append({"index": index, "field": "teacher_id", "error": "teacher_id must be a positive integer"})
+        grade = item.get("grade")
+        if not isinstance(grade, int) or isinstance(grade, bool) or not 1 <= grade <= 5:
+            row_errors.append({"index": index, "field": "grade", "error": "grade must be an integer from 1 to 5"})
+        try:
+            grade_date = date.fromisoformat(item.get("grade_date"))
+        except (TypeError, ValueError):
+            grade_date = None
+            row_errors.append({"index": index, "field": "grade_date", "error": "grade_date must be YYYY-MM-DD"})
+        comment = item.get("comment") or ""
+        if not isinstance(comment, str):
+            row_errors.append({"index": index, "field": "comment", "error": "comment must be a string"})
+        if row_errors:
+            errors.extend(row_errors)
+        else:
+            rows.append((item["student_id"], item["subject_id"], teacher_id, grade, grade_date, comment))
+    return rows, errors
+
+
+async def check_grade_references(conn: asyncpg.Connection, rows: List[tuple]) -> List[Dict[str, Any]]:
+    columns = (("student_id", 0, "students"), ("subject_id", 1, "subjects"), ("teacher_id", 2, "teachers"))
+    wanted = [list({r[pos] for r in rows if r[pos] is not None}) for _, pos, _ in columns]
+    found = {tuple(r) for r in await conn.fetch(GRADE_REFERENCES_SQL, *wanted)}
+    errors = []
+    for index, row in enumerate(rows):
+        for field, pos, table in columns:
+            if row[pos] is not None and (field, row[pos]) not in found:
+                errors.append({"index": index, "field": field, "error": f"{field} {row[pos]} not found in {table}"})
+    return errors
+
+
+async def check_academic_years(conn: asyncpg.Connection, dates: List[date]) -> List[Dict[str, Any]]:
+    """Даты оценок в учебных годах без секции grades (ещё не созданной или уже отсоединённой)."""
+    years = {r[0] for r in await conn.fetch(PARTITION_YEARS_SQL, "grades")}
+    return [{"index": index, "field": "grade_date", "error": f"grade_date {day} is outside the academic years kept in grades"}
+            for index, day in enumerate(dates) if academic_year(day) not in years]
+
+
+async def check_due_date(conn: asyncpg.Connection, due_date: Optional[date]) -> date:
+    if due_date is None:
+        raise ApiError(400, "due_date must be YYYY-MM-DD")
+    years = {r[0] for r in await conn.fetch(PARTITION_YEARS_SQL, "homework")}
+    if academic_year(due_date) not in years:
+        raise ApiError(400, f"due_date {due_date} is outside the academic years kept in homework")
+    return due_date
+
+
+async def stream_teacher_journals(teacher_id: int, year: int):
+    """
+    {"journals": [...], "year": ...} по частям: журнал уходит клиенту, как только прочитаны его строки,
+    поэтому первый класс учителя с десятком классов приходит раньше, чем собран последний.
+    """
+    yield b'{"journals":['
+    separator = b""
+    current = None
+    async with _pool.acquire() as conn:
+        async with conn.transaction():
+            async for r in conn.cursor(TEACHER_JOURNALS_SQL, teacher_id, date(year, 9, 1), date(year + 1, 9, 1),
+                                       prefetch=500):
+                if current is not None and (current["class_id"], current["subject_id"]) != (r[0], r[2]):
+                    yield separator + dumps(current)
+                    separator = b","
+                    current = None
+                if current is None:
+                    current = {"class_id": r[0], "class_name": r[1], "subject_id": r[2], "subject_name": r[3], "data": []}
+                if r[4] is not None:
+                    current["data"].append({
+                        "student_id": r[4],
+                        "student_name": r[5],
+                        "grades": r[6],
+                        "average": round(r[8] / r[7], 2) if r[7] else 0
+                    })
+    if current is not None:
+        yield separator + dumps(current)
+    yield b'],"year":' + dumps(year) + b"}"
+
+
+@router.get("/grades")
+async def get_journal(request: Request):
+    identity = request_identity(request, JOURNAL_ROLES)
+    params = dict(request.query_params)
+    if role_of(identity) == "student":
+        params.pop("teacher_id", None)
+        params["class_id"] = student_class_id(identity)
+    elif role_of(identity) == "teacher" and not params.get("class_id"):
+        params["teacher_id"] = identity.get("teacher_id")
+    class_id = to_int(params.get("class_id"), "class_id")
+    subject_id = to_int(params.get("subject_id"), "subject_id")
+    teacher_id = to_int(params.get("teacher_id"), "teacher_id")
+    # Журнал показывает один учебный год (по умолчанию текущий) и читает только его секцию grades
+    year = to_academic_year(params.get("year")) or academic_year(date.today())
+    if teacher_id and not class_id:
+        return StreamingResponse(stream_teacher_journals(teacher_id, year), media_type="application/json")
+    if not class_id or not subject_id:
+        raise ApiError(400, "class_id and subject_id, or teacher_id, required")
+
+    async with _pool.acquire() as conn:
+        rows = await conn.fetch(JOURNAL_SQL, subject_id, class_id, date(year, 9, 1), date(year + 1, 9, 1))
+    return json_response(200, {"data": [{
+        "student_id": r[0],
+        "student_name": r[1],
+        "grades": r[2],
+        "average": round(r[4] / r[3], 2) if r[3] else 0
+    } for r in rows], "year": year})
+
+
+@router.post("/grades")
+async def add_grades(request: Request):
+    identity = request_identity(request, STAFF_ROLES)
+    body = await read_body(request)
+    if role_of(identity) == "teacher":
+        # Учитель ставит оценки только от своего имени
+        teacher_id = identity.get("teacher_id")
+        body["teacher_id"] = teacher_id
+        if isinstance(body.get("grades"), list):
+            body["grades"] = [dict(item, teacher_id=teacher_id) if isinstance(item, dict) else item
+                              for item in body["grades"]]
+    batch = isinstance(body.get("grades"), list)
+    items = body["grades"] if batch else [body]
+    if not items or len(items) > MAX_BATCH_GRADES:
+        raise ApiError(400, f"grades must contain 1 to {MAX_BATCH_GRADES} items")
+    rows, errors = validate_grade_rows(items, body.get("teacher_id"))
+    if errors:
+        raise ApiError(400, {"success": False, "errors": errors})
+
+    async with _pool.acquire() as conn:
+        async with conn.transaction():
+            errors = await check_grade_references(conn, rows) + await check_academic_years(conn, [r[4] for r in rows])
+            if errors:
+                raise ApiError(400, {"success": False, "errors": errors})
+            inserted = await conn.fetch(INSERT_GRADES_SQL, *(list(column) for column in zip(*rows)))
+    ids = [r[0] for r in inserted]
+    return json_response(200, {"success": True, "ids": ids} if batch else {"success": True, "id": ids[0]})
+
+
+@router.put("/grades")
+async def update_grade(request: Request):
+    teacher_id = own_teacher_id(request_identity(request, STAFF_ROLES))
+    grade_id = required_id(request.query_params, "grade id required")
+    body = await read_body(request)
+    async with _pool.acquire() as conn:
+        status = await conn.execute(UPDATE_GRADE_SQL, body.get("comment", ""), grade_id, teacher_id)
+    if teacher_id is not None and status.split()[-1] == "0":
+        raise ApiError(404, "Grade not found")
+    return json_response(200, {"success": True})
+
+
+@router.delete("/grades")
+async def delete_grade(request: Request):
+    teacher_id = own_teacher_id(request_identity(request, STAFF_ROLES))
+    grade_id = required_id(request.query_params, "grade id required")
+    async with _pool.acquire() as conn:
+        deleted = await conn.fetchval(DELETE_GRADE_SQL, grade_id, teacher_id)
+    if teacher_id is not None and deleted == 0:
+        raise ApiError(404, "Grade not found")
+    return json_response(200, {"success": True})
+
+
+# ---------------------------------------------------------------- homework
+
+def encode_cursor(due_date: date, homework_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{due_date.isoformat()}|{homework_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[date, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        due_date, homework_id = raw.split("|")
+        return date.fromisoformat(due_date), int(homework_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ApiError(400, "invalid cursor")
+
+
+def build_homework_query(params: Dict[str, Any], year: Optional[int] = None) -> Tuple[str, List[Any], int]:
+    """
+    Страница домашних заданий по ключу (due_date, id), как build_homework_query в backend/homework;
+    year ограничивает выборку учебным годом (админка, как в backend/admin).
+    """
+    conditions = []
+    args: List[Any] = []
+    for name in ("class_id", "subject_id"):
+        if params.get(name):
+            if not str(params[name]).isdigit():
+                raise ApiError(400, f"{name} must be an integer")
+            args.append(int(params[name]))
+            conditions.append(f"h.{name} = ${len(args)}")
+    for name, op in (("date_from", ">="), ("date_to", "<=")):
+        if params.get(name):
+            args.append(to_date(params[name], name))
+            conditions.append(f"h.due_date {op} ${len(args)}")
+    if year is not None:
+        args.extend((date(year, 9, 1), date(year + 1, 9, 1)))
+        conditions.append(f"h.due_date >= ${len(args) - 1} AND h.due_date < ${len(args)}")
+    if params.get("cursor"):
+        args.extend(decode_cursor(params["cursor"]))
+        conditions.append(f"(h.due_date, h.id) < (${len(args) - 1}, ${len(args)})")
+
+    limit = params.get("limit") or HOMEWORK_PAGE_SIZE
+    if not str(limit).isdigit() or not 1 <= int(limit) <= HOMEWORK_MAX_PAGE_SIZE:
+        raise ApiError(400, f"limit must be between 1 and {HOMEWORK_MAX_PAGE_SIZE}")
+    limit = int(limit)
+    args.append(limit + 1)
+
+    if params.get("class_id"):
+        columns = "sub.name as subject_name, u.full_name as teacher_name"
+        class_join = ""
+    else:
+        columns = "c.name as class_name, sub.name as subject_name, u.full_name as teacher_name, h.class_id"
+        class_join = "JOIN classes c ON h.class_id = c.id"
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    query = f"""
+        SELECT h.id, h.description, h.due_date, {columns}
+        FROM homework h
+        {class_join}
+        JOIN subjects sub ON h.subject_id = sub.id
+        LEFT JOIN teachers t ON h.teacher_id = t.id
+        LEFT JOIN users u ON t.user_id = u.id
+        {where}
+        ORDER BY h.due_date DESC, h.id DESC
+        LIMIT ${len(args)}
+    """
+    return query, args, limit
+
+
+async def homework_page(conn: asyncpg.Connection, params: Dict[str, Any], year: Optional[int] = None) -> Dict[str, Any]:
+    query, args, limit = build_homework_query(params, year)
+    rows = await conn.fetch(query, *args)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][2], rows[-1][0])
+    if params.get("class_id"):
+        data = [{"id": r[0], "description": r[1], "due_date": str(r[2]), "subject_name": r[3], "teacher_name": r[4]} for r in rows]
+    else:
+        data = [{"id": r[0], "description": r[1], "due_date": str(r[2]), "class_name": r[3], "subject_name": r[4], "teacher_name": r[5], "class_id": r[6]} for r in rows]
+    return {"data": data, "next_cursor": next_cursor}
+
+
+CREATE_HOMEWORK_SQL = """
+    INSERT INTO homework (class_id, subject_id, teacher_id, description, due_date)
+    VALUES ($1, $2, $3, $4, $5)
+    RETURNING id
+"""
+
+
+def homework_args(body: Dict[str, Any]) -> tuple:
+    return (to_int(body.get("class_id"), "class_id"), to_int(body.get("subject_id"), "subject_id"),
+            to_int(body.get("teacher_id"), "teacher_id"), body.get("description", ""),
+            to_date(body.get("due_date"), "due_date"))
+
+
+@router.get("/homework")
+async def list_homework(request: Request):
+    identity = request_identity(request, JOURNAL_ROLES)
+    params = dict(request.query_params)
+    if role_of(identity) == "student":
+        params["class_id"] = student_class_id(identity)
+    build_homework_query(params)
+    async with _pool.acquire() as conn:
+        return json_response(200, await homework_page(conn, params))
+
+
+@router.post("/homework")
+async def create_homework(request: Request):
+    identity = request_identity(request, STAFF_ROLES)
+    body = await read_body(request)
+    if role_of(identity) == "teacher":
+        body["teacher_id"] = identity.get("teacher_id")
+    args = homework_args(body)
+    async with _pool.acquire() as conn:
+        await check_due_date(conn, args[4])
+        homework_id = await conn.fetchval(CREATE_HOMEWORK_SQL, *args)
+    return json_response(200, {"success": True, "id": homework_id})
+
+
+@router.put("/homework")
+async def update_homework(request: Request):
+    teacher_id = own_teacher_id(request_identity(request, STAFF_ROLES))
+    homework_id = required_id(request.query_params, "homework id required")
+    body = await read_body(request)
+    due_date = to_date(body.get("due_date"), "due_date")
+    async with _pool.acquire() as conn:
+        status = await conn.execute(
+            "UPDATE homework SET description = $1, due_date = $2 WHERE id = $3 AND ($4::integer IS NULL OR teacher_id = $4)",
+            body.get("description"), await check_due_date(conn, due_date), homework_id, teacher_id
+        )
+    if teacher_id is not None and status.split()[-1] == "0":
+        raise ApiError(404, "Homework not found")
+    return json_response(200, {"success": True})
+
+
+@router.delete("/homework")
+async def delete_homework(request: Request):
+    teacher_id = own_teacher_id(request_identity(request, STAFF_ROLES))
+    homework_id = required_id(request.query_params, "homework id required")
+    async with _pool.acquire() as conn:
+        status = await conn.execute(
+            "DELETE FROM homework WHERE id = $1 AND ($2::integer IS NULL OR teacher_id = $2)", homework_id, teacher_id
+        )
+    if teacher_id is not None and status.split()[-1] == "0":
+        raise ApiError(404, "Homework not found")
+    return json_response(200, {"success": True})
+
+
+# ---------------------------------------------------------------- diary
+
+# Неделя ученика одним запросом: расписание класса, домашние задания со сроком
+# на этой неделе и оценки за неё (индексы idx_schedule_class_day_lesson,
+# idx_homework_class_due_date, idx_grades_student_date)
+WEEK_SQL = """
+    SELECT
+        st.class_id,
+        COALESCE((
+            SELECT json_agg(json_build_object(
+                'day_of_week', sc.day_of_week,
+                'lesson_number', sc.lesson_number,
+                'subject_id', sc.subject_id,
+                'subject_name', sub.name,
+                'teacher_name', u.full_name
+            ) ORDER BY sc.day_of_week, sc.lesson_number)
+            FROM schedule sc
+            JOIN subjects sub ON sub.id = sc.subject_id
+            LEFT JOIN teachers t ON t.id = sc.teacher_id
+            LEFT JOIN users u ON u.id = t.user_id
+            WHERE sc.class_id = st.class_id
+        ), '[]'),
+        COALESCE((
+            SELECT json_agg(json_build_object(
+                'id', h.id,
+                'subject_id', h.subject_id,
+                'description', h.description,
+                'due_date', to_char(h.due_date, 'YYYY-MM-DD')
+            ) ORDER BY h.due_date, h.id)
+            FROM homework h
+            WHERE h.class_id = st.class_id AND h.due_date BETWEEN $2 AND $3
+        ), '[]'),
+        COALESCE((
+            SELECT json_agg(json_build_object(
+                'id', g.id,
+                'subject_id', g.subject_id,
+                'grade', g.grade,
+                'date', to_char(g.grade_date, 'YYYY-MM-DD'),
+                'comment', g.comment
+            ) ORDER BY g.grade_date, g.id)
+            FROM grades g
+            WHERE g.student_id = st.id AND g.grade_date BETWEEN $2 AND $3
+        ), '[]')
+    FROM students st
+    WHERE st.id = $1
+"""
+
+
+@router.get("/diary")
+async def get_week(request: Request):
+    identity = request_identity(request, JOURNAL_ROLES)
+    params = dict(request.query_params)
+    if role_of(identity) == "student":
+        # Ученик видит только свою неделю
+        params["student_id"] = identity.get("student_id")
+    student_id = to_int(params.get("student_id"), "student_id")
+    if not student_id:
+        raise ApiError(400, "student_id must be an integer")
+    day = to_date(params.get("week"), "week") or date.today()
+    week_start = day - timedelta(days=day.weekday())
+    week_end = week_start + timedelta(days=6)
+
+    async with _pool.acquire() as conn:
+        row = await conn.fetchrow(WEEK_SQL, student_id, week_start, week_end)
+    if row is None:
+        raise ApiError(404, "Student not found")
+    return json_response(200, {
+        "student_id": student_id,
+        "class_id": row[0],
+        "week_start": week_start.isoformat(),
+        "week_end": week_end.isoformat(),
+        "days": build_week(week_start, row[1], row[2], row[3]),
+    })
+
+
+# ---------------------------------------------------------------- export
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def build_export_query(params: Dict[str, Any]) -> Tuple[str, List[Any], str, str, str]:
+    """Запрос выгрузки как check_export_request в backend/export: класс, параллель или вся школа."""
+    kind = params.get("kind") or "journal"
+    if kind not in EXPORT_SQL:
+        raise ApiError(400, "kind must be journal or report")
+    file_format = params.get("format") or "csv"
+    if file_format not in EXPORT_MEDIA_TYPES:
+        raise ApiError(400, "format must be csv or xlsx")
+
+    conditions = []
+    args: List[Any] = []
+    scope = []
+    for name, column in (("class_id", "s.class_id"), ("level", LEVEL_SQL), ("subject_id", "g.subject_id")):
+        value = to_int(params.get(name), name)
+        if value is None:
+            continue
+        args.append(str(value) if name == "level" else value)
+        conditions.append(f"{column} = ${len(args)}")
+        scope.append(f"{name.split('_')[0]}{value}")
+    for name, op in (("date_from", ">="), ("date_to", "<=")):
+        if params.get(name):
+            args.append(to_date(params[name], name))
+            conditions.append(f"g.grade_date {op} ${len(args)}")
+
+    query = EXPORT_SQL[kind].format(where=" AND ".join(conditions) or "TRUE")
+    return query, args, kind, file_format, f"{kind}-{'-'.join(scope) or 'school'}.{file_format}"
+
+
+async def stream_export(query: str, args: List[Any], kind: str, file_format: str):
+    """Строки идут из курсора пачками по EXPORT_BATCH_SIZE и сразу уходят клиенту частью файла."""
+    export = ExportFile(kind, file_format)
+    async with _pool.acquire() as conn:
+        async with conn.transaction():
+            batch = []
+            async for r in conn.cursor(query, *args, prefetch=EXPORT_BATCH_SIZE):
+                batch.append(r)
+                if len(batch) >= EXPORT_BATCH_SIZE:
+                    export.writerows(batch)
+                    batch = []
+                    chunk = export.take()
+                    if chunk:
+                        yield chunk
+            export.writerows(batch)
+    yield export.finish()
+
+
+@router.get("/export")
+async def export_grades(request: Request):
+    identity = request_identity(request, STAFF_ROLES)
+    if role_of(identity) == "teacher" and not request.query_params.get("class_id"):
+        raise ApiError(403, "Teachers export one class at a time")
+    query, args, kind, file_format, filename = build_export_query(request.query_params)
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if file_format == "csv":
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(stream_export(query, args, kind, file_format),
+                             media_type=EXPORT_MEDIA_TYPES[file_format], headers=headers)
+
+
+# ---------------------------------------------------------------- admin
+
+LIVE_CLASS_SUBJECT_STATS_SQL = """
+    SELECT s.class_id, g.subject_id, COUNT(*) AS grade_count,
+           COUNT(g.grade) AS graded_count, COALESCE(SUM(g.grade), 0) AS grade_sum
+    FROM grades g
+    JOIN students s ON s.id = g.student_id
+    WHERE s.class_id IS NOT NULL AND g.subject_id IS NOT NULL
+    GROUP BY s.class_id, g.subject_id
+"""
+
+MOVE_STUDENT_STATS_SQL = """
+    WITH moved AS (
+        SELECT s.class_id AS old_class_id, $1::integer AS new_class_id, g.subject_id,
+               COUNT(*) AS grade_count, COUNT(g.grade) AS graded_count, COALESCE(SUM(g.grade), 0) AS grade_sum
+        FROM students s
+        JOIN grades g ON g.student_id = s.id
+        WHERE s.user_id = $2 AND s.class_id IS DISTINCT FROM $1::integer
+          AND g.subject_id IS NOT NULL
+        GROUP BY s.class_id, g.subject_id
+    ), removed AS (
+        UPDATE class_subject_stats cs SET
+            grade_count = cs.grade_count - m.grade_count,
+            graded_count = cs.graded_count - m.graded_count,
+            grade_sum = cs.grade_sum - m.grade_sum,
+            updated_at = CURRENT_TIMESTAMP
+        FROM moved m
+        WHERE cs.class_id = m.old_class_id AND cs.subject_id = m.subject_id
+    )
+    INSERT INTO class_subject_stats AS cs (class_id, subject_id, grade_count, graded_count, grade_sum)
+    SELECT new_class_id, subject_id, grade_count, graded_count, grade_sum
+    FROM moved
+    WHERE new_class_id IS NOT NULL
+    ON CONFLICT (class_id, subject_id) DO UPDATE SET
+        grade_count = cs.grade_count + EXCLUDED.grade_count,
+        graded_count = cs.graded_count + EXCLUDED.graded_count,
+        grade_sum = cs.grade_sum + EXCLUDED.grade_sum,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+STATS_CHECK_SQL = f"""
+    SELECT COALESCE(cs.class_id, live.class_id), COALESCE(cs.subject_id, live.subject_id),
+           cs.grade_count, cs.graded_count, cs.grade_sum,
+           live.grade_count, live.graded_count, live.grade_sum
+    FROM class_subject_stats cs
+    FULL JOIN ({LIVE_CLASS_SUBJECT_STATS_SQL}) live
+        ON live.class_id = cs.class_id AND live.subject_id = cs.subject_id
+    WHERE (COALESCE(cs.grade_count, 0), COALESCE(cs.graded_count, 0), COALESCE(cs.grade_sum, 0))
+        IS DISTINCT FROM
+        (COALESCE(live.grade_count, 0), COALESCE(live.graded_count, 0), COALESCE(live.grade_sum, 0))
+    ORDER BY 1, 2
+"""
+
+
+async def admin_classes(conn, params, body):
+    rows = await conn.fetch("SELECT id, name, year FROM classes ORDER BY name")
+    return {"data": [{"id": r[0], "name": r[1], "year": r[2]} for r in rows]}
+
+
+async def admin_subjects(conn, params, body):
+    rows = await conn.fetch("SELECT id, name FROM subjects ORDER BY name")
+    return {"data": [{"id": r[0], "name": r[1]} for r in rows]}
+
+
+async def admin_teachers(conn, params, body):
+    rows = await conn.fetch("""
+        SELECT t.id, u.full_name, u.login, u.password, t.user_id
+        FROM teachers t
+        JOIN users u ON t.user_id = u.id
+        ORDER BY u.full_name
+    """)
+    return {"data": [{"id": r[0], "full_name": r[1], "login": r[2], "password": r[3], "user_id": r[4]} for r in rows]}
+
+
+async def admin_students(conn, params, body):
+    rows = await conn.fetch("""
+        SELECT s.id, u.full_name, u.login, u.password, c.name as class_name, s.class_id
+        FROM students s
+        JOIN users u ON s.user_id = u.id
+        LEFT JOIN classes c ON s.class_id = c.id
+        ORDER BY u.full_name
+    """)
+    return {"data": [{"id": r[0], "full_name": r[1], "login": r[2], "password": r[3], "class_name": r[4], "class_id": r[5]} for r in rows]}
+
+
+async def admin_teacher_subjects(conn, params, body):
+    teacher_id = to_int(params.get("teacher_id"), "teacher_id")
+    if not teacher_id:
+        return {"data": []}
+    rows = await conn.fetch("""
+        SELECT ts.id, s.id as subject_id, s.name as subject_name
+        FROM teacher_subjects ts
+        JOIN subjects s ON ts.subject_id = s.id
+        WHERE ts.teacher_id = $1
+    """, teacher_id)
+    return {"data": [{"id": r[0], "subject_id": r[1], "subject_name": r[2]} for r in rows]}
+
+
+async def admin_schedule(conn, params, body):
+    class_id = to_int(params.get("class_id"), "class_id")
+    if class_id:
+        rows = await conn.fetch("""
+            SELECT s.id, s.day_of_week, s.lesson_number,
+                   sub.name as subject_name, u.full_name as teacher_name
+            FROM schedule s
+            JOIN subjects sub ON s.subject_id = sub.id
+            LEFT JOIN teachers t ON s.teacher_id = t.id
+            LEFT JOIN users u ON t.user_id = u.id
+            WHERE s.class_id = $1
+            ORDER BY s.day_of_week, s.lesson_number
+        """, class_id)
+        return {"data": [{"id": r[0], "day_of_week": r[1], "lesson_number": r[2], "subject_name": r[3], "teacher_name": r[4]} for r in rows]}
+    rows = await conn.fetch("""
+        SELECT s.id, s.day_of_week, s.lesson_number,
+               c.name as class_name, sub.name as subject_name,
+               u.full_name as teacher_name, s.class_id
+        FROM schedule s
+        JOIN classes c ON s.class_id = c.id
+        JOIN subjects sub ON s.subject_id = sub.id
+        LEFT JOIN teachers t ON s.teacher_id = t.id
+        LEFT JOIN users u ON t.user_id = u.id
+        ORDER BY c.name, s.day_of_week, s.lesson_number
+    """)
+    return {"data": [{"id": r[0], "day_of_week": r[1], "lesson_number": r[2], "class_name": r[3], "subject_name": r[4], "teacher_name": r[5], "class_id": r[6]} for r in rows]}
+
+
+async def admin_homework(conn, params, body):
+    """Без year и без date_from/date_to — только текущий учебный год."""
+    year = to_academic_year(params.get("year"))
+    if year is None and not params.get("date_from") and not params.get("date_to"):
+        year = academic_year(date.today())
+    return dict(await homework_page(conn, params, year), year=year)
+
+
+async def admin_stats(conn, params, body):
+    class_id = to_int(params.get("class_id"), "class_id")
+    if class_id:
+        row = await conn.fetchrow("""
+            SELECT
+                (SELECT COUNT(*) FROM students WHERE class_id = $1) as student_count,
+                COALESCE(SUM(grade_count), 0) as total_grades,
+                COALESCE(SUM(grade_sum)::float / NULLIF(SUM(graded_count), 0), 0) as avg_grade
+            FROM class_subject_stats
+            WHERE class_id = $1
+        """, class_id)
+        return {"data": {"student_count": row[0], "total_grades": row[1], "avg_grade": float(row[2])}}
+    row = await conn.fetchrow("""
+        SELECT
+            (SELECT COUNT(*) FROM students) as total_students,
+            (SELECT COUNT(*) FROM teachers) as total_teachers,
+            (SELECT COUNT(*) FROM classes) as total_classes,
+            (SELECT COUNT(*) FROM subjects) as total_subjects,
+            COALESCE(SUM(grade_sum)::float / NULLIF(SUM(graded_count), 0), 0) as overall_avg
+        FROM class_subject_stats
+    """)
+    return {"data": {
+        "total_students": row[0],
+        "total_teachers": row[1],
+        "total_classes": row[2],
+        "total_subjects": row[3],
+        "overall_avg": float(row[4])
+    }}
+
+
+async def admin_stats_check(conn, params, body):
+    rows = await conn.fetch(STATS_CHECK_SQL)
+    return {"data": {
+        "consistent": not rows,
+        "mismatches": [{
+            "class_id": r[0],
+            "subject_id": r[1],
+            "stored": {"grade_count": r[2], "graded_count": r[3], "grade_sum": r[4]},
+            "live": {"grade_count": r[5], "graded_count": r[6], "grade_sum": r[7]}
+        } for r in rows]
+    }}
+
+
+# Удаление класса, как в backend/admin: оценки и задания — пачками по CLASS_DELETE_BATCH_SIZE
+# строк, каждая в своей короткой транзакции, остальное — одним запросом. Пачка оценок тем же
+# запросом вычитается из class_subject_stats, как в DELETE_GRADE_SQL, поэтому статистика верна
+# и между пачками, и после остановки по CLASS_DELETE_TIME_BUDGET. Оба возвращают число удалённых строк.
+DELETE_CLASS_GRADES_SQL = """
+    WITH deleted AS (
+        DELETE FROM grades WHERE id IN (
+            SELECT g.id
+            FROM students s
+            JOIN grades g ON g.student_id = s.id
+            WHERE s.class_id = $1
+            LIMIT $2
+        )
+        RETURNING subject_id, grade
+    ), stats AS (
+        UPDATE class_subject_stats cs SET
+            grade_count = cs.grade_count - delta.grade_count,
+            graded_count = cs.graded_count - delta.graded_count,
+            grade_sum = cs.grade_sum - delta.grade_sum,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT subject_id, COUNT(*) AS grade_count,
+                   COUNT(grade) AS graded_count, COALESCE(SUM(grade), 0) AS grade_sum
+            FROM deleted
+            GROUP BY subject_id
+        ) delta
+        WHERE cs.class_id = $1 AND cs.subject_id = delta.subject_id
+    )
+    SELECT COUNT(*) FROM deleted
+"""
+DELETE_CLASS_HOMEWORK_SQL = """
+    WITH deleted AS (
+        DELETE FROM homework WHERE id IN (SELECT id FROM homework WHERE class_id = $1 LIMIT $2)
+        RETURNING id
+    )
+    SELECT COUNT(*) FROM deleted
+"""
+CLASS_REMAINING_SQL = """
+    SELECT
+        (SELECT COUNT(*) FROM students s JOIN grades g ON g.student_id = s.id WHERE s.class_id = $1),
+        (SELECT COUNT(*) FROM homework WHERE class_id = $1)
+"""
+
+# Вместе с учениками удаляются и их пользователи (если они не учителя), раньше они оставались
+DELETE_CLASS_SQL = """
+    WITH schedule_gone AS (
+        DELETE FROM schedule WHERE class_id = $1
+    ), assignments_gone AS (
+        DELETE FROM teacher_classes WHERE class_id = $1
+    ), stats_gone AS (
+        DELETE FROM class_subject_stats WHERE class_id = $1
+    ), students_gone AS (
+        DELETE FROM students WHERE class_id = $1 RETURNING user_id
+    ), users_gone AS (
+        DELETE FROM users u
+        USING students_gone sg
+        WHERE u.id = sg.user_id AND NOT EXISTS (SELECT 1 FROM teachers t WHERE t.user_id = u.id)
+        RETURNING u.id
+    ), class_gone AS (
+        DELETE FROM classes WHERE id = $1 RETURNING id
+    )
+    SELECT (SELECT COUNT(*) FROM students_gone), (SELECT COUNT(*) FROM users_gone), (SELECT COUNT(*) FROM class_gone)
+"""
+
+
+async def delete_class(conn, params, body):
+    """
+    Транзакциями управляет сам (см. ADMIN_OWN_TRANSACTIONS): каждая пачка фиксируется отдельно.
+    Если CLASS_DELETE_TIME_BUDGET истёк, ответ done=false с остатком, повторный DELETE продолжает.
+    """
+    class_id = to_int(params.get("id"), "id")
+    deleted = {"grades": 0, "homework": 0}
+    deadline = time.monotonic() + CLASS_DELETE_TIME_BUDGET
+    for table, sql in (("grades", DELETE_CLASS_GRADES_SQL), ("homework", DELETE_CLASS_HOMEWORK_SQL)):
+        while True:
+            count = await conn.fetchval(sql, class_id, CLASS_DELETE_BATCH_SIZE)
+            deleted[table] += count
+            if count < CLASS_DELETE_BATCH_SIZE:
+                break
+            if time.monotonic() > deadline:
+                grades, homework = await conn.fetchrow(CLASS_REMAINING_SQL, class_id)
+                return {"success": True, "done": False, "deleted": deleted,
+                        "remaining": {"grades": grades, "homework": homework}}
+
+    async with conn.transaction():
+        students, users, classes = await conn.fetchrow(DELETE_CLASS_SQL, class_id)
+    return {"success": True, "done": True, "deleted": dict(deleted, students=students, users=users, classes=classes)}
+
+
+async def delete_subject(conn, params, body):
+    subject_id = to_int(params.get("id"), "id")
+    await conn.execute("DELETE FROM class_subject_stats WHERE subject_id = $1", subject_id)
+    await conn.execute("DELETE FROM subjects WHERE id = $1", subject_id)
+    return {"success": True}
+
+
+async def delete_teacher(conn, params, body):
+    teacher_id = to_int(params.get("id"), "id")
+    user_id = await conn.fetchval("DELETE FROM teachers WHERE id = $1 RETURNING user_id", teacher_id)
+    if user_id is not None:
+        await conn.execute("DELETE FROM users WHERE id = $1", user_id)
+    return {"success": True}
+
+
+async def delete_student(conn, params, body):
+    student_id = to_int(params.get("id"), "id")
+    user_id = await conn.fetchval("DELETE FROM students WHERE id = $1 RETURNING user_id", student_id)
+    if user_id is not None:
+        await conn.execute("DELETE FROM users WHERE id = $1", user_id)
+    return {"success": True}
+
+
+async def delete_schedule(conn, params, body):
+    await conn.execute("DELETE FROM schedule WHERE id = $1", to_int(params.get("id"), "id"))
+    return {"success": True}
+
+
+# Пустой $3 оставляет прежний пароль. Форма редактирования присылает сохранённый хеш, если пароль не меняли:
+# он приходит в $5 и принимается, только если совпадает с хешем в строке
+UPDATE_USER_SQL = """
+    UPDATE users SET full_name = $1, login = $2, password = COALESCE($3, password)
+    WHERE id = $4 AND ($5::text IS NULL OR password = $5)
+"""
+
+
+async def update_user(conn, user_id: Optional[int], body: Dict[str, Any]) -> None:
+    new_hash, stored = await passwords.new_password(body.get("password"))
+    status = await conn.execute(UPDATE_USER_SQL, body.get("full_name"), body.get("login"), new_hash, user_id, stored)
+    if stored is not None and status.split()[-1] == "0":
+        raise ApiError(400, "password must be a new password or the stored hash")
+
+
+async def update_teacher(conn, params, body):
+    await update_user(conn, to_int(body.get("user_id"), "user_id"), body)
+    return {"success": True}
+
+
+async def update_student(conn, params, body):
+    user_id = to_int(body.get("user_id"), "user_id")
+    class_id = to_int(body.get("class_id"), "class_id")
+    await update_user(conn, user_id, body)
+    await conn.execute(MOVE_STUDENT_STATS_SQL, class_id, user_id)
+    await conn.execute("UPDATE students SET class_id = $1 WHERE user_id = $2", class_id, user_id)
+    return {"success": True}
+
+
+async def update_schedule(conn, params, body):
+    await conn.execute("""
+        UPDATE schedule
+        SET class_id = $1, day_of_week = $2, lesson_number = $3,
+            subject_id = $4, teacher_id = $5
+        WHERE id = $6
+    """, to_int(body.get("class_id"), "class_id"), to_int(body.get("day_of_week"), "day_of_week"),
+        to_int(body.get("lesson_number"), "lesson_number"), to_int(body.get("subject_id"), "subject_id"),
+        to_int(body.get("teacher_id"), "teacher_id"), to_int(params.get("id"), "id"))
+    return {"success": True}
+
+
+async def create_class(conn, params, body):
+    class_id = await conn.fetchval("INSERT INTO classes (name, year) VALUES ($1, $2) RETURNING id",
+                                   body.get("name", ""), to_int(body.get("year", 2025), "year"))
+    return {"success": True, "id": class_id}
+
+
+async def create_subject(conn, params, body):
+    subject_id = await conn.fetchval("INSERT INTO subjects (name) VALUES ($1) RETURNING id", body.get("name", ""))
+    return {"success": True, "id": subject_id}
+
+
+async def create_user(conn, body, role):
+    return await conn.fetchval(
+        "INSERT INTO users (login, password, role, full_name) VALUES ($1, $2, $3, $4) RETURNING id",
+        body.get("login", ""), await passwords.hash_password(str(body.get("password") or "")), role, body.get("full_name", "")
+    )
+
+
+async def create_teacher(conn, params, body):
+    user_id = await create_user(conn, body, "teacher")
+    teacher_id = await conn.fetchval("INSERT INTO teachers (user_id) VALUES ($1) RETURNING id", user_id)
+    return {"success": True, "id": teacher_id}
+
+
+async def create_student(conn, params, body):
+    user_id = await create_user(conn, body, "student")
+    student_id = await conn.fetchval("INSERT INTO students (user_id, class_id) VALUES ($1, $2) RETURNING id",
+                                     user_id, to_int(body.get("class_id"), "class_id"))
+    return {"success": True, "id": student_id}
+
+
+async def create_teacher_class(conn, params, body):
+    row_id = await conn.fetchval(
+        "INSERT INTO teacher_classes (teacher_id, class_id, subject_id) VALUES ($1, $2, $3) RETURNING id",
+        to_int(body.get("teacher_id"), "teacher_id"), to_int(body.get("class_id"), "class_id"),
+        to_int(body.get("subject_id"), "subject_id")
+    )
+    return {"success": True, "id": row_id}
+
+
+async def create_teacher_subject(conn, params, body):
+    row_id = await conn.fetchval(
+        "INSERT INTO teacher_subjects (teacher_id, subject_id) VALUES ($1, $2) RETURNING id",
+        to_int(body.get("teacher_id"), "teacher_id"), to_int(body.get("subject_id"), "subject_id")
+    )
+    return {"success": True, "id": row_id}
+
+
+async def create_schedule(conn, params, body):
+    row_id = await conn.fetchval("""
+        INSERT INTO schedule (class_id, subject_id, teacher_id, day_of_week, lesson_number)
+        VALUES ($1, $2, $3, $4, $5)
+        RETURNING id
+    """, to_int(body.get("class_id"), "class_id"), to_int(body.get("subject_id"), "subject_id"),
+        to_int(body.get("teacher_id"), "teacher_id"), to_int(body.get("day_of_week"), "day_of_week"),
+        to_int(body.get("lesson_number"), "lesson_number"))
+    return {"success": True, "id": row_id}
+
+
+async def create_homework_entity(conn, params, body):
+    args = homework_args(body)
+    await check_due_date(conn, args[4])
+    return {"success": True, "id": await conn.fetchval(CREATE_HOMEWORK_SQL, *args)}
+
+
+async def rebuild_stats(conn, params, body):
+    await conn.execute("LOCK TABLE class_subject_stats IN EXCLUSIVE MODE")
+    await conn.execute("DELETE FROM class_subject_stats")
+    status = await conn.execute(f"""
+        INSERT INTO class_subject_stats (class_id, subject_id, grade_count, graded_count, grade_sum)
+        {LIVE_CLASS_SUBJECT_STATS_SQL}
+    """)
+    return {"success": True, "rows": int(status.split()[-1])}
+
+
+# Ежегодный переход: секции следующего года создаются, старше ACADEMIC_YEARS_KEPT лет —
+# отсоединяются (функция academic_year_rollover из V0009), как в backend/admin
+async def check_rollover(params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    current = academic_year(date.today())
+    year = body.get("year", current)
+    keep_years = body.get("keep_years", ACADEMIC_YEARS_KEPT)
+    for name, value in (("year", year), ("keep_years", keep_years)):
+        if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+            raise ApiError(400, f"{name} must be a positive integer")
+    if not current <= year <= current + 1:
+        raise ApiError(400, f"year must be {current} or {current + 1}")
+    if year - keep_years >= current:
+        raise ApiError(400, f"keep_years must keep the current academic year {current}")
+    return dict(body, year=year, keep_years=keep_years)
+
+
+async def rollover_academic_year(conn, params, body):
+    steps = await conn.fetch("SELECT action, partition_name FROM academic_year_rollover($1, $2)",
+                             body["year"], body["keep_years"])
+    result = {
+        "success": True,
+        "year": body["year"],
+        "created": [r["partition_name"] for r in steps if r["action"] == "created"],
+        "detached": [r["partition_name"] for r in steps if r["action"] == "detached"]
+    }
+    # Статистика не делится по годам, а считает все оставшиеся: после отсоединения секции оценок пересчитываем её
+    if any(name.startswith("grades_") for name in result["detached"]):
+        result["stats_rows"] = (await rebuild_stats(conn, params, body))["rows"]
+    return result
+
+
+# Импорт списка учеников и учителей, как в backend/admin: COPY во временную таблицу,
+# одна проверка занятых логинов и неизвестных классов, одна вставка на всё
+ROSTER_STAGING_SQL = """
+    CREATE TEMP TABLE roster_import (
+        row_index integer NOT NULL,
+        login text NOT NULL,
+        password text NOT NULL,
+        role text NOT NULL,
+        full_name text NOT NULL,
+        class_id integer,
+        class_name text
+    ) ON COMMIT DROP
+"""
+ROSTER_COLUMNS = ("row_index", "login", "password", "role", "full_name", "class_id", "class_name")
+
+# Имя класса повторяется по годам — берётся класс последнего года
+ROSTER_RESOLVE_CLASSES_SQL = """
+    UPDATE roster_import r SET class_id = c.id
+    FROM (
+        SELECT DISTINCT ON (name) id, name FROM classes ORDER BY name, year DESC NULLS LAST, id DESC
+    ) c
+    WHERE r.class_id IS NULL AND r.class_name = c.name
+"""
+
+ROSTER_CONFLICTS_SQL = """
+    SELECT r.row_index, 'login', 'login ' || r.login || ' already exists'
+    FROM roster_import r
+    JOIN users u ON u.login = r.login
+    UNION ALL
+    SELECT r.row_index, 'class_name', 'class ' || r.class_name || ' not found'
+    FROM roster_import r
+    WHERE r.class_name IS NOT NULL AND r.class_id IS NULL
+    UNION ALL
+    SELECT r.row_index, 'class_id', 'class_id ' || r.class_id || ' not found'
+    FROM roster_import r
+    WHERE r.class_name IS NULL AND r.class_id IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM classes c WHERE c.id = r.class_id)
+    ORDER BY 1
+"""
+
+# ON CONFLICT — на случай логина, занятого между проверкой и вставкой:
+# пропущенные строки возвращаются последней колонкой, и транзакция откатывается
+ROSTER_INSERT_SQL = """
+    WITH new_users AS (
+        INSERT INTO users (login, password, role, full_name)
+        SELECT login, password, role, full_name FROM roster_import ORDER BY row_index
+        ON CONFLICT (login) DO NOTHING
+        RETURNING id, login, role
+    ), new_students AS (
+        INSERT INTO students (user_id, class_id)
+        SELECT nu.id, r.class_id
+        FROM new_users nu
+        JOIN roster_import r ON r.login = nu.login
+        WHERE nu.role = 'student'
+        RETURNING id
+    ), new_teachers AS (
+        INSERT INTO teachers (user_id)
+        SELECT id FROM new_users WHERE role = 'teacher'
+        RETURNING id
+    )
+    SELECT
+        (SELECT COUNT(*) FROM new_students),
+        (SELECT COUNT(*) FROM new_teachers),
+        ARRAY(
+            SELECT r.row_index FROM roster_import r
+            WHERE NOT EXISTS (SELECT 1 FROM new_users nu WHERE nu.login = r.login)
+            ORDER BY r.row_index
+        )
+"""
+
+
+def roster_items(body: Dict[str, Any]) -> List[Any]:
+    """Строки списка из body.rows (объекты) или body.csv (текст с заголовком), как в backend/admin."""
+    if isinstance(body.get("csv"), str):
+        reader = csv.DictReader(io.StringIO(body["csv"].lstrip("\ufeff")))
+        if reader.fieldnames is None:
+            return []
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+        return [{k: (v.strip() if isinstance(v, str) else v) for k, v in row.items() if k} for row in reader]
+    if isinstance(body.get("rows"), list):
+        return body["rows"]
+    raise ApiError(400, "rows (list) or csv (text) required")
+
+
+def validate_roster_rows(items: List[Any], default_role: Any) -> Tuple[List[tuple], List[Dict[str, Any]]]:
+    """Та же проверка, что в backend/admin: строки для COPY (пароли ещё не хешированы) и ошибки {index, field, error}."""
+    rows = []
+    errors = []
+    seen: Dict[str, int] = {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({"index": index, "field": None, "error": "row must be an object"})
+            continue
+        row_errors = []
+        role = item.get("role") or default_role
+        if role not in ("student", "teacher"):
+            row_errors.append({"index": index, "field": "role", "error": "role must be student or teacher"})
+        login = item.get("login")
+        if not isinstance(login, str) or not login or len(login) > 50:
+            row_errors.append({"index": index, "field": "login", "error": "login must be 1 to 50 characters"})
+        elif login in seen:
+            row_errors.append({"index": index, "field": "login", "error": f"login {login} repeats row {seen[login]}"})
+        else:
+            seen[login] = index
+        password = item.get("password")
+        if not isinstance(password, str) or not password:
+            row_errors.append({"index": index, "field": "password", "error": "password required"})
+        elif password.startswith("scrypt$"):
+            # В списке приходят открытые пароли: хеш был бы записан как есть, с любой стоимостью scrypt
+            row_errors.append({"index": index, "field": "password", "error": "password must be plain text, not a hash"})
+        full_name = item.get("full_name") or ""
+        if not isinstance(full_name, str) or len(full_name) > 200:
+            row_errors.append({"index": index, "field": "full_name", "error": "full_name must be up to 200 characters"})
+        class_id, class_name = item.get("class_id"), item.get("class_name") or None
+        if class_id in (None, ""):
+            class_id = None
+        elif str(class_id).isdigit():
+            class_id = int(class_id)
+        else:
+            row_errors.append({"index": index, "field": "class_id", "error": "class_id must be a positive integer"})
+        if class_name is not None and not isinstance(class_name, str):
+            row_errors.append({"index": index, "field": "class_name", "error": "class_name must be a string"})
+        if role == "teacher":
+            class_id = class_name = None
+        if row_errors:
+            errors.extend(row_errors)
+        else:
+            rows.append((index, login, password, role, full_name, class_id, None if class_id else class_name))
+    return rows, errors
+
+
+async def check_roster(params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    """Проверка и хеширование паролей до того, как взято соединение: scrypt для тысяч строк не держит транзакцию."""
+    items = roster_items(body)
+    if not items or len(items) > MAX_ROSTER_ROWS:
+        raise ApiError(400, f"roster must contain 1 to {MAX_ROSTER_ROWS} rows")
+    rows, errors = validate_roster_rows(items, body.get("role"))
+    if errors:
+        raise ApiError(400, {"success": False, "errors": errors})
+
+    hashed = await asyncio.gather(*(passwords.hash_password(r[2]) for r in rows))
+    return {"rows": [r[:2] + (h,) + r[3:] for r, h in zip(rows, hashed)]}
+
+
+async def import_roster(conn, params, body):
+    rows = body["rows"]
+    await conn.execute(ROSTER_STAGING_SQL)
+    await conn.copy_records_to_table("roster_import", records=rows, columns=ROSTER_COLUMNS)
+    await conn.execute(ROSTER_RESOLVE_CLASSES_SQL)
+
+    errors = [{"index": r[0], "field": r[1], "error": r[2]} for r in await conn.fetch(ROSTER_CONFLICTS_SQL)]
+    if not errors:
+        students, teachers, skipped = await conn.fetchrow(ROSTER_INSERT_SQL)
+        logins = {r[0]: r[1] for r in rows}
+        errors = [{"index": i, "field": "login", "error": f"login {logins[i]} already exists"} for i in skipped]
+    if errors:
+        raise ApiError(409 if all(e["field"] == "login" for e in errors) else 400, {"success": False, "errors": errors})
+    return {"success": True, "students": students, "teachers": teachers}
+
+
+ADMIN_ROUTES = {
+    ("GET", "classes"): admin_classes,
+    ("GET", "subjects"): admin_subjects,
+    ("GET", "teachers"): admin_teachers,
+    ("GET", "students"): admin_students,
+    ("GET", "teacher_subjects"): admin_teacher_subjects,
+    ("GET", "schedule"): admin_schedule,
+    ("GET", "homework"): admin_homework,
+    ("GET", "stats"): admin_stats,
+    ("GET", "stats_check"): admin_stats_check,
+    ("DELETE", "class"): delete_class,
+    ("DELETE", "subject"): delete_subject,
+    ("DELETE", "teacher"): delete_teacher,
+    ("DELETE", "student"): delete_student,
+    ("DELETE", "schedule"): delete_schedule,
+    ("PUT", "teacher"): update_teacher,
+    ("PUT", "student"): update_student,
+    ("PUT", "schedule"): update_schedule,
+    ("POST", "class"): create_class,
+    ("POST", "subject"): create_subject,
+    ("POST", "teacher"): create_teacher,
+    ("POST", "student"): create_student,
+    ("POST", "teacher_class"): create_teacher_class,
+    ("POST", "teacher_subject"): create_teacher_subject,
+    ("POST", "schedule"): create_schedule,
+    ("POST", "homework"): create_homework_entity,
+    ("POST", "roster"): import_roster,
+    ("POST", "stats_rebuild"): rebuild_stats,
+    ("POST", "academic_year"): rollover_academic_year
+}
+
+# Маршруты, которые сами открывают транзакции (удаление класса фиксирует каждую пачку)
+ADMIN_OWN_TRANSACTIONS = {("DELETE", "class")}
+
+# Проверки без базы, как VALIDATORS в backend/admin: выполняются до того, как взято соединение
+ADMIN_VALIDATORS = {
+    ("POST", "roster"): check_roster,
+    ("POST", "academic_year"): check_rollover
+}
+
+# Ответ на сущность без маршрута, как в backend/admin
+UNKNOWN_ENTITY = {
+    "GET": {"data": []},
+    "DELETE": {"success": True},
+    "PUT": {"success": False, "error": "Unknown entity"},
+    "POST": {"success": False, "error": "Unknown entity"}
+}
+
+
+def authorize_admin(method: str, entity: str, identity: Optional[Dict[str, Any]]) -> None:
+    """С токенами данные меняют только администраторы; учителя и ученики читают SHARED_READS."""
+    if identity is None or identity.get("role") == "admin":
+        return
+    if method != "GET" or entity not in SHARED_READS:
+        raise ApiError(403, "Forbidden")
+
+
+@router.api_route("/admin", methods=["GET", "POST", "PUT", "DELETE"])
+async def admin(request: Request):
+    method = request.method
+    params = dict(request.query_params)
+    authorize_admin(method, params.get("entity", ""), request_identity(request))
+    route = ADMIN_ROUTES.get((method, params.get("entity", "")))
+    if route is None:
+        return json_response(200, UNKNOWN_ENTITY[method])
+    body = await read_body(request) if method in ("POST", "PUT") else {}
+    if (method, params.get("entity", "")) in ADMIN_VALIDATORS:
+        body = await ADMIN_VALIDATORS[(method, params["entity"])](params, body)
+
+    async with _pool.acquire() as conn:
+        if method == "GET":
+            return json_response(200, await route(conn, params, body))
+        if (method, params["entity"]) in ADMIN_OWN_TRANSACTIONS:
+            return json_response(200, await route(conn, params, body))
+        async with conn.transaction():
+            result = await route(conn, params, body)
+    return json_response(200, result)
@@ -0,0 +1,141 @@
+"""
+Общее для нескольких воркеров хранилище mock-сервера в SQLite (режим WAL).
+
+Тот же интерфейс, что у Store/Table из store.py, но строки лежат в файле:
+каждый процесс uvicorn открывает своё соединение и видит записи остальных.
+Сущность — отдельная таблица (id INTEGER PRIMARY KEY AUTOINCREMENT, data JSON),
+индексы Store становятся индексами по выражениям json_extract, поэтому поиск
+по login/class_id и (class_id, subject_id) не сканирует таблицу.
+"""
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from store import IndexKey
+
+
+def _columns(field: IndexKey) -> tuple:
+    return field if isinstance(field, tuple) else (field,)
+
+
+def _values(field: IndexKey, value: Any) -> tuple:
+    return value if isinstance(field, tuple) else (value,)
+
+
+class SqliteTable:
+    def __init__(self, store: "SqliteStore", name: str, indexed: Iterable[IndexKey] = ()):
+        self.store = store
+        self.name = name
+        self.indexed = list(indexed)
+
+    def _row(self, row_id: int, data: str) -> dict:
+        return {"id": row_id, **json.loads(data)}
+
+    def _select(self, where: str = "", args: tuple = ()) -> List[dict]:
+        rows = self.store.conn.execute(f'SELECT id, data FROM "{self.name}" {where} ORDER BY id', args).fetchall()
+        return [self._row(*r) for r in rows]
+
+    @property
+    def next_id(self) -> int:
+        row = self.store.conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (self.name,)).fetchone()
+        return (row[0] if row else 0) + 1
+
+    def __len__(self) -> int:
+        return self.store.conn.execute(f'SELECT COUNT(*) FROM "{self.name}"').fetchone()[0]
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self.all())
+
+    def all(self) -> List[dict]:
+        return self._select()
+
+    def get(self, row_id: Any) -> Optional[dict]:
+        row = self.store.conn.execute(f'SELECT id, data FROM "{self.name}" WHERE id = ?', (row_id,)).fetchone()
+        return self._row(*row) if row else None
+
+    def find(self, field: IndexKey, value: Any) -> List[dict]:
+        # IS вместо = совпадает и с отсутствующим полем (NULL), как dict.get в Table, и всё так же идёт по индексу
+        where = " AND ".join(f"json_extract(data, '$.{column}') IS ?" for column in _columns(field))
+        return self._select(f"WHERE {where}", _values(field, value))
+
+    def first(self, field: IndexKey, value: Any) -> Optional[dict]:
+        rows = self.find(field, value)
+        return rows[0] if rows else None
+
+    def insert(self, row: dict) -> int:
+        data = json.dumps({k: v for k, v in row.items() if k != "id"}, ensure_ascii=False)
+        with self.store.write():
+            cur = self.store.conn.execute(f'INSERT OR REPLACE INTO "{self.name}" (id, data) VALUES (?, ?)', (row.get("id"), data))
+        row["id"] = cur.lastrowid
+        return row["id"]
+
+    def update(self, row_id: Any, **fields: Any) -> Optional[dict]:
+        with self.store.write():
+            current = self.get(row_id)
+            if current is None:
+                return None
+            current.update(fields)
+            data = json.dumps({k: v for k, v in current.items() if k != "id"}, ensure_ascii=False)
+            self.store.conn.execute(f'UPDATE "{self.name}" SET data = ? WHERE id = ?', (data, row_id))
+        return current
+
+    def delete(self, row_id: Any) -> bool:
+        with self.store.write():
+            cur = self.store.conn.execute(f'DELETE FROM "{self.name}" WHERE id = ?', (row_id,))
+        return cur.rowcount > 0
+
+    def create(self) -> None:
+        conn = self.store.conn
+        conn.execute(f'CREATE TABLE IF NOT EXISTS "{self.name}" (id INTEGER PRIMARY KEY AUTOINCREMENT, data TEXT NOT NULL)')
+        for field in self.indexed:
+            columns = _columns(field)
+            expressions = ", ".join(f"json_extract(data, '$.{column}')" for column in columns)
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{self.name}_{"_".join(columns)}" ON "{self.name}" ({expressions})')
+
+
+class SqliteStore:
+    """Набор таблиц в одном файле SQLite; исходные данные пишутся только при первом создании файла."""
+
+    def __init__(self, path: str, data: Dict[str, Iterable[dict]], indexes: Optional[Dict[str, Iterable[IndexKey]]] = None,
+                 busy_timeout: float = 10.0):
+        indexes = indexes or {}
+        # Эндпоинты async и выполняются в потоке event loop, но sync-обработчики FastAPI уходят в пул потоков
+        self.conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.RLock()
+        self.tables = {name: SqliteTable(self, name, indexes.get(name, ())) for name in data}
+
+        with self.write():
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            for table in self.tables.values():
+                table.create()
+            seeded = self.conn.execute("SELECT 1 FROM meta WHERE key = 'seeded'").fetchone()
+            if not seeded:
+                for name, rows in data.items():
+                    for row in rows:
+                        self.tables[name].insert(dict(row))
+                self.conn.execute("INSERT INTO meta (key, value) VALUES ('seeded', '1')")
+
+    def __contains__(self, entity: str) -> bool:
+        return entity in self.tables
+
+    def __getitem__(self, entity: str) -> SqliteTable:
+        return self.tables[entity]
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """BEGIN IMMEDIATE: писатели из разных процессов выстраиваются в очередь, а не ловят SQLITE_BUSY посреди транзакции."""
+        with self._lock:
+            if self.conn.in_transaction:
+                yield
+                return
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
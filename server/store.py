@@ -0,0 +1,137 @@
+"""
+In-memory хранилище mock-сервера.
+
+Каждая сущность — Table: строки по id плюс хеш-индексы по выбранным полям,
+поэтому поиск по id/login/class_id, вставка и удаление не сканируют таблицу.
+Порядок строк совпадает с порядком вставки, как у прежних списков.
+Каждое изменение можно передать в журнал (см. persistence.py).
+"""
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# Индекс строится по одному полю или по кортежу полей (составной ключ).
+IndexKey = Union[str, Tuple[str, ...]]
+
+
+def index_value(field: IndexKey, row: dict) -> Any:
+    if isinstance(field, tuple):
+        return tuple(row.get(name) for name in field)
+    return row.get(field)
+
+
+class Table:
+    def __init__(self, rows: Iterable[dict] = (), indexed: Iterable[IndexKey] = (), name: str = ""):
+        self.name = name
+        self.journal: Optional[Callable[[dict], None]] = None
+        self.rows: Dict[int, dict] = {}
+        # поле -> значение -> {id: row}; вложенный dict служит упорядоченным множеством с O(1) удалением
+        self.indexes: Dict[IndexKey, Dict[Any, Dict[int, dict]]] = {field: {} for field in indexed}
+        self.next_id = 1
+        for row in rows:
+            self.insert(row)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self.rows.values())
+
+    def all(self) -> List[dict]:
+        return list(self.rows.values())
+
+    def get(self, row_id: int) -> Optional[dict]:
+        return self.rows.get(row_id)
+
+    def find(self, field: IndexKey, value: Any) -> List[dict]:
+        if field in self.indexes:
+            return list(self.indexes[field].get(value, {}).values())
+        return [row for row in self.rows.values() if index_value(field, row) == value]
+
+    def first(self, field: IndexKey, value: Any) -> Optional[dict]:
+        if field in self.indexes:
+            return next(iter(self.indexes[field].get(value, {}).values()), None)
+        return next((row for row in self.rows.values() if index_value(field, row) == value), None)
+
+    def insert(self, row: dict) -> int:
+        """Вставляет строку; id без явного значения берётся из монотонной последовательности."""
+        if row.get("id") is None:
+            row["id"] = self.next_id
+        row_id = row["id"]
+        if row_id in self.rows:
+            self.delete(row_id)
+        self.next_id = max(self.next_id, row_id + 1)
+        self.rows[row_id] = row
+        for field, index in self.indexes.items():
+            index.setdefault(index_value(field, row), {})[row_id] = row
+        if self.journal:
+            self.journal({"op": "insert", "table": self.name, "row": row})
+        return row_id
+
+    def update(self, row_id: int, **fields: Any) -> Optional[dict]:
+        row = self.rows.get(row_id)
+        if row is None:
+            return None
+        updated = dict(row, **fields)
+        for field, index in self.indexes.items():
+            old, new = index_value(field, row), index_value(field, updated)
+            if old != new:
+                self._unindex(index, old, row_id)
+                index.setdefault(new, {})[row_id] = row
+        row.update(fields)
+        if self.journal:
+            self.journal({"op": "update", "table": self.name, "id": row_id, "fields": fields})
+        return row
+
+    def delete(self, row_id: int) -> bool:
+        row = self.rows.pop(row_id, None)
+        if row is None:
+            return False
+        for field, index in self.indexes.items():
+            self._unindex(index, index_value(field, row), row_id)
+        if self.journal:
+            self.journal({"op": "delete", "table": self.name, "id": row_id})
+        return True
+
+    @staticmethod
+    def _unindex(index: Dict[Any, Dict[int, dict]], value: Any, row_id: int) -> None:
+        bucket = index.get(value)
+        if bucket is not None:
+            bucket.pop(row_id, None)
+            if not bucket:
+                del index[value]
+
+
+class Store:
+    """Набор таблиц по имени сущности: `entity in store`, `store[entity]`."""
+
+    def __init__(self, data: Dict[str, Iterable[dict]], indexes: Optional[Dict[str, Iterable[IndexKey]]] = None):
+        indexes = indexes or {}
+        self.tables = {name: Table(rows, indexes.get(name, ()), name) for name, rows in data.items()}
+
+    def __contains__(self, entity: str) -> bool:
+        return entity in self.tables
+
+    def __getitem__(self, entity: str) -> Table:
+        return self.tables[entity]
+
+    def attach(self, journal: Optional[Callable[[dict], None]]) -> None:
+        """Передаёт каждое последующее изменение в journal (None — отключить)."""
+        for table in self.tables.values():
+            table.journal = journal
+
+    def load(self, tables: Dict[str, List[dict]], next_ids: Dict[str, int]) -> None:
+        """Заменяет содержимое таблиц (например, снимком с диска), сохраняя их индексы."""
+        for name, rows in tables.items():
+            indexed = self.tables[name].indexes if name in self.tables else ()
+            table = Table(rows, indexed, name)
+            table.next_id = max(table.next_id, next_ids.get(name, 1))
+            self.tables[name] = table
+
+    def apply(self, record: dict) -> None:
+        """Повторяет запись журнала; при загрузке журнал должен быть отключён."""
+        table = self.tables.setdefault(record["table"], Table(name=record["table"]))
+        if record["op"] == "insert":
+            table.insert(record["row"])
+        elif record["op"] == "update":
+            table.update(record["id"], **record["fields"])
+        elif record["op"] == "delete":
+            table.delete(record["id"])
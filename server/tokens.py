@@ -0,0 +1,62 @@
+"""
+Токены сессии для production-режима сервера, совместимые с backend/auth.
+
+AUTH_TOKEN_KEYS — список пар kid:secret через запятую: первым ключом подписываются
+новые токены, принимается любой из перечисленных, поэтому ключ меняют, поставив
+новый первым и убрав старый через AUTH_TOKEN_TTL секунд. Токен —
+kid.payload.signature в base64url: payload — JSON с данными пользователя и exp,
+signature — HMAC-SHA256 от "kid.payload". Пока AUTH_TOKEN_KEYS не задан,
+токены не выдаются и не требуются — как у функций.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from typing import Any, Dict
+
+TOKEN_KEYS = {
+    kid.strip(): secret.strip().encode()
+    for kid, secret in (item.split(":", 1) for item in os.environ.get("AUTH_TOKEN_KEYS", "").split(",") if ":" in item)
+}
+TOKEN_TTL = int(os.environ.get("AUTH_TOKEN_TTL", "43200"))
+
+
+class TokenError(Exception):
+    """Токен не принят: подделан, испорчен, просрочен или подписан неизвестным ключом."""
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def issue_token(claims: Dict[str, Any]) -> str:
+    kid, key = next(iter(TOKEN_KEYS.items()))
+    payload = _b64(json.dumps(dict(claims, exp=int(time.time()) + TOKEN_TTL), separators=(",", ":")).encode())
+    signature = hmac.new(key, f"{kid}.{payload}".encode(), hashlib.sha256).digest()
+    return f"{kid}.{payload}.{_b64(signature)}"
+
+
+def verify_token(token: str) -> Dict[str, Any]:
+    kid, _, rest = token.partition(".")
+    payload, _, signature = rest.partition(".")
+    key = TOKEN_KEYS.get(kid)
+    if key is None:
+        raise TokenError("Invalid token")
+    expected = hmac.new(key, f"{kid}.{payload}".encode(), hashlib.sha256).digest()
+    try:
+        if not hmac.compare_digest(expected, _unb64(signature)):
+            raise TokenError("Invalid token")
+        claims = json.loads(_unb64(payload))
+    except ValueError:
+        raise TokenError("Invalid token")
+    if not isinstance(claims, dict):
+        raise TokenError("Invalid token")
+    if claims.get("exp", 0) < time.time():
+        raise TokenError("Token expired")
+    return claims
@@ -20,6 +20,12 @@ const API_GRADES = `${API_BASE}/grades`;
 const API_HOMEWORK = `${API_BASE}/homework`;
 const API_PROFILE = `${API_BASE}/profile`;
 
+// Токен из ответа /auth: когда на сервере заданы AUTH_TOKEN_KEYS, без него все маршруты, кроме /auth, отвечают 401
+const authHeaders = (headers: Record<string, string> = {}) => ({
+  ...headers,
+  'X-Auth-Token': localStorage.getItem('authToken') || ''
+});
+
 const DAYS = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота'];
 const EMOJIS = ['👤', '🎓', '📚', '✏️', '🌟', '🚀', '💼', '👨‍🏫', '👩‍🏫', '🧑‍🎓'];
 const COLORS = ['#2563EB', '#10B981', '#F59E0B', '#EF4444', '#8B5CF6', '#EC4899', '#14B8A6', '#F97316'];
@@ -92,6 +98,7 @@ export default function Index() {
       const data = await response.json();
       
       if (data.success) {
+        if (data.token) localStorage.setItem('authToken', data.token);
         setUser(data.user);
         setIsLoggedIn(true);
         setSelectedEmoji(data.user.avatar_emoji || '👤');
@@ -109,7 +116,7 @@ export default function Index() {
     try {
       await fetch(API_PROFILE, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: authHeaders({ 'Content-Type': 'application/json' }),
         body: JSON.stringify({
           user_id: user?.id,
           avatar_color: selectedColor,
@@ -132,20 +139,20 @@ export default function Index() {
     if (!isLoggedIn) return;
     
     try {
-      const classesRes = await fetch(`${API_ADMIN}?entity=classes`);
+      const classesRes = await fetch(`${API_ADMIN}?entity=classes`, { headers: authHeaders() });
       const classesData = await classesRes.json();
       setClasses(classesData.data || []);
       
-      const subjectsRes = await fetch(`${API_ADMIN}?entity=subjects`);
+      const subjectsRes = await fetch(`${API_ADMIN}?entity=subjects`, { headers: authHeaders() });
       const subjectsData = await subjectsRes.json();
       setSubjects(subjectsData.data || []);
       
       if (user?.role === 'admin') {
-        const teachersRes = await fetch(`${API_ADMIN}?entity=teachers`);
+        const teachersRes = await fetch(`${API_ADMIN}?entity=teachers`, { headers: authHeaders() });
         const teachersData = await teachersRes.json();
         setTeachers(teachersData.data || []);
         
-        const studentsRes = await fetch(`${API_ADMIN}?entity=students`);
+        const studentsRes = await fetch(`${API_ADMIN}?entity=students`, { headers: authHeaders() });
         const studentsData = await studentsRes.json();
         setStudents(studentsData.data || []);
       }
@@ -158,7 +165,7 @@ export default function Index() {
     if (!selectedClass || !selectedSubject) return;
     
     try {
-      const response = await fetch(`${API_GRADES}?class_id=${selectedClass}&subject_id=${selectedSubject}`);
+      const response = await fetch(`${API_GRADES}?class_id=${selectedClass}&subject_id=${selectedSubject}`, { headers: authHeaders() });
       const data = await response.json();
       setGradesData(data.data || []);
     } catch (error) {
@@ -208,7 +215,7 @@ export default function Index() {
     try {
       await fetch(`${API_GRADES}?id=${gradeId}`, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: authHeaders({ 'Content-Type': 'application/json' }),
         body: JSON.stringify({ comment })
       });
       toast.success('Примечание обновлено');
@@ -298,7 +305,7 @@ export default function Index() {
               </div>
               <span className="font-medium">{user?.full_name}</span>
             </Button>
-            <Button variant="outline" size="sm" onClick={() => setIsLoggedIn(false)}>
+            <Button variant="outline" size="sm" onClick={() => { localStorage.removeItem('authToken'); setIsLoggedIn(false); }}>
               <Icon name="LogOut" size={16} />
             </Button>
           </div>
@@ -422,7 +429,7 @@ function AdminPanel({ classes, subjects, teachers, students, createEntity, delet
 
   const loadStats = async () => {
     try {
-      const res = await fetch(`${API_ADMIN}?entity=stats`);
+      const res = await fetch(`${API_ADMIN}?entity=stats`, { headers: authHeaders() });
       const data = await res.json();
       setStats(data.data);
     } catch (error) {
@@ -432,7 +439,7 @@ function AdminPanel({ classes, subjects, teachers, students, createEntity, delet
 
   const loadClassStats = async (classId: number) => {
     try {
-      const res = await fetch(`${API_ADMIN}?entity=stats&class_id=${classId}`);
+      const res = await fetch(`${API_ADMIN}?entity=stats&class_id=${classId}`, { headers: authHeaders() });
       const data = await res.json();
       return data.data;
     } catch (error) {
@@ -445,7 +452,7 @@ function AdminPanel({ classes, subjects, teachers, students, createEntity, delet
     try {
       await fetch(`${API_ADMIN}?entity=${entity}&id=${userData.id}`, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: authHeaders({ 'Content-Type': 'application/json' }),
         body: JSON.stringify(userData)
       });
       toast.success('Обновлено');
@@ -893,11 +900,10 @@ function ScheduleGrid({ classId, schedule, deleteEntity, loadData }: any) {
 
   useEffect(() => {
     const fetchData = async () => {
-      const token = localStorage.getItem('authToken');
       try {
         const [subjectsRes, teachersRes] = await Promise.all([
-          fetch(`${API_ADMIN}?entity=subjects`, { headers: { 'X-Auth-Token': token || '' } }),
-          fetch(`${API_ADMIN}?entity=teachers`, { headers: { 'X-Auth-Token': token || '' } })
+          fetch(`${API_ADMIN}?entity=subjects`, { headers: authHeaders() }),
+          fetch(`${API_ADMIN}?entity=teachers`, { headers: authHeaders() })
         ]);
         if (subjectsRes.ok) {
           const subjectsData = await subjectsRes.json();
@@ -926,11 +932,10 @@ function ScheduleGrid({ classId, schedule, deleteEntity, loadData }: any) {
   };
 
   const saveEdit = async () => {
-    const token = localStorage.getItem('authToken');
     try {
       const res = await fetch(`${API_ADMIN}?entity=schedule&id=${editingLesson.id}`, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json', 'X-Auth-Token': token || '' },
+        headers: authHeaders({ 'Content-Type': 'application/json' }),
         body: JSON.stringify({
           class_id: editingLesson.class_id,
           day_of_week: editingLesson.day_of_week,
@@ -1055,7 +1060,7 @@ function TeacherPanel({ user, classes, subjects, teacherSubjects, gradesData, se
     try {
       await fetch(`${API_HOMEWORK}?id=${hw.id}`, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: authHeaders({ 'Content-Type': 'application/json' }),
         body: JSON.stringify({
           description: hw.description,
           due_date: hw.due_date
@@ -1072,7 +1077,8 @@ function TeacherPanel({ user, classes, subjects, teacherSubjects, gradesData, se
   const deleteHomework = async (homeworkId: number) => {
     try {
       await fetch(`${API_HOMEWORK}?id=${homeworkId}`, {
-        method: 'DELETE'
+        method: 'DELETE',
+        headers: authHeaders()
       });
       toast.success('Задание удалено');
       loadHomework();
@@ -1480,7 +1486,7 @@ function StudentPanel({ user, subjects, schedule, homework, gradesData, selected
     if (!user?.class_id || !selectedSubject) return;
     
     try {
-      const response = await fetch(`${API_GRADES}?class_id=${user.class_id}&subject_id=${selectedSubject}`);
+      const response = await fetch(`${API_GRADES}?class_id=${user.class_id}&subject_id=${selectedSubject}`, { headers: authHeaders() });
       const data = await response.json();
       const myData = data.data?.find((s: any) => s.student_id === user.student_id);
       setMyGrades(myData ? myData.grades : []);